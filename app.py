@@ -5,12 +5,10 @@ import os
 # --- FIX: ALLOW OAUTH TO RUN ON STREAMLIT CLOUD ---
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-import tempfile
 from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 import io
 import time
-import subprocess
 import pickle
 import json
 import datetime
@@ -33,12 +31,32 @@ from google.oauth2 import service_account
 import requests
 from requests_oauthlib import OAuth2Session
 
+# --- Local helpers ---
+from audio_pipeline import ingest_audio, probe_audio, run_blob_stem, format_stage_stats, OffsetMap, TRANSCODE_PROFILES, DEFAULT_PROFILE
+from transcription import plan_segments, transcribe_segments, words_from_response, Transcript
+from transcript_cache import TranscriptCache
+from stt_operations import OperationTracker, wait_for_operation, reattach_operation
+from jobs import JobQueue, JobStore, QUEUED, RUNNING, DONE, FAILED
+from reporting import StreamlitReporter, JobReporter
+from uploads import ArtifactTracker, spool_upload, sweep_stale
+from summarization import MapReduceSummarizer, SectionStreamParser, format_summary_stats, parse_sections
+from gemini_cache import GeminiCache, CachedModel
+from rate_limits import RateLimitedModel, ServiceLimits, format_limit_stats, is_idempotent, limit_session
+from basecamp_client import BasecampClients, token_key
+from drive_cache import DriveServiceCache, FolderCache, account_key
+from retrieval import BM25Index, ChatTurnMetrics, record_chat_metrics
+from publishing import Destination, format_publish_summary, publish
+
 # -----------------------------------------------------
 # 1. CONSTANTS & CONFIGURATION
 # -----------------------------------------------------
 st.set_page_config(layout="wide", page_title="AI Meeting Manager", page_icon="🤖")
 
 # --- Load App Keys from Secrets ---
+def secret_flag(name, default):
+    """On/off secret. bool("false") is True, so string values are parsed; TOML booleans work as-is."""
+    return str(st.secrets.get(name, default)).strip().lower() in ("1", "true", "yes", "on")
+
 try:
     GCS_BUCKET_NAME = st.secrets["GCS_BUCKET_NAME"]
     GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
@@ -47,6 +65,61 @@ try:
     BASECAMP_CLIENT_ID = st.secrets["BASECAMP_CLIENT_ID"]
     BASECAMP_CLIENT_SECRET = st.secrets["BASECAMP_CLIENT_SECRET"]
     BASECAMP_ACCOUNT_ID = st.secrets["BASECAMP_ACCOUNT_ID"]
+
+    # --- AUDIO INGEST ---
+    # Pipe ffmpeg straight into a resumable GCS upload instead of writing a .flac first
+    STREAMING_INGEST = secret_flag("STREAMING_INGEST", True)
+    # speech_flac (16 kHz mono), speech_opus (~10x smaller) or source_flac (legacy)
+    TRANSCODE_PROFILE = st.secrets.get("TRANSCODE_PROFILE", DEFAULT_PROFILE)
+    if TRANSCODE_PROFILE not in TRANSCODE_PROFILES:
+        raise ValueError(f"Unknown TRANSCODE_PROFILE '{TRANSCODE_PROFILE}'")
+    LOCAL_CACHE_DIR = st.secrets.get("LOCAL_CACHE_DIR", ".cache")
+    # Cut long silences (waiting rooms, mute gaps) before upload; timestamps are mapped back
+    VAD_TRIM = secret_flag("VAD_TRIM", True)
+    VAD_MIN_SILENCE_SEC = float(st.secrets.get("VAD_MIN_SILENCE_SEC", 3.0))
+
+    # --- PARALLEL TRANSCRIPTION ---
+    # Recordings longer than PARALLEL_STT_MIN_SEC are split into overlapping segments
+    PARALLEL_STT = secret_flag("PARALLEL_STT", True)
+    PARALLEL_STT_MIN_SEC = float(st.secrets.get("PARALLEL_STT_MIN_SEC", 1200))
+    STT_SEGMENT_SEC = float(st.secrets.get("STT_SEGMENT_SEC", 600))
+    STT_SEGMENT_OVERLAP_SEC = float(st.secrets.get("STT_SEGMENT_OVERLAP_SEC", 15))
+    STT_MAX_PARALLEL = int(st.secrets.get("STT_MAX_PARALLEL", 4))
+
+    # --- TRANSCRIPT CACHE ---
+    TRANSCRIPT_CACHE_MAX_MB = float(st.secrets.get("TRANSCRIPT_CACHE_MAX_MB", 500))
+
+    # --- BACKGROUND JOBS ---
+    ANALYSIS_WORKERS = int(st.secrets.get("ANALYSIS_WORKERS", 2))
+
+    # --- SUMMARISATION ---
+    # Transcripts over this many (estimated) tokens are summarised map-reduce style
+    SUMMARY_CHUNK_TOKENS = int(st.secrets.get("SUMMARY_CHUNK_TOKENS", 60000))
+    SUMMARY_MAX_PARALLEL = int(st.secrets.get("SUMMARY_MAX_PARALLEL", 4))
+
+    # --- CHAT ---
+    # Send only the top-k BM25 passages per question instead of the whole transcript
+    CHAT_RETRIEVAL = secret_flag("CHAT_RETRIEVAL", True)
+    CHAT_TOP_K = int(st.secrets.get("CHAT_TOP_K", 6))
+    CHAT_PASSAGE_TOKENS = int(st.secrets.get("CHAT_PASSAGE_TOKENS", 300))
+
+    # --- GEMINI RESPONSE CACHE ---
+    GEMINI_CACHE = secret_flag("GEMINI_CACHE", True)
+    GEMINI_CACHE_TTL_HOURS = float(st.secrets.get("GEMINI_CACHE_TTL_HOURS", 168))
+    GEMINI_CACHE_MAX_ENTRIES = int(st.secrets.get("GEMINI_CACHE_MAX_ENTRIES", 2000))
+
+    # --- API RATE LIMITS (shared by every session in the process) ---
+    BASECAMP_REQUESTS_PER_10S = int(st.secrets.get("BASECAMP_REQUESTS_PER_10S", 50))
+    GEMINI_REQUESTS_PER_MIN = int(st.secrets.get("GEMINI_REQUESTS_PER_MIN", 120))
+    API_MAX_RETRIES = int(st.secrets.get("API_MAX_RETRIES", 4))
+
+    # --- PUBLISHING ---
+    # Automatic retries per destination (Drive / Basecamp) for transient failures; failed ones can also be retried by hand
+    PUBLISH_RETRIES = int(st.secrets.get("PUBLISH_RETRIES", 1))
+
+    # --- BASECAMP METADATA ---
+    # Projects, docks and to-do lists are reused this long, then revalidated with ETags (304 = no body)
+    BASECAMP_CACHE_TTL_SEC = int(st.secrets.get("BASECAMP_CACHE_TTL_SEC", 300))
     
     # --- AUTO-LOGIN LOGIC ---
     STREAMLIT_APP_URL = st.secrets.get("STREAMLIT_APP_URL", None)
@@ -68,26 +141,62 @@ BASECAMP_TOKEN_URL = "https://launchpad.37signals.com/authorization/token"
 BASECAMP_API_BASE = f"https://3.basecampapi.com/{BASECAMP_ACCOUNT_ID}"
 BASECAMP_USER_AGENT = {"User-Agent": "AI Meeting Notes App (external-user)"}
 
+# Speech-to-Text
+STT_LANGUAGE_CODE = "en-US"
+STT_MODEL = "video"
+STT_MIN_SPEAKERS = 2
+STT_MAX_SPEAKERS = 6
+
+@st.cache_resource
+def get_service_limits():
+    # Process-wide: quotas belong to the app's keys, not to a browser session
+    return ServiceLimits({
+        "basecamp": {"rate": BASECAMP_REQUESTS_PER_10S, "per": 10.0, "concurrency": 4},
+        "gemini": {"rate": GEMINI_REQUESTS_PER_MIN, "per": 60.0, "concurrency": 8},
+    }, API_MAX_RETRIES)
+
+def drive_execute(request):
+    """``request.execute()`` for a Drive API request, rate-limited and retried (creates only when nothing was sent)."""
+    if is_idempotent(getattr(request, "method", "GET")): return get_service_limits().call("drive", request.execute)
+    return get_service_limits().call_write("drive", request.execute)
+
+@st.cache_resource
+def get_drive_services():
+    # One built service per credential token and thread (httplib2 connections are not thread-safe)
+    return DriveServiceCache(lambda creds: build("drive", "v3", credentials=creds))
+
+@st.cache_resource
+def get_drive_folders():
+    # Folder IDs per Drive account, so uploads skip the lookup query
+    return FolderCache(drive_execute)
+
 # -----------------------------------------------------
 # 2. HELPER: GET USER IDENTITY
 # -----------------------------------------------------
-def fetch_basecamp_name(token_dict):
-    """Calls Basecamp Identity API to get the user's real name."""
+def fetch_basecamp_identity(token_dict):
+    """Calls Basecamp Identity API. Returns (real name, identity id), or ("", "") if it fails."""
     try:
         identity_url = "https://launchpad.37signals.com/authorization.json"
         headers = {
             "Authorization": f"Bearer {token_dict['access_token']}",
             "User-Agent": "AI Meeting Notes App"
         }
-        response = requests.get(identity_url, headers=headers)
+        response = get_service_limits().call("basecamp", requests.get, identity_url, headers=headers)
         if response.status_code == 200:
             data = response.json()
             first = data.get('identity', {}).get('first_name', '')
             last = data.get('identity', {}).get('last_name', '')
-            return f"{first} {last}".strip()
+            return f"{first} {last}".strip(), str(data.get('identity', {}).get('id') or "")
     except Exception:
-        return ""
-    return ""
+        return "", ""
+    return "", ""
+
+def session_owner():
+    """Key for this user's jobs and STT operations: the Basecamp identity id, or a hash of the token if that lookup failed.
+    Never the display name, which two users can share (and is "" when the lookup failed)."""
+    if st.session_state.user_account_id:
+        return f"basecamp:{st.session_state.user_account_id}"
+    return f"token:{token_key(st.session_state.basecamp_token)}"
 
 # -----------------------------------------------------
 # 3. STATE & AUTO-LOGIN HANDLER
@@ -98,6 +207,8 @@ if 'basecamp_token' not in st.session_state:
     st.session_state.basecamp_token = None
 if 'user_real_name' not in st.session_state:
     st.session_state.user_real_name = ""
+if 'user_account_id' not in st.session_state:
+    st.session_state.user_account_id = ""
 
 # --- FIX: IMMEDIATE GOOGLE RE-LOGIN ---
 if 'gdrive_creds_json' in st.session_state and st.session_state.gdrive_creds_json and not st.session_state.gdrive_creds:
@@ -126,9 +237,10 @@ if AUTO_LOGIN_MODE and "code" in st.query_params and not st.session_state.baseca
         
         st.session_state.basecamp_token = token
         
-        real_name = fetch_basecamp_name(token)
+        real_name, account_id = fetch_basecamp_identity(token)
         if real_name:
             st.session_state.user_real_name = real_name
+        st.session_state.user_account_id = account_id
             
         st.query_params.clear()
         st.toast("✅ Basecamp Login Successful!", icon="🎉")
@@ -151,6 +263,7 @@ with st.sidebar:
         if st.button("Logout Basecamp"):
             st.session_state.basecamp_token = None
             st.session_state.user_real_name = ""
+            st.session_state.user_account_id = ""
             st.session_state.gdrive_creds = None
             st.session_state.gdrive_creds_json = None
             st.rerun()
@@ -179,8 +292,9 @@ with st.sidebar:
                     response.raise_for_status()
                     token = response.json()
                     st.session_state.basecamp_token = token
-                    real_name = fetch_basecamp_name(token)
+                    real_name, account_id = fetch_basecamp_identity(token)
                     if real_name: st.session_state.user_real_name = real_name
+                    st.session_state.user_account_id = account_id
                     st.rerun()
                 except Exception as e:
                     st.error(f"Login failed: {e}")
@@ -231,6 +345,12 @@ if not (st.session_state.basecamp_token and st.session_state.gdrive_creds):
 #     MAIN APP LOGIC (Unlocked)
 # =====================================================
 
+@st.cache_resource
+def get_gemini_cache():
+    # Process-wide and on disk: identical prompts (reruns, re-analysis, same thumbnail) skip the API
+    if not GEMINI_CACHE: return None
+    return GeminiCache(os.path.join(LOCAL_CACHE_DIR, "gemini"), int(GEMINI_CACHE_TTL_HOURS * 3600), GEMINI_CACHE_MAX_ENTRIES)
+
 # --- API CLIENTS ---
 try:
     sa_creds = service_account.Credentials.from_service_account_info(GCP_SERVICE_ACCOUNT_JSON)
@@ -238,11 +358,35 @@ try:
     speech_client = speech.SpeechClient(credentials=sa_creds)
     
     genai.configure(api_key=GOOGLE_API_KEY)
-    gemini_model = genai.GenerativeModel('gemini-2.5-flash-lite')
+    gemini_model = CachedModel(RateLimitedModel(genai.GenerativeModel('gemini-2.5-flash-lite'), get_service_limits()["gemini"]), get_gemini_cache())
 except Exception as e:
     st.error(f"System Error (AI Services): {e}")
     st.stop()
 
+def upload_spool_dir():
+    return os.path.join(LOCAL_CACHE_DIR, "uploads")
+
+@st.cache_resource
+def get_job_queue():
+    # Process-wide: jobs keep running when the session that queued them goes away
+    os.makedirs(LOCAL_CACHE_DIR, exist_ok=True)
+    sweep_stale(upload_spool_dir())  # spooled uploads orphaned by a restart
+    return JobQueue(JobStore(os.path.join(LOCAL_CACHE_DIR, "jobs.sqlite3")), ANALYSIS_WORKERS)
+
+@st.cache_resource(max_entries=32)
+def get_meeting_index(full_transcript):
+    # Built once per transcript and shared by every session chatting about that meeting
+    return BM25Index.from_transcript(full_transcript, CHAT_PASSAGE_TOKENS)
+
+@st.cache_resource
+def get_operation_tracker():
+    return OperationTracker(os.path.join(LOCAL_CACHE_DIR, "stt_operations.json"))
+
+@st.cache_resource
+def get_transcript_cache():
+    # One instance per process so hit/miss counters are shared across sessions
+    return TranscriptCache(os.path.join(LOCAL_CACHE_DIR, "transcripts"), int(TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024))
+
 # -----------------------------------------------------
 # 6. HELPER FUNCTIONS (DOC PARSING)
 # -----------------------------------------------------
@@ -317,225 +461,496 @@ def _add_rich_text(paragraph, text):
 
 # --- Standard Helpers ---
 
-def get_basecamp_session_user():
-    if not st.session_state.basecamp_token: return None
-    session = OAuth2Session(BASECAMP_CLIENT_ID, token=st.session_state.basecamp_token)
+def make_basecamp_session(token):
+    session = OAuth2Session(BASECAMP_CLIENT_ID, token=token)
     session.headers.update(BASECAMP_USER_AGENT)
-    return session
+    return limit_session(session, get_service_limits()["basecamp"])
+
+@st.cache_resource
+def get_basecamp_clients():
+    # Process-wide: one kept-alive session and metadata cache per Basecamp account, reused across reruns
+    return BasecampClients(make_basecamp_session, BASECAMP_API_BASE, BASECAMP_CACHE_TTL_SEC)
 
-def upload_to_gcs(file_path, destination_blob_name):
+def get_basecamp_client():
+    if not st.session_state.basecamp_token: return None
+    return get_basecamp_clients().get(st.session_state.basecamp_token)
+
+def ingest_audio_to_gcs(file_path, blob_stem, report):
+    """Probes, transcodes (per TRANSCODE_PROFILE) and uploads. Returns (gcs_uri, ingest) or (None, None)."""
     try:
         bucket = storage_client.bucket(GCS_BUCKET_NAME)
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(file_path, timeout=3600)
-        return f"gs://{GCS_BUCKET_NAME}/{destination_blob_name}"
+        ingest = ingest_audio(
+            bucket, file_path, blob_stem, TRANSCODE_PROFILE, streaming=STREAMING_INGEST,
+            stats_log=os.path.join(LOCAL_CACHE_DIR, "audio_profile_stats.jsonl"),
+            vad={"min_silence": VAD_MIN_SILENCE_SEC} if VAD_TRIM else None
+        )
+        return f"gs://{GCS_BUCKET_NAME}/{ingest['blob_name']}", ingest
     except Exception as e:
-        st.error(f"GCS Upload Error: {e}")
-        return None
+        report.error(f"GCS Upload Error: {e}")
+        return None, None
 
 # --- SMART FOLDER CREATION ---
-def get_or_create_folder(service, folder_name):
-    try:
-        query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}' and trashed=false"
-        results = service.files().list(q=query, fields="files(id)").execute()
-        items = results.get('files', [])
-        if items: return items[0]['id']
-        else:
-            file_metadata = {'name': folder_name, 'mimeType': 'application/vnd.google-apps.folder'}
-            folder = service.files().create(body=file_metadata, fields='id').execute()
-            return folder.get('id')
+def get_or_create_folder(service, folder_name, creds):
+    """Cached folder ID; looked up (or created) by name only on a miss."""
+    try: return get_drive_folders().folder_id(service, account_key(creds), folder_name, creds)
     except Exception as e: return None
 
+def create_in_folder(service, creds, folder_name, file_metadata, media):
+    """files().create into a (cached) folder; if that folder was deleted, it is found/created again and the upload retried."""
+    def create(folder_id):
+        body = {**file_metadata, "parents": [folder_id] if folder_id else []}
+        return drive_execute(service.files().create(body=body, media_body=media, fields="id"))
+    return get_drive_folders().within(service, account_key(creds), folder_name, create, creds)
+
+def drive_upload(creds, file_bytes, file_name, target_folder_name):
+    """Uploads a .docx into the named folder and returns its file ID. Raises on failure; safe on worker threads."""
+    service = get_drive_services().get(creds)
+    media = MediaIoBaseUpload(
+        io.BytesIO(file_bytes), mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    )
+    return create_in_folder(service, creds, target_folder_name, {"name": file_name}, media)["id"]
+
 def upload_to_drive_user(file_stream, file_name, target_folder_name):
     if not st.session_state.gdrive_creds: return None
     try:
-        service = build("drive", "v3", credentials=st.session_state.gdrive_creds)
-        folder_id = get_or_create_folder(service, target_folder_name)
-        # If folder fails, fallback to root
-        parents = [folder_id] if folder_id else []
-
-        file_metadata = {"name": file_name, "parents": parents}
-        media = MediaIoBaseUpload(
-            file_stream, mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
-        file = service.files().create(
-            body=file_metadata, media_body=media, fields="id"
-        ).execute()
-        return file.get("id")
+        return drive_upload(st.session_state.gdrive_creds, file_stream.getvalue(), file_name, target_folder_name)
     except Exception as e:
         st.error(f"Google Drive Upload Error: {e}")
         return None
 
-def get_basecamp_projects(_session):
-    try:
-        response = _session.get(f"{BASECAMP_API_BASE}/projects.json")
-        response.raise_for_status()
-        return sorted([(p['name'], p['id']) for p in response.json() if p['status'] == 'active'], key=lambda x: x[0])
+def get_basecamp_projects(_client):
+    """Active projects loaded so far (waits only for the first page; the rest arrive in the background)."""
+    try: return sorted([(p['name'], p['id']) for p in _client.projects().first_page() if p['status'] == 'active'], key=lambda x: x[0])
     except: return []
 
-def get_project_tools(_session, project_id):
-    try:
-        response = _session.get(f"{BASECAMP_API_BASE}/projects/{project_id}.json")
-        response.raise_for_status()
-        return response.json().get('dock', [])
+def get_project_tools(_client, project_id):
+    try: return _client.dock(project_id)
     except: return []
 
-def get_todolists(_session, todoset_id, project_id):
-    try:
-        url = f"{BASECAMP_API_BASE}/buckets/{project_id}/todosets/{todoset_id}/todolists.json"
-        resp = _session.get(url)
-        return sorted([(t['title'], t['id']) for t in resp.json()], key=lambda x: x[0])
+def get_todolists(_client, todoset_id, project_id):
+    try: return sorted([(t['title'], t['id']) for t in _client.todolists(project_id, todoset_id).wait()], key=lambda x: x[0])
     except: return []
 
+@st.fragment(run_every=1)
+def render_listing_progress(listing, noun, shown_pages):
+    """Progress of a Basecamp listing still loading; reruns the page as new pages land so the selector grows."""
+    if listing.done or listing.pages > shown_pages: st.rerun()
+    total = f" of {listing.total}" if listing.total else ""
+    st.caption(f"⏳ Loading more {noun}… ({len(listing.items)}{total} loaded)")
+
+def basecamp_attach(_session, file_bytes, file_name):
+    """Uploads an attachment and returns its sgid. Raises on failure; safe on worker threads."""
+    headers = _session.headers.copy()
+    headers.update({'Content-Type': 'application/octet-stream', 'Content-Length': str(len(file_bytes))})
+    resp = _session.post(f"{BASECAMP_API_BASE}/attachments.json?name={file_name}", data=file_bytes, headers=headers)
+    resp.raise_for_status()
+    return resp.json()['attachable_sgid']
+
 def upload_bc_attachment(_session, file_bytes, file_name):
     try:
-        headers = _session.headers.copy()
-        headers.update({'Content-Type': 'application/octet-stream', 'Content-Length': str(len(file_bytes))})
-        resp = _session.post(f"{BASECAMP_API_BASE}/attachments.json?name={file_name}", data=file_bytes, headers=headers)
-        return resp.json()['attachable_sgid']
+        return basecamp_attach(_session, file_bytes, file_name)
     except Exception as e:
         st.error(f"Basecamp Upload Error: {e}")
         return None
 
+def basecamp_post(_session, project_id, tool_type, tool_id, sub_id, title, content, attachment_sgid):
+    """Creates the to-do, message or upload and returns Basecamp's JSON for it. Raises on failure; safe on worker threads."""
+    attach_html = f'<bc-attachment sgid="{attachment_sgid}"></bc-attachment>' if attachment_sgid else ""
+
+    if tool_type == "To-dos":
+        url = f"{BASECAMP_API_BASE}/buckets/{project_id}/todolists/{sub_id}/todos.json"
+        payload = {"content": title, "description": content + attach_html}
+
+    elif tool_type == "Message Board":
+        url = f"{BASECAMP_API_BASE}/buckets/{project_id}/message_boards/{tool_id}/messages.json"
+        payload = {"subject": title, "content": content + attach_html, "status": "active"}
+
+    elif tool_type == "Docs & Files":
+        url = f"{BASECAMP_API_BASE}/buckets/{project_id}/vaults/{tool_id}/uploads.json"
+        payload = {"attachable_sgid": attachment_sgid, "base_name": title, "content": content}
+
+    else:
+        raise ValueError(f"Unknown Basecamp tool: {tool_type}")
+
+    resp = _session.post(url, json=payload)
+    resp.raise_for_status()
+    return resp.json()
+
 def post_to_basecamp(_session, project_id, tool_type, tool_id, sub_id, title, content, attachment_sgid):
     try:
-        attach_html = f'<bc-attachment sgid="{attachment_sgid}"></bc-attachment>' if attachment_sgid else ""
-        
-        if tool_type == "To-dos":
-            url = f"{BASECAMP_API_BASE}/buckets/{project_id}/todolists/{sub_id}/todos.json"
-            payload = {"content": title, "description": content + attach_html}
-            
-        elif tool_type == "Message Board":
-            url = f"{BASECAMP_API_BASE}/buckets/{project_id}/message_boards/{tool_id}/messages.json"
-            payload = {"subject": title, "content": content + attach_html, "status": "active"}
-            
-        elif tool_type == "Docs & Files":
-            url = f"{BASECAMP_API_BASE}/buckets/{project_id}/vaults/{tool_id}/uploads.json"
-            payload = {"attachable_sgid": attachment_sgid, "base_name": title, "content": content}
-
-        resp = _session.post(url, json=payload)
-        resp.raise_for_status()
+        basecamp_post(_session, project_id, tool_type, tool_id, sub_id, title, content, attachment_sgid)
         return True
     except Exception as e:
         st.error(f"Basecamp Post Error: {e}")
         return False
 
-def get_structured_notes_google(audio_file_path, file_name, participants_context):
-    try:
-        with st.spinner(f"Converting {file_name} to audio-only FLAC..."):
-            base_name = os.path.splitext(audio_file_path)[0]
-            flac_file_path = f"{base_name}.flac"
-            command = ["ffmpeg", "-i", audio_file_path, "-vn", "-acodec", "flac", "-y", flac_file_path]
-            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-        with st.spinner(f"Uploading converted audio to Google Cloud Storage..."):
-            flac_blob_name = f"{os.path.splitext(file_name)[0]}.flac"
-            gcs_uri = upload_to_gcs(flac_file_path, flac_blob_name)
-            if not gcs_uri: return {"error": "Upload failed."}
+# --- Publishing (Generate) ---
+def publish_destinations(file_bytes, file_name, drive_folder=None, basecamp=None):
+    """Destinations for a generated doc. ``basecamp`` holds session, project_id, tool_type, tool_id, sub_id, title, content."""
+    creds = st.session_state.gdrive_creds
+    destinations = []
+    if drive_folder and creds:
+        destinations.append(Destination(
+            f"Drive ({drive_folder})",
+            [("upload", lambda r: drive_upload(creds, file_bytes, file_name, drive_folder))],
+            link=lambda r: f"https://drive.google.com/file/d/{r['upload']}/view"))
+    if basecamp:
+        bc = basecamp
+        destinations.append(Destination(
+            f"Basecamp ({bc['tool_type']})",
+            [("attachment", lambda r: basecamp_attach(bc["session"], file_bytes, file_name)),
+             ("post", lambda r: basecamp_post(bc["session"], bc["project_id"], bc["tool_type"], bc["tool_id"],
+                                              bc["sub_id"], bc["title"], bc["content"], r["attachment"]))],
+            link=lambda r: r["post"].get("app_url")))
+    return destinations
+
+def render_publish_status():
+    """Per-destination outcome of the last Generate, with a Retry for each one that failed."""
+    state = st.session_state.publish
+    if state["destinations"]:
+        st.caption(format_publish_summary(state["destinations"], state["seconds"]))
+    for i, d in enumerate(state["destinations"]):
+        if d.ok:
+            st.success(f"✅ {d.name} · {d.seconds:.1f}s" + (f" · [open]({d.url})" if d.url else ""))
+            continue
+        c1, c2 = st.columns([5, 1])
+        c1.error(f"{d.name} failed after {d.attempts} attempt(s): {d.error}")
+        if c2.button("Retry", key=f"publish_retry_{i}"):
+            with st.spinner(f"Retrying {d.name}..."):
+                d.run(PUBLISH_RETRIES)
+            st.rerun()
+    st.download_button("Download .docx", state["bytes"], state["file_name"])
+
+def build_recognition_config(ingest):
+    return speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding[ingest["encoding"]],
+        sample_rate_hertz=ingest["sample_rate_hertz"] or 0,
+        language_code=STT_LANGUAGE_CODE,
+        enable_automatic_punctuation=True,
+        use_enhanced=True,
+        model=STT_MODEL,
+        diarization_config=speech.SpeakerDiarizationConfig(
+            enable_speaker_diarization=True,
+            min_speaker_count=STT_MIN_SPEAKERS,
+            max_speaker_count=STT_MAX_SPEAKERS
+        )
+    )
 
+def transcribe_in_segments(audio_file_path, file_name, duration, report, owner="", cache_key=None):
+    """Splits long recordings into overlapping segments and transcribes them concurrently.
+
+    Each segment's operation stays in the tracker until the run is stitched, so analysing the same
+    recording again (after a restart or refresh) reattaches to the segments already paid for.
+    """
+    bucket = storage_client.bucket(GCS_BUCKET_NAME)
+    blob_stem = run_blob_stem(file_name)
+    segments = plan_segments(duration, STT_SEGMENT_SEC, STT_SEGMENT_OVERLAP_SEC)
+    tracker = get_operation_tracker()
+    earlier = tracker.segment_operations(owner, cache_key)
+    registered = []
+
+    def reattach(index, start, length):
+        name, info = earlier[index]
+        if (info.get("start"), info.get("length")) != (start, length): return None
+        try:
+            operation = reattach_operation(speech_client, name)
+            words = words_from_response(operation.result(timeout=3600))
+        except Exception:
+            tracker.finish(name)  # gone or failed on Google's side: transcribe this segment again
+            return None
+        finally:
+            # The run that uploaded it didn't get to clean up; nothing reads the segment's audio any more
+            if info.get("blob_name"):
+                try: bucket.blob(info["blob_name"]).delete()
+                except: pass
+        registered.append(name)
+        return OffsetMap(info.get("speech_offsets", [])).map_words(words)
+
+    # Runs in worker threads: no st.* calls in here
+    def recognize(index, start, length):
+        if index in earlier:
+            words = reattach(index, start, length)
+            if words is not None: return words
+        ingest = ingest_audio(
+            bucket, audio_file_path, f"{blob_stem}_part{index:02d}", TRANSCODE_PROFILE,
+            streaming=STREAMING_INGEST, vad={"min_silence": VAD_MIN_SILENCE_SEC} if VAD_TRIM else None,
+            clip=(start, length)
+        )
+        try:
+            audio = speech.RecognitionAudio(uri=f"gs://{GCS_BUCKET_NAME}/{ingest['blob_name']}")
+            operation = get_service_limits().call_write("speech", speech_client.long_running_recognize, config=build_recognition_config(ingest), audio=audio)
+            tracker.register(
+                operation.operation.name, owner=owner, file_name=file_name, cache_key=cache_key,
+                segment=index, segments=len(segments), start=start, length=length, duration=length,
+                blob_name=ingest["blob_name"], speech_offsets=ingest["offset_map"].to_list()
+            )
+            registered.append(operation.operation.name)
+            words = words_from_response(operation.result(timeout=3600))
+        finally:
+            try: bucket.blob(ingest["blob_name"]).delete()
+            except: pass
+        return ingest["offset_map"].map_words(words)
+
+    def on_progress(done, total):
+        report.progress(int(done * 100 / total), f"Transcribing {total} segments in parallel: {done}/{total} done")
+
+    result = transcribe_segments(segments, recognize, STT_MAX_PARALLEL, on_progress)
+    # Only now: if a segment failed, a retry still reuses the ones that finished
+    for name in {*registered, *(name for name, _ in earlier.values())}: tracker.finish(name)
+    return result
+
+def transcript_from_response(response, speech_offsets):
+    """Every result in the response -> (Transcript, text), word times mapped back past any VAD trim."""
+    transcript = Transcript.from_words(OffsetMap(speech_offsets).map_words(words_from_response(response)))
+    text = transcript.render()
+    if not text.strip():
+        text = " ".join(r.alternatives[0].transcript for r in response.results if r.alternatives)
+    return transcript, text
+
+def transcribe_recording(audio_file_path, file_name, report, owner="", cache_key=None):
+    """Ingest + Speech-to-Text. Returns {"full_transcript", "transcript", "speech_offsets", "ingest_stats"} or {"error"}."""
+    audio_blob_name = None
+    operation_in_flight = False
+    ingest_stats = {}
+    speech_offsets = []
+    try:
         progress_text = "Transcribing & identifying speakers..."
-        progress_bar = st.progress(0, text=progress_text)
-        
-        audio = speech.RecognitionAudio(uri=gcs_uri)
-        config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.FLAC,
-            language_code="en-US",
-            enable_automatic_punctuation=True,
-            use_enhanced=True,
-            model="video",
-            diarization_config=speech.SpeakerDiarizationConfig(
-                enable_speaker_diarization=True,
-                min_speaker_count=2,
-                max_speaker_count=6
+        probe = probe_audio(audio_file_path)
+        duration = probe["duration"] if probe else 0
+
+        if PARALLEL_STT and duration >= PARALLEL_STT_MIN_SEC:
+            report.progress(0, progress_text)
+            words, stt_timings = transcribe_in_segments(audio_file_path, file_name, duration, report, owner, cache_key)
+            report.clear_progress()
+            ingest_stats = {"stt": stt_timings}
+            report.note(f"Transcribed {len(stt_timings['segments'])} segments in {stt_timings['wall_seconds']:.0f}s "
+                       f"(serial equivalent {stt_timings['serial_seconds']:.0f}s).")
+            if not words:
+                return {"error": "Transcription failed. The audio might be silent."}
+            transcript = Transcript.from_words(words)
+            full_transcript_text = transcript.render()
+        else:
+            profile_label = TRANSCODE_PROFILE.replace("_", " ")
+            with report.stage(f"Converting {file_name} ({profile_label}) and uploading to Google Cloud Storage..."):
+                gcs_uri, ingest = ingest_audio_to_gcs(audio_file_path, run_blob_stem(file_name), report)
+                if not gcs_uri: return {"error": "Upload failed."}
+                audio_blob_name = ingest["blob_name"]
+                ingest_stats = ingest["stats"]
+                speech_offsets = ingest["offset_map"].to_list()
+                report.note(f"Ingest throughput — {format_stage_stats(ingest_stats)}")
+                if ingest_stats.get("vad", {}).get("removed_seconds"):
+                    report.note(f"Trimmed {ingest_stats['vad']['removed_seconds']:.0f}s of silence before transcription.")
+
+            report.progress(0, progress_text)
+
+            audio = speech.RecognitionAudio(uri=gcs_uri)
+            operation = get_service_limits().call_write("speech", speech_client.long_running_recognize, config=build_recognition_config(ingest), audio=audio)
+            # Remember the operation so a rerun/refresh can reattach instead of paying for it twice
+            operation_name = operation.operation.name
+            tracker = get_operation_tracker()
+            tracker.register(
+                operation_name, owner=owner, file_name=file_name,
+                cache_key=cache_key, blob_name=audio_blob_name, duration=duration,
+                ingest_stats=ingest_stats, speech_offsets=speech_offsets
             )
-        )
-        operation = speech_client.long_running_recognize(config=config, audio=audio)
-        
-        while not operation.done():
-            metadata = operation.metadata
-            if metadata and metadata.progress_percent:
-                progress_bar.progress(metadata.progress_percent, text=f"Transcribing: {metadata.progress_percent}%")
-            time.sleep(2)
+            operation_in_flight = True
 
-        progress_bar.progress(100, text="Transcription Complete")
-        response = operation.result(timeout=3600)
-        progress_bar.empty()
+            def on_progress(pct):
+                if pct: report.progress(pct, f"Transcribing: {pct}%")
 
-        if not response.results:
-             return {"error": "Transcription failed. The audio might be silent."}
-
-        result = response.results[-1]
-        words_info = result.alternatives[0].words
-        full_transcript_text = ""
-        current_speaker = -1
-        for word_info in words_info:
-            if word_info.speaker_tag != current_speaker:
-                current_speaker = word_info.speaker_tag
-                full_transcript_text += f"\n\nSpeaker {current_speaker}: "
-            full_transcript_text += word_info.word + " "
-        if not full_transcript_text.strip():
-            full_transcript_text = " ".join([result.alternatives[0].transcript for result in response.results])
-
-        with st.spinner("Analyzing conversation & matching names..."):
-            prompt = f"""
-            You are an expert meeting secretary. 
-            Here is the context of who was in the meeting:
-            {participants_context}
-            The transcript below uses "Speaker 1", "Speaker 2", etc.
-            Your job is to figure out which Speaker matches which Name from the list above.
-            Transcript:
-            {full_transcript_text}
-            ---
-            YOUR TASKS:
-            1. RECONSTRUCTION: When writing the notes, DO NOT use "Speaker 1". Use their REAL NAMES (e.g., "John said...").
-            2. EXTRACTION:
-            ## DISCUSSION ##
-            Summarize main points using the real names.
-            FORMAT:
-            ## Section Title (e.g., ## Content and Grammar)
-            * **Wording & Tone:** John requested avoiding the casual use of "You are".
-            * Bullet point 3.
-            (Leave a blank line between sections)
-            ## NEXT STEPS ##
-            List highly specific, actionable items. Avoid vague summaries.
-            FORMAT:
-            * **Action:** [Specific Task] (Assigned to: [Name]) - Deadline: [Time if mentioned]
-            ## CLIENT REQUESTS ##
-            List specific questions or requests asked BY the Client.
-            FORMAT:
-            * Bullet point 1.
-            """
-            response = gemini_model.generate_content(prompt)
-            text = response.text
-            
-            discussion = ""
-            next_steps = ""
-            client_reqs = ""
-            try:
-                if "## DISCUSSION ##" in text:
-                    discussion = text.split("## DISCUSSION ##")[1].split("## NEXT STEPS ##")[0].strip()
-                if "## NEXT STEPS ##" in text:
-                    next_steps = text.split("## NEXT STEPS ##")[1].split("## CLIENT REQUESTS ##")[0].strip()
-                if "## CLIENT REQUESTS ##" in text:
-                    client_reqs = text.split("## CLIENT REQUESTS ##")[1].strip()
-                if not discussion: discussion = text
-            except:
-                discussion = text
-
-            return {
-                "discussion": discussion,
-                "next_steps": next_steps,
-                "client_reqs": client_reqs,
-                "full_transcript": full_transcript_text
-            }
-    except Exception as e:
-        return {"error": str(e)}
+            response = wait_for_operation(operation, duration, on_progress)
+            operation_in_flight = False
+            tracker.finish(operation_name)
+
+            report.progress(100, "Transcription Complete")
+            report.clear_progress()
+
+            if not response.results:
+                 return {"error": "Transcription failed. The audio might be silent."}
+
+            transcript, full_transcript_text = transcript_from_response(response, speech_offsets)
+
+        return {
+            "full_transcript": full_transcript_text,
+            # Word timings, speakers & confidences (see transcription.Transcript.to_dict)
+            "transcript": transcript.to_dict(),
+            "ingest_stats": ingest_stats,
+            # [trimmed_start, original_start, length] spans: maps STT word times back to the recording
+            "speech_offsets": speech_offsets
+        }
     finally:
         try:
-            bucket = storage_client.bucket(GCS_BUCKET_NAME)
-            bucket.blob(flac_blob_name).delete()
+            # Keep the audio while Google is still reading it; the resume path cleans it up
+            if audio_blob_name and not operation_in_flight:
+                bucket = storage_client.bucket(GCS_BUCKET_NAME)
+                bucket.blob(audio_blob_name).delete()
+        except: pass
+
+def transcript_cache_params():
+    """Everything that changes the transcript for the same audio bytes."""
+    return {
+        "language_code": STT_LANGUAGE_CODE,
+        "model": STT_MODEL,
+        "speakers": [STT_MIN_SPEAKERS, STT_MAX_SPEAKERS],
+        "profile": TRANSCODE_PROFILE,
+        "vad": VAD_MIN_SILENCE_SEC if VAD_TRIM else None,
+        "segments": [PARALLEL_STT_MIN_SEC, STT_SEGMENT_SEC, STT_SEGMENT_OVERLAP_SEC] if PARALLEL_STT else None,
+    }
+
+def stream_gemini_text(prompt):
+    for chunk in gemini_model.generate_content(prompt, stream=True):
+        if chunk.parts: yield chunk.text
+
+def summarize_with_gemini(full_transcript, participants_context, final_prompt, on_text=None):
+    """One call for normal meetings; chunked map-reduce past SUMMARY_CHUNK_TOKENS. Returns (text, stats).
+    The final call is streamed into ``on_text`` piece by piece when given."""
+    summarizer = MapReduceSummarizer(lambda prompt: gemini_model.generate_content(prompt).text,
+                                     SUMMARY_CHUNK_TOKENS, SUMMARY_MAX_PARALLEL, stream=stream_gemini_text)
+    return summarizer.summarize(full_transcript, participants_context, final_prompt, on_text)
+
+# Review tab fields, keyed like ai_results, and the headers the summary prompt asks for
+REVIEW_SECTIONS = {"discussion": "DISCUSSION", "next_steps": "NEXT STEPS", "client_reqs": "CLIENT REQUESTS"}
+
+def summarize_transcript(full_transcript_text, participants_context, report):
+    """Gemini pass over the transcript. Returns the Review tab sections."""
+    def final_prompt(content):
+        return f"""
+        You are an expert meeting secretary. 
+        Here is the context of who was in the meeting:
+        {participants_context}
+        The transcript below uses "Speaker 1", "Speaker 2", etc.
+        Your job is to figure out which Speaker matches which Name from the list above.
+        Transcript:
+        {content}
+        ---
+        YOUR TASKS:
+        1. RECONSTRUCTION: When writing the notes, DO NOT use "Speaker 1". Use their REAL NAMES (e.g., "John said...").
+        2. EXTRACTION:
+        ## DISCUSSION ##
+        Summarize main points using the real names.
+        FORMAT:
+        ## Section Title (e.g., ## Content and Grammar)
+        * **Wording & Tone:** John requested avoiding the casual use of "You are".
+        * Bullet point 3.
+        (Leave a blank line between sections)
+        ## NEXT STEPS ##
+        List highly specific, actionable items. Avoid vague summaries.
+        FORMAT:
+        * **Action:** [Specific Task] (Assigned to: [Name]) - Deadline: [Time if mentioned]
+        ## CLIENT REQUESTS ##
+        List specific questions or requests asked BY the Client.
+        FORMAT:
+        * Bullet point 1.
+        """
+
+    with report.stage("Analyzing conversation & matching names..."):
+        parser = SectionStreamParser(REVIEW_SECTIONS)
+        text, summary_stats = summarize_with_gemini(full_transcript_text, participants_context, final_prompt,
+                                                    lambda piece: report.sections(parser.feed(piece)))
+        report.note(format_summary_stats(summary_stats))
+
+        # Re-parse the whole response (also covers a non-streamed one) with the same header rules as the preview
+        sections = parse_sections(text, REVIEW_SECTIONS)
+        if not sections["discussion"]: sections["discussion"] = text
+
+        report.sections(sections, force=True)
+        return {**sections, "summary_stats": summary_stats}
+
+def get_structured_notes_google(audio_file_path, file_name, participants_context, report=None, owner=""):
+    report = report or StreamlitReporter()
+    try:
+        cache = get_transcript_cache()
+        cache_key = cache.key_for(audio_file_path, transcript_cache_params())
+        transcript = cache.get(cache_key)
+        if transcript:
+            report.note("♻️ Same recording & settings analysed before — reusing the cached transcript.")
+        else:
+            transcript = transcribe_recording(audio_file_path, file_name, report, owner, cache_key)
+            if "error" in transcript: return transcript
+            cache.put(cache_key, transcript)
+
+        return {**summarize_transcript(transcript["full_transcript"], participants_context, report), **transcript}
+    except Exception as e:
+        return {"error": str(e)}
+
+def resume_structured_notes(operation_name, participants_context, owner, report=None):
+    """Reattaches to an in-flight transcription (after a rerun/refresh) and finishes the analysis."""
+    report = report or StreamlitReporter()
+    tracker = get_operation_tracker()
+    info = tracker.get(operation_name, owner)
+    if not info or info.get("segment") is not None: return {"error": "That transcription is no longer being tracked."}
+    try:
+        operation = reattach_operation(speech_client, operation_name)
+        report.progress(0, "Reattached — transcribing...")
+        response = wait_for_operation(
+            operation, info.get("duration", 0),
+            lambda pct: report.progress(pct or 0, f"Transcribing: {pct or 0}%")
+        )
+        report.clear_progress()
+        tracker.finish(operation_name)
+        try: storage_client.bucket(GCS_BUCKET_NAME).blob(info["blob_name"]).delete()
         except: pass
 
+        if not response.results:
+            return {"error": "Transcription failed. The audio might be silent."}
+        structured, text = transcript_from_response(response, info.get("speech_offsets", []))
+        transcript = {
+            "full_transcript": text,
+            "transcript": structured.to_dict(),
+            "ingest_stats": info.get("ingest_stats", {}),
+            "speech_offsets": info.get("speech_offsets", [])
+        }
+        if info.get("cache_key"): get_transcript_cache().put(info["cache_key"], transcript)
+        return {**summarize_transcript(transcript["full_transcript"], participants_context, report), **transcript}
+    except Exception as e:
+        return {"error": str(e)}
+
+# --- Background analysis jobs (no st.* calls: these run on worker threads) ---
+def run_analysis_job(job, audio_file_path, file_name, participants_context, owner):
+    with ArtifactTracker() as artifacts:
+        artifacts.add(audio_file_path)
+        res = get_structured_notes_google(audio_file_path, file_name, participants_context, JobReporter(job), owner)
+    if "error" in res: raise RuntimeError(res["error"])
+    return {"ai_results": res, "participants": participants_context}
+
+def run_resume_job(job, operation_name, participants_context, owner, file_name=None):
+    res = resume_structured_notes(operation_name, participants_context, owner, JobReporter(job))
+    if "error" in res: raise RuntimeError(res["error"])
+    return {"ai_results": res, "participants": participants_context}
+
+def split_participants(participants_input):
+    c_list = [l.replace("(Client)","").strip() for l in participants_input.split('\n') if "(Client)" in l]
+    i_list = [l.replace("(iFoundries)","").strip() for l in participants_input.split('\n') if "(iFoundries)" in l]
+    return "\n".join(c_list), ", ".join(i_list)
+
+def open_job_result(job_id):
+    """Loads a finished job into the Review & Chat tabs."""
+    job = get_job_queue().store.get(job_id)
+    if not job or job["owner"] != session_owner() or not job["result"]: return False
+    st.session_state.ai_results = job["result"]["ai_results"]
+    st.session_state.saved_participants_input = job["result"]["participants"]
+    st.session_state.auto_client_reps, st.session_state.auto_ifoundries_reps = split_participants(job["result"]["participants"])
+    st.session_state.chat_history = []
+    st.session_state.live_job = None
+    st.session_state.publish = None
+    if CHAT_RETRIEVAL: get_meeting_index(st.session_state.ai_results.get("full_transcript", ""))
+    return True
+
+@st.fragment(run_every=2)
+def render_live_review():
+    """Review fields filled from the summary as it streams in; the editable result replaces them when the job ends."""
+    job = get_job_queue().store.get(st.session_state.live_job, with_result=False)
+    if not job or job["status"] in (DONE, FAILED):
+        if job and job["status"] == DONE: open_job_result(job["id"])
+        st.session_state.live_job = None
+        st.rerun()
+    partial = job["partial"] or {}
+    st.info(f"⏳ **{job['title']}**: {job['stage']} Sections appear here as they are written.")
+    st.text_area("Discussion", value=partial.get("discussion", ""), height=300, disabled=True)
+    st.text_area("Next Steps", value=partial.get("next_steps", ""), height=200, disabled=True)
+    with st.expander("View Specific Client Requests"):
+        st.text_area("Client Requests", value=partial.get("client_reqs", ""), height=150, disabled=True)
+
 def add_formatted_text(cell, text):
     """Original simple parser for main doc."""
     cell.text = ""
@@ -580,6 +995,10 @@ if "auto_ifoundries_reps" not in st.session_state:
     st.session_state.auto_ifoundries_reps = ""
 if "saved_participants_input" not in st.session_state:
     st.session_state.saved_participants_input = ""
+if "live_job" not in st.session_state:
+    st.session_state.live_job = None
+if "publish" not in st.session_state:
+    st.session_state.publish = None
 
 st.title("🤖 AI Meeting Manager")
 
@@ -593,29 +1012,89 @@ with tab1:
         help="The AI will read this to match 'Speaker 1' to these names."
     )
     uploaded_file = st.file_uploader("Upload Meeting", type=["mp3", "mp4", "m4a", "wav"])
+    cache_stats = get_transcript_cache().stats()
+    st.caption(f"Transcript cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses · "
+               f"{cache_stats['entries']} entries ({cache_stats['bytes'] / 1e6:.1f} MB)")
+    if get_gemini_cache():
+        gemini_stats = get_gemini_cache().stats()
+        st.caption(f"Gemini cache: {gemini_stats['hit_rate']:.0%} hit rate · {gemini_stats['entries']} entries · "
+                   f"{gemini_stats['seconds_saved']:.0f}s of model time saved")
+    limit_stats = format_limit_stats(get_service_limits().stats())
+    if limit_stats:
+        st.caption(f"API usage since restart: {limit_stats}")
     
+    owner = session_owner()
+    job_queue = get_job_queue()
+    active_files = {j["params"].get("file_name") for j in job_queue.store.list(owner) if j["status"] in (QUEUED, RUNNING)}
+
+    # --- In-flight transcriptions from an earlier run that no job is polling any more ---
+    segmented = {}
+    for op_name, op_info in get_operation_tracker().pending(owner):
+        if op_info.get("file_name") in active_files: continue
+        # Segments of one recording aren't resumable on their own: analysing it again picks them up
+        if op_info.get("segment") is not None:
+            segmented.setdefault(op_info.get("cache_key") or op_name, []).append((op_name, op_info))
+            continue
+        started = datetime.datetime.fromtimestamp(op_info["started"]).strftime("%d %b %H:%M")
+        op_col1, op_col2, op_col3 = st.columns([6, 2, 2])
+        op_col1.info(f"⏳ Transcription of **{op_info.get('file_name', 'recording')}** started {started} is still running.")
+        if op_col2.button("Resume", key=f"resume_{op_name}"):
+            st.session_state.live_job = job_queue.submit(owner, "resume", op_info.get("file_name", "Recording"), run_resume_job, {
+                "operation_name": op_name, "participants_context": participants_input, "owner": owner, "file_name": op_info.get("file_name")
+            })
+            st.rerun()
+        if op_col3.button("Discard", key=f"discard_{op_name}"):
+            get_operation_tracker().finish(op_name)
+            st.rerun()
+    for key, ops in segmented.items():
+        op_info = ops[0][1]
+        seg_col1, seg_col2 = st.columns([8, 2])
+        seg_col1.info(
+            f"⏳ **{op_info.get('file_name', 'recording')}** was being transcribed in {op_info.get('segments', len(ops))} segments. "
+            f"Analyze it again to reuse the {len(ops)} already started."
+        )
+        if seg_col2.button("Discard", key=f"discard_segments_{key}"):
+            for op_name, _ in ops:
+                get_operation_tracker().finish(op_name)
+            st.rerun()
+
     if st.button("Analyze Audio"):
         if uploaded_file:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name}") as tmp:
-                tmp.write(uploaded_file.getvalue())
-                path = tmp.name
-            
-            st.session_state.chat_history = [] 
-            st.session_state.saved_participants_input = participants_input 
-            
-            c_list = [l.replace("(Client)","").strip() for l in participants_input.split('\n') if "(Client)" in l]
-            i_list = [l.replace("(iFoundries)","").strip() for l in participants_input.split('\n') if "(iFoundries)" in l]
-            st.session_state.auto_client_reps = "\n".join(c_list)
-            st.session_state.auto_ifoundries_reps = ", ".join(i_list)
-            
-            res = get_structured_notes_google(path, uploaded_file.name, participants_input)
-            if "error" in res: st.error(res["error"])
-            else: 
-                st.session_state.ai_results = res
-                st.success("Analysis Complete!")
+            path = spool_upload(uploaded_file, upload_spool_dir())
+
+            st.session_state.live_job = job_queue.submit(owner, "analyze", uploaded_file.name, run_analysis_job, {
+                "audio_file_path": path, "file_name": uploaded_file.name,
+                "participants_context": participants_input, "owner": owner
+            })
+            st.success("Queued! You can keep working — the Review tab fills in as the summary is written.")
         else:
             st.warning("Please upload a file first.")
 
+    # --- Job queue (refreshes itself while this tab is open) ---
+    @st.fragment(run_every=3)
+    def render_job_queue():
+        jobs = get_job_queue().store.list(owner=session_owner(), limit=10)
+        if not jobs: return
+        st.subheader("Analysis Jobs")
+        for job in jobs:
+            created = datetime.datetime.fromtimestamp(job["created"]).strftime("%d %b %H:%M")
+            j_col1, j_col2, j_col3 = st.columns([6, 2, 2])
+            with j_col1:
+                st.markdown(f"**{job['title']}** · {created} · `{job['status']}`")
+                if job["status"] in (QUEUED, RUNNING):
+                    st.progress(job["progress"] or 0, text=f"{job['stage']} {job['message'] or ''}".strip())
+                elif job["status"] == FAILED:
+                    st.caption(f"❌ {job['error']}")
+            if job["status"] == DONE and j_col2.button("Open", key=f"open_{job['id']}"):
+                if open_job_result(job["id"]):
+                    st.toast("Loaded! Check the Review and Chat tabs.")
+                    st.rerun()
+            if job["status"] in (DONE, FAILED) and j_col3.button("Remove", key=f"rm_{job['id']}"):
+                get_job_queue().store.delete(job["id"])
+                st.rerun()
+
+    render_job_queue()
+
 with tab2:
     st.header("2. Review Notes")
     
@@ -637,10 +1116,15 @@ with tab2:
     date_str = date_obj.strftime("%d %B %Y")
     time_str = time_obj
     
-    discussion_text = st.text_area("Discussion", value=st.session_state.ai_results.get("discussion", ""), height=300)
-    next_steps_text = st.text_area("Next Steps", value=st.session_state.ai_results.get("next_steps", ""), height=200)
-    with st.expander("View Specific Client Requests"):
-        st.text_area("Client Requests", value=st.session_state.ai_results.get("client_reqs", ""), height=150)
+    if st.session_state.live_job:
+        render_live_review()
+        discussion_text = st.session_state.ai_results.get("discussion", "")
+        next_steps_text = st.session_state.ai_results.get("next_steps", "")
+    else:
+        discussion_text = st.text_area("Discussion", value=st.session_state.ai_results.get("discussion", ""), height=300)
+        next_steps_text = st.text_area("Next Steps", value=st.session_state.ai_results.get("next_steps", ""), height=200)
+        with st.expander("View Specific Client Requests"):
+            st.text_area("Client Requests", value=st.session_state.ai_results.get("client_reqs", ""), height=150)
 
     st.divider()
     st.header("3. Generate & Upload")
@@ -657,24 +1141,33 @@ with tab2:
     do_basecamp = st.checkbox("Upload to Basecamp") 
 
     if do_basecamp:
-        bc_session_user = get_basecamp_session_user()
+        bc_client = get_basecamp_client()
+        bc_session_user = bc_client.session if bc_client else None
         try:
-            projects_list = get_basecamp_projects(bc_session_user)
+            if bc_client and st.button("↻ Refresh Basecamp lists", help="Projects and lists are cached for a few minutes."): bc_client.invalidate()
+            projects_list = get_basecamp_projects(bc_client)
             if not projects_list:
                 st.warning("No active Basecamp projects found.")
             else:
-                selected_project_name = st.selectbox("Select Project", options=[p[0] for p in projects_list], index=None, placeholder="Choose...")
+                listing = bc_client.projects()
+                project_names = [p[0] for p in projects_list]
+                # Options grow while later pages load: keep the pick across those reruns
+                prev_project = st.session_state.get("bc_project_name")
+                selected_project_name = st.selectbox("Select Project", options=project_names, index=project_names.index(prev_project) if prev_project in project_names else None, placeholder="Choose...")
+                st.session_state.bc_project_name = selected_project_name
+                if not listing.done: render_listing_progress(listing, "projects", listing.pages)
+                elif listing.error: st.caption(f"⚠️ Only {len(listing.items)} projects loaded: {listing.error}")
                 
                 if selected_project_name:
                     bc_project_id = next(p[1] for p in projects_list if p[0] == selected_project_name)
                     bc_tool_type = st.selectbox("Where to post?", ["To-dos", "Message Board", "Docs & Files"], index=0)
-                    project_tools = get_project_tools(bc_session_user, bc_project_id)
+                    project_tools = get_project_tools(bc_client, bc_project_id)
                     
                     if bc_tool_type == "To-dos":
                         todoset = next((t for t in project_tools if t['name'] == 'todoset'), None)
                         if todoset:
                             bc_tool_id = todoset['id']
-                            todolists = get_todolists(bc_session_user, todoset['id'], bc_project_id)
+                            todolists = get_todolists(bc_client, todoset['id'], bc_project_id)
                             if todolists:
                                 selected_list = st.selectbox("Select Todo List", options=[tl[0] for tl in todolists])
                                 if selected_list:
@@ -731,30 +1224,21 @@ with tab2:
                 
                 bio = io.BytesIO()
                 doc.save(bio)
-                bio.seek(0)
                 fname = f"Minutes_{date_str}.docx"
-                
-                if do_drive and st.session_state.gdrive_creds:
-                    with st.spinner("Uploading to Drive ('Meeting Notes' folder)..."):
-                        if upload_to_drive_user(bio, fname, "Meeting Notes"): st.success("✅ Uploaded to Drive!")
-                        else: st.error("Drive upload failed.")
-                    bio.seek(0)
 
+                # Drive and Basecamp in parallel; each reports (and retries) on its own
+                basecamp = None
                 if do_basecamp and basecamp_ready and bc_session_user:
-                    with st.spinner(f"Posting to Basecamp ({bc_tool_type})..."):
-                        file_bytes = bio.getvalue()
-                        sgid = upload_bc_attachment(bc_session_user, file_bytes, fname)
-                        if sgid:
-                            if post_to_basecamp(bc_session_user, bc_project_id, bc_tool_type, bc_tool_id, bc_sub_id, bc_title, bc_content, sgid):
-                                st.success(f"✅ Posted to Basecamp!")
-                            else: st.error("Basecamp post failed.")
-                        else: st.error("Basecamp upload failed.")
-                    bio.seek(0)
-
-                st.download_button("Download .docx", bio, fname)
-                
+                    basecamp = {"session": bc_session_user, "project_id": bc_project_id, "tool_type": bc_tool_type,
+                                "tool_id": bc_tool_id, "sub_id": bc_sub_id, "title": bc_title, "content": bc_content}
+                destinations = publish_destinations(bio.getvalue(), fname, "Meeting Notes" if do_drive else None, basecamp)
+                with st.spinner("Publishing..."):
+                    destinations, seconds = publish(destinations, PUBLISH_RETRIES)
+                st.session_state.publish = {"destinations": destinations, "seconds": seconds, "bytes": bio.getvalue(), "file_name": fname}
+
             except Exception as e:
                 st.error(f"Error: {e}")
+    if st.session_state.publish: render_publish_status()
 
 with tab3:
     st.header("💬 Chat with your Meeting")
@@ -794,9 +1278,14 @@ with tab3:
     if not transcript_context:
         st.info("⚠️ Please upload and analyze a meeting audio file in Tab 1 first.")
     else:
-        if st.button("Clear Chat"):
+        c_col1, c_col2 = st.columns([2, 8])
+        if c_col1.button("Clear Chat"):
             st.session_state.chat_history = []
             st.rerun()
+        use_retrieval = CHAT_RETRIEVAL and c_col2.toggle(
+            "Relevant passages only", value=True,
+            help="Send the most relevant parts of the transcript with each question instead of all of it."
+        )
 
         chat_container = st.container(height=500)
         
@@ -808,6 +1297,7 @@ with tab3:
                 else:
                     with st.chat_message("assistant", avatar="🤖"):
                         st.markdown(message["content"])
+                        if message.get("metrics"): st.caption(message["metrics"])
 
         if prompt := st.chat_input("Ask a question about the meeting..."):
             st.session_state.chat_history.append({"role": "user", "content": prompt})
@@ -818,16 +1308,23 @@ with tab3:
 
             with chat_container:
                 with st.chat_message("assistant", avatar="🤖"):
-                    def stream_text(response_iterator):
-                        for chunk in response_iterator:
-                            if chunk.parts:
-                                yield chunk.text
+                    if use_retrieval:
+                        index = get_meeting_index(transcript_context)
+                        ai = st.session_state.ai_results
+                        transcript_part = (
+                            f"MEETING NOTES:\n{ai.get('discussion', '')}\n{ai.get('next_steps', '')}\n{ai.get('client_reqs', '')}\n"
+                            f"RELEVANT TRANSCRIPT EXCERPTS (in meeting order):\n{index.context_for(prompt, CHAT_TOP_K)}"
+                        )
+                        mode = f"retrieval top-{CHAT_TOP_K}/{len(index)}"
+                    else:
+                        transcript_part = f"TRANSCRIPT: {transcript_context}"
+                        mode = "full transcript"
 
                     try:
                         full_prompt = f"""
                         You are an efficient, action-oriented meeting secretary.
                         CONTEXT: {participants_context}
-                        TRANSCRIPT: {transcript_context}
+                        {transcript_part}
                         USER QUESTION: {prompt}
                         STRICT RULES:
                         1. Passive/Professional Voice.
@@ -835,8 +1332,11 @@ with tab3:
                         3. Accuracy.
                         4. Conciseness.
                         """
+                        metrics = ChatTurnMetrics(mode, full_prompt)
                         stream_iterator = gemini_model.generate_content(full_prompt, stream=True)
-                        response = st.write_stream(stream_text(stream_iterator))
-                        st.session_state.chat_history.append({"role": "assistant", "content": response})
+                        response = st.write_stream(metrics.stream(stream_iterator))
+                        st.caption(metrics.caption())
+                        record_chat_metrics(os.path.join(LOCAL_CACHE_DIR, "chat_metrics.jsonl"), metrics)
+                        st.session_state.chat_history.append({"role": "assistant", "content": response, "metrics": metrics.caption()})
                     except Exception as e:
                         st.error("I couldn't generate a response. Please try again.")
@@ -2,12 +2,10 @@ import streamlit as st
 import streamlit.components.v1 as components
 import os
 import shutil
-import tempfile
 from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 import io
 import time
-import subprocess
 import pickle
 import json
 import datetime
@@ -15,6 +13,7 @@ import pytz
 import re
 import requests
 from requests_oauthlib import OAuth2Session
+from concurrent.futures import ThreadPoolExecutor
 
 # --- FIX: ALLOW OAUTH TO RUN ON STREAMLIT CLOUD ---
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
@@ -31,12 +30,39 @@ from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
 from google.oauth2 import service_account
 
+# Local helpers
+from frame_sampling import probe_video, sample_frames
+from audio_pipeline import ingest_audio, probe_audio, run_blob_stem, format_stage_stats, OffsetMap, TRANSCODE_PROFILES, DEFAULT_PROFILE
+from transcription import plan_segments, transcribe_segments, words_from_response, Transcript
+from transcript_cache import TranscriptCache
+from stt_operations import OperationTracker, wait_for_operation, reattach_operation
+from jobs import JobQueue, JobStore, QUEUED, RUNNING, DONE, FAILED
+from reporting import StreamlitReporter, JobReporter
+from uploads import ArtifactTracker, spool_upload, sweep_stale
+from summarization import MapReduceSummarizer, SectionStreamParser, format_summary_stats
+from gemini_cache import GeminiCache, CachedModel
+from rate_limits import RateLimitedModel, ServiceLimits, format_limit_stats, is_idempotent, limit_session
+from basecamp_client import BasecampClients, token_key
+from drive_cache import DriveServiceCache, FolderCache, account_key
+from retrieval import BM25Index, ChatTurnMetrics, record_chat_metrics
+from meeting_search import MeetingIndex, gemini_embedder
+from meeting_folder import DriveFolder, history_entry
+from meeting_manifest import ManifestStore
+from meeting_mirror import DriveSource, MeetingMirror
+from chat_log import ChatLogWriter
+from publishing import Destination, format_publish_summary, publish
+from meeting_storage import GZIP_MIME, decode, encode, merge_transcript, needs_transcript, part_names, split_analysis, transcript_fields, transcript_ref
+
 # -----------------------------------------------------
 # 1. CONSTANTS & CONFIGURATION
 # -----------------------------------------------------
 st.set_page_config(layout="wide", page_title="AI Meeting Manager", page_icon="🤖")
 
 # --- Load App Keys from Secrets ---
+def secret_flag(name, default):
+    """On/off secret. bool("false") is True, so string values are parsed; TOML booleans work as-is."""
+    return str(st.secrets.get(name, default)).strip().lower() in ("1", "true", "yes", "on")
+
 try:
     GCS_BUCKET_NAME = st.secrets["GCS_BUCKET_NAME"]
     GOOGLE_API_KEY = st.secrets["GOOGLE_API_KEY"]
@@ -45,6 +71,75 @@ try:
     BASECAMP_CLIENT_ID = st.secrets["BASECAMP_CLIENT_ID"]
     BASECAMP_CLIENT_SECRET = st.secrets["BASECAMP_CLIENT_SECRET"]
     BASECAMP_ACCOUNT_ID = st.secrets["BASECAMP_ACCOUNT_ID"]
+
+    # --- AUDIO INGEST ---
+    # Pipe ffmpeg straight into a resumable GCS upload instead of writing a .flac first
+    STREAMING_INGEST = secret_flag("STREAMING_INGEST", True)
+    # speech_flac (16 kHz mono), speech_opus (~10x smaller) or source_flac (legacy)
+    TRANSCODE_PROFILE = st.secrets.get("TRANSCODE_PROFILE", DEFAULT_PROFILE)
+    if TRANSCODE_PROFILE not in TRANSCODE_PROFILES:
+        raise ValueError(f"Unknown TRANSCODE_PROFILE '{TRANSCODE_PROFILE}'")
+    LOCAL_CACHE_DIR = st.secrets.get("LOCAL_CACHE_DIR", ".cache")
+    # Cut long silences (waiting rooms, mute gaps) before upload; timestamps are mapped back
+    VAD_TRIM = secret_flag("VAD_TRIM", True)
+    VAD_MIN_SILENCE_SEC = float(st.secrets.get("VAD_MIN_SILENCE_SEC", 3.0))
+
+    # --- PARALLEL TRANSCRIPTION ---
+    # Recordings longer than PARALLEL_STT_MIN_SEC are split into overlapping segments
+    PARALLEL_STT = secret_flag("PARALLEL_STT", True)
+    PARALLEL_STT_MIN_SEC = float(st.secrets.get("PARALLEL_STT_MIN_SEC", 1200))
+    STT_SEGMENT_SEC = float(st.secrets.get("STT_SEGMENT_SEC", 600))
+    STT_SEGMENT_OVERLAP_SEC = float(st.secrets.get("STT_SEGMENT_OVERLAP_SEC", 15))
+    STT_MAX_PARALLEL = int(st.secrets.get("STT_MAX_PARALLEL", 4))
+
+    # --- TRANSCRIPT CACHE ---
+    TRANSCRIPT_CACHE_MAX_MB = float(st.secrets.get("TRANSCRIPT_CACHE_MAX_MB", 500))
+
+    # --- BACKGROUND JOBS ---
+    ANALYSIS_WORKERS = int(st.secrets.get("ANALYSIS_WORKERS", 2))
+
+    # --- SUMMARISATION ---
+    # Transcripts over this many (estimated) tokens are summarised map-reduce style
+    SUMMARY_CHUNK_TOKENS = int(st.secrets.get("SUMMARY_CHUNK_TOKENS", 60000))
+    SUMMARY_MAX_PARALLEL = int(st.secrets.get("SUMMARY_MAX_PARALLEL", 4))
+
+    # --- CHAT ---
+    # Send only the top-k BM25 passages per question instead of the whole transcript
+    CHAT_RETRIEVAL = secret_flag("CHAT_RETRIEVAL", True)
+    CHAT_TOP_K = int(st.secrets.get("CHAT_TOP_K", 6))
+    CHAT_PASSAGE_TOKENS = int(st.secrets.get("CHAT_PASSAGE_TOKENS", 300))
+
+    # --- GEMINI RESPONSE CACHE ---
+    GEMINI_CACHE = secret_flag("GEMINI_CACHE", True)
+    GEMINI_CACHE_TTL_HOURS = float(st.secrets.get("GEMINI_CACHE_TTL_HOURS", 168))
+    GEMINI_CACHE_MAX_ENTRIES = int(st.secrets.get("GEMINI_CACHE_MAX_ENTRIES", 2000))
+
+    # --- API RATE LIMITS (shared by every session in the process) ---
+    BASECAMP_REQUESTS_PER_10S = int(st.secrets.get("BASECAMP_REQUESTS_PER_10S", 50))
+    GEMINI_REQUESTS_PER_MIN = int(st.secrets.get("GEMINI_REQUESTS_PER_MIN", 120))
+    API_MAX_RETRIES = int(st.secrets.get("API_MAX_RETRIES", 4))
+    # Cross-meeting search: full-text always, plus Gemini embeddings for semantic matches
+    MEETING_SEARCH_EMBEDDINGS = secret_flag("MEETING_SEARCH_EMBEDDINGS", True)
+    # How long a search waits for its query embedding before answering from full-text ranking alone
+    MEETING_SEARCH_QUERY_BUDGET_SEC = float(st.secrets.get("MEETING_SEARCH_QUERY_BUDGET_SEC", 2.0))
+
+    # --- MEETING METADATA (VISION) ---
+    VISION_FRAMES = int(st.secrets.get("VISION_FRAMES", 3))
+    VISION_SCENE_WINDOW_SEC = float(st.secrets.get("VISION_SCENE_WINDOW_SEC", 0))
+
+    # --- HISTORY ---
+    HISTORY_PAGE_SIZE = int(st.secrets.get("HISTORY_PAGE_SIZE", 20))
+    # History reads a local SQLite mirror of Meeting_Data, synced from Drive at most this often
+    MIRROR_SYNC_SECONDS = int(st.secrets.get("MIRROR_SYNC_SECONDS", 60))
+    MIRROR_FULL_SYNC_MINUTES = int(st.secrets.get("MIRROR_FULL_SYNC_MINUTES", 60))
+
+    # --- PUBLISHING ---
+    # Automatic retries per destination (Drive / Basecamp) for transient failures; failed ones can also be retried by hand
+    PUBLISH_RETRIES = int(st.secrets.get("PUBLISH_RETRIES", 1))
+
+    # --- BASECAMP METADATA ---
+    # Projects, docks and to-do lists are reused this long, then revalidated with ETags (304 = no body)
+    BASECAMP_CACHE_TTL_SEC = int(st.secrets.get("BASECAMP_CACHE_TTL_SEC", 300))
     
     # --- AUTO-LOGIN LOGIC ---
     STREAMLIT_APP_URL = st.secrets.get("STREAMLIT_APP_URL", None)
@@ -66,6 +161,41 @@ BASECAMP_TOKEN_URL = "https://launchpad.37signals.com/authorization/token"
 BASECAMP_API_BASE = f"https://3.basecampapi.com/{BASECAMP_ACCOUNT_ID}"
 BASECAMP_USER_AGENT = {"User-Agent": "AI Meeting Notes App (external-user)"}
 
+# Speech-to-Text
+STT_LANGUAGE_CODE = "en-US"
+STT_MODEL = "video"
+STT_MIN_SPEAKERS = 2
+STT_MAX_SPEAKERS = 6
+
+@st.cache_resource
+def get_service_limits():
+    # Process-wide: quotas belong to the app's keys, not to a browser session
+    return ServiceLimits({
+        "basecamp": {"rate": BASECAMP_REQUESTS_PER_10S, "per": 10.0, "concurrency": 4},
+        "gemini": {"rate": GEMINI_REQUESTS_PER_MIN, "per": 60.0, "concurrency": 8},
+    }, API_MAX_RETRIES)
+
+def drive_execute(request):
+    """``request.execute()`` for a Drive API request, rate-limited and retried (creates only when nothing was sent)."""
+    if is_idempotent(getattr(request, "method", "GET")): return get_service_limits().call("drive", request.execute)
+    return get_service_limits().call_write("drive", request.execute)
+
+@st.cache_resource
+def get_drive_services():
+    # One built service per credential token and thread (httplib2 connections are not thread-safe)
+    return DriveServiceCache(lambda creds: build("drive", "v3", credentials=creds))
+
+@st.cache_resource
+def get_drive_folders():
+    # Folder IDs per Drive account, so uploads skip the lookup query
+    return FolderCache(drive_execute)
+
+@st.cache_resource
+def get_gemini_cache():
+    # Process-wide and on disk: identical prompts (reruns, re-analysis, same thumbnail) skip the API
+    if not GEMINI_CACHE: return None
+    return GeminiCache(os.path.join(LOCAL_CACHE_DIR, "gemini"), int(GEMINI_CACHE_TTL_HOURS * 3600), GEMINI_CACHE_MAX_ENTRIES)
+
 # --- API CLIENTS SETUP ---
 try:
     sa_creds = service_account.Credentials.from_service_account_info(GCP_SERVICE_ACCOUNT_JSON)
@@ -73,181 +203,413 @@ try:
     speech_client = speech.SpeechClient(credentials=sa_creds)
     
     genai.configure(api_key=GOOGLE_API_KEY)
-    gemini_model = genai.GenerativeModel('gemini-2.5-flash-lite')
+    gemini_model = CachedModel(RateLimitedModel(genai.GenerativeModel('gemini-2.5-flash-lite'), get_service_limits()["gemini"]), get_gemini_cache())
+    vision_model = CachedModel(RateLimitedModel(genai.GenerativeModel('gemini-2.5-flash-lite'), get_service_limits()["gemini"]), get_gemini_cache())
 except Exception as e:
     st.error(f"System Error (AI Services): {e}")
     st.stop()
 
+def upload_spool_dir():
+    return os.path.join(LOCAL_CACHE_DIR, "uploads")
+
+@st.cache_resource
+def get_job_queue():
+    # Process-wide: jobs keep running when the session that queued them goes away
+    os.makedirs(LOCAL_CACHE_DIR, exist_ok=True)
+    sweep_stale(upload_spool_dir())  # spooled uploads orphaned by a restart
+    return JobQueue(JobStore(os.path.join(LOCAL_CACHE_DIR, "jobs.sqlite3")), ANALYSIS_WORKERS)
+
+@st.cache_resource(max_entries=32)
+def get_meeting_index(full_transcript):
+    # Built once per transcript and shared by every session chatting about that meeting
+    return BM25Index.from_transcript(full_transcript, CHAT_PASSAGE_TOKENS)
+
+@st.cache_resource
+def get_meeting_search(account):
+    # One index per Drive account (drive_cache.account_key): Meeting_Data lives in each user's own Drive.
+    # Not the display name: two users can share one, and it is "" when the Basecamp lookup fails.
+    directory = os.path.join(LOCAL_CACHE_DIR, "meeting_index")
+    os.makedirs(directory, exist_ok=True)
+    embed = gemini_embedder(genai, limiter=get_service_limits()["gemini"]) if MEETING_SEARCH_EMBEDDINGS else None
+    return MeetingIndex(os.path.join(directory, f"{account}.sqlite3"), embed, CHAT_PASSAGE_TOKENS, MEETING_SEARCH_QUERY_BUDGET_SEC)
+
+@st.cache_resource
+def get_meeting_manifests():
+    # Process-wide: one cached manifest and writer lock per Meeting_Data folder
+    return ManifestStore()
+
+@st.cache_resource
+def get_meeting_mirror(account):
+    # Per Drive account, like the search index it keeps up to date: a full sync drops rows missing from *this* Drive
+    directory = os.path.join(LOCAL_CACHE_DIR, "meeting_mirror")
+    os.makedirs(directory, exist_ok=True)
+    return MeetingMirror(os.path.join(directory, f"{account}.sqlite3"), get_meeting_search(account),
+                         full_every=MIRROR_FULL_SYNC_MINUTES * 60)
+
+@st.cache_resource
+def get_chat_logs():
+    # Process-wide: batches each meeting's new chat turns into small delta files on a background thread
+    return ChatLogWriter()
+
+@st.cache_resource
+def get_operation_tracker():
+    return OperationTracker(os.path.join(LOCAL_CACHE_DIR, "stt_operations.json"))
+
+@st.cache_resource
+def get_transcript_cache():
+    # One instance per process so hit/miss counters are shared across sessions
+    return TranscriptCache(os.path.join(LOCAL_CACHE_DIR, "transcripts"), int(TRANSCRIPT_CACHE_MAX_MB * 1024 * 1024))
+
 # =====================================================
 # 2. HELPER FUNCTIONS
 # =====================================================
 
-def fetch_basecamp_name(token_dict):
+def fetch_basecamp_identity(token_dict):
+    """(real name, identity id) from Basecamp's authorization.json, or ("", "")."""
     try:
         identity_url = "https://launchpad.37signals.com/authorization.json"
         headers = {"Authorization": f"Bearer {token_dict['access_token']}", "User-Agent": "AI Meeting Notes App"}
-        response = requests.get(identity_url, headers=headers)
+        response = get_service_limits().call("basecamp", requests.get, identity_url, headers=headers)
         if response.status_code == 200:
             data = response.json()
-            return f"{data.get('identity', {}).get('first_name', '')} {data.get('identity', {}).get('last_name', '')}".strip()
-    except: return ""
-    return ""
+            identity = data.get('identity', {})
+            return f"{identity.get('first_name', '')} {identity.get('last_name', '')}".strip(), str(identity.get('id') or "")
+    except: return "", ""
+    return "", ""
 
-def get_basecamp_session_user():
-    if not st.session_state.basecamp_token: return None
-    session = OAuth2Session(BASECAMP_CLIENT_ID, token=st.session_state.basecamp_token)
+def session_owner():
+    """Key for this user's jobs and STT operations. Display names collide (and are "" when the lookup failed), so never those."""
+    if st.session_state.user_account_id: return f"basecamp:{st.session_state.user_account_id}"
+    return f"token:{token_key(st.session_state.basecamp_token)}"
+
+def make_basecamp_session(token):
+    session = OAuth2Session(BASECAMP_CLIENT_ID, token=token)
     session.headers.update(BASECAMP_USER_AGENT)
-    return session
+    return limit_session(session, get_service_limits()["basecamp"])
+
+@st.cache_resource
+def get_basecamp_clients():
+    # Process-wide: one kept-alive session and metadata cache per Basecamp account, reused across reruns
+    return BasecampClients(make_basecamp_session, BASECAMP_API_BASE, BASECAMP_CACHE_TTL_SEC)
+
+def get_basecamp_client():
+    if not st.session_state.basecamp_token: return None
+    return get_basecamp_clients().get(st.session_state.basecamp_token)
 
-def upload_to_gcs(file_path, destination_blob_name):
+def ingest_audio_to_gcs(file_path, blob_stem, report):
+    """Probes, transcodes (per TRANSCODE_PROFILE) and uploads. Returns (gcs_uri, ingest) or (None, None)."""
     try:
         bucket = storage_client.bucket(GCS_BUCKET_NAME)
-        blob = bucket.blob(destination_blob_name)
-        blob.upload_from_filename(file_path, timeout=3600)
-        return f"gs://{GCS_BUCKET_NAME}/{destination_blob_name}"
+        ingest = ingest_audio(
+            bucket, file_path, blob_stem, TRANSCODE_PROFILE, streaming=STREAMING_INGEST,
+            stats_log=os.path.join(LOCAL_CACHE_DIR, "audio_profile_stats.jsonl"),
+            vad={"min_silence": VAD_MIN_SILENCE_SEC} if VAD_TRIM else None
+        )
+        return f"gs://{GCS_BUCKET_NAME}/{ingest['blob_name']}", ingest
     except Exception as e:
-        st.error(f"GCS Upload Error: {e}")
-        return None
+        report.error(f"GCS Upload Error: {e}")
+        return None, None
 
-def get_or_create_folder(service, folder_name):
-    try:
-        query = f"mimeType='application/vnd.google-apps.folder' and name='{folder_name}' and trashed=false"
-        results = service.files().list(q=query, fields="files(id)").execute()
-        items = results.get('files', [])
-        if items: return items[0]['id']
-        else:
-            file_metadata = {'name': folder_name, 'mimeType': 'application/vnd.google-apps.folder'}
-            folder = service.files().create(body=file_metadata, fields='id').execute()
-            return folder.get('id')
+def get_or_create_folder(service, folder_name, creds):
+    """Cached folder ID; looked up (or created) by name only on a miss."""
+    try: return get_drive_folders().folder_id(service, account_key(creds), folder_name, creds)
     except Exception as e: return None
 
+def create_in_folder(service, creds, folder_name, file_metadata, media):
+    """files().create into a (cached) folder; if that folder was deleted, it is found/created again and the upload retried."""
+    def create(folder_id):
+        body = {**file_metadata, "parents": [folder_id] if folder_id else []}
+        return drive_execute(service.files().create(body=body, media_body=media, fields="id, modifiedTime"))
+    return get_drive_folders().within(service, account_key(creds), folder_name, create, creds)
+
+def drive_upload(creds, file_bytes, file_name, target_folder_name):
+    """Uploads a .docx into the named folder and returns its file ID. Raises on failure; safe on worker threads."""
+    service = get_drive_services().get(creds)
+    media = MediaIoBaseUpload(io.BytesIO(file_bytes), mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+    return create_in_folder(service, creds, target_folder_name, {"name": file_name}, media)["id"]
+
 def upload_to_drive_user(file_stream, file_name, target_folder_name):
     if not st.session_state.gdrive_creds: return None
     try:
-        service = build("drive", "v3", credentials=st.session_state.gdrive_creds)
-        folder_id = get_or_create_folder(service, target_folder_name)
-        parents = [folder_id] if folder_id else []
-
-        file_metadata = {"name": file_name, "parents": parents}
-        media = MediaIoBaseUpload(file_stream, mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-        file = service.files().create(body=file_metadata, media_body=media, fields="id").execute()
-        return file.get("id")
+        return drive_upload(st.session_state.gdrive_creds, file_stream.getvalue(), file_name, target_folder_name)
     except Exception as e:
         st.error(f"Google Drive Upload Error: {e}")
         return None
 
-def save_analysis_data_to_drive(data_dict, filename):
+def meeting_data_folder(creds):
+    """The Meeting_Data folder as a ``DriveFolder`` (None if it can't be resolved)."""
+    folder_id = get_or_create_folder(get_drive_services().get(creds), "Meeting_Data", creds)
+    if not folder_id: return None
+    return DriveFolder(lambda: get_drive_services().get(creds), folder_id, drive_execute)
+
+def save_analysis_data_to_drive(data_dict, filename, creds=None):
+    """Saves to Meeting_Data (meta + transcript parts, see meeting_storage), adds it to the folder's manifest and to the account's local mirror and search index.
+
+    Returns the record's Drive {"id", "name"}, or None if it wasn't saved (no login, or Drive failed).
+    """
+    creds = creds or st.session_state.gdrive_creds
+    if not creds: return None
+    try:
+        service = get_drive_services().get(creds)
+        if not get_or_create_folder(service, "Meeting_Data", creds): return None
+
+        meta, heavy = split_analysis(data_dict)
+        meta_name, transcript_name = part_names(filename)
+        # Transcript first, so the meta part can point at it
+        transcript_bytes = encode(heavy)
+        media = MediaIoBaseUpload(io.BytesIO(transcript_bytes), mimetype=GZIP_MIME)
+        part = create_in_folder(service, creds, "Meeting_Data", {"name": transcript_name}, media)
+        meta["parts"] = {"transcript": {"id": part["id"], "name": transcript_name, "bytes": len(transcript_bytes)}}
+        meta_bytes = encode(meta)
+        media = MediaIoBaseUpload(io.BytesIO(meta_bytes), mimetype=GZIP_MIME)
+        try: file = create_in_folder(service, creds, "Meeting_Data", {"name": meta_name}, media)
+        except Exception:
+            # Without its meta part the transcript is unreachable: don't leave it behind in Drive
+            try: drive_execute(service.files().delete(fileId=part["id"]))
+            except Exception: pass
+            raise
+        try: get_meeting_manifests().add(meeting_data_folder(creds), history_entry(file["id"], meta_name, data_dict, len(meta_bytes) + len(transcript_bytes)))
+        except Exception: pass  # the manifest's reconcile picks up anything it missed
+        try: get_meeting_mirror(account_key(creds)).put(file["id"], meta_name, data_dict, file.get("modifiedTime"), size=len(meta_bytes) + len(transcript_bytes))
+        except Exception: pass  # the mirror is a copy; its next sync picks the record up from Drive
+        return {"id": file["id"], "name": meta_name}
+    except Exception: return None
+
+def sync_meeting_mirror(full=None, wait=False):
+    """Brings the local mirror up to date with Meeting_Data: in the background (when due) unless ``wait``."""
     if not st.session_state.gdrive_creds: return None
+    mirror = get_meeting_mirror(account_key(st.session_state.gdrive_creds))
     try:
-        service = build("drive", "v3", credentials=st.session_state.gdrive_creds)
-        folder_id = get_or_create_folder(service, "Meeting_Data")
-        if not folder_id: return None
-
-        json_str = json.dumps(data_dict, indent=2)
-        fh = io.BytesIO(json_str.encode('utf-8'))
-        file_metadata = {"name": filename, "parents": [folder_id]}
-        media = MediaIoBaseUpload(fh, mimetype='application/json')
-        service.files().create(body=file_metadata, media_body=media, fields="id").execute()
-        return True
-    except: return False
+        folder = meeting_data_folder(st.session_state.gdrive_creds)
+        if not folder: return None
+        source = DriveSource(folder)
+        if wait:
+            result = mirror.sync(source, full)
+            mirror.fill_in_background(source)  # History needs only the meta parts; transcripts follow
+            return result
+        mirror.sync_in_background(source, MIRROR_SYNC_SECONDS, full)
+    except Exception: return None  # offline: History keeps serving the local copy
 
-def list_past_meetings():
+def list_past_meetings(query="", since=None, until=None):
+    """History entries from the local mirror, newest first; Drive is only asked for what changed, in the background.
+
+    An empty mirror is seeded from the Meeting_Data manifest (one small download) while the records are copied behind it.
+    """
     if not st.session_state.gdrive_creds: return []
-    try:
-        service = build("drive", "v3", credentials=st.session_state.gdrive_creds)
-        folder_id = get_or_create_folder(service, "Meeting_Data")
-        if not folder_id: return []
-        query = f"'{folder_id}' in parents and mimeType='application/json' and trashed=false"
-        results = service.files().list(q=query, fields="files(id, name, createdTime)", orderBy="createdTime desc").execute()
-        return results.get('files', [])
-    except: return []
+    mirror = get_meeting_mirror(account_key(st.session_state.gdrive_creds))
+    if not mirror.stats()["records"]:
+        with st.spinner("Loading your saved meetings from Drive..."):
+            try:
+                mirror.seed(get_meeting_manifests().entries(meeting_data_folder(st.session_state.gdrive_creds)))
+            except Exception:
+                sync_meeting_mirror(wait=True)  # no manifest to be had: copy the meta parts instead
+    sync_meeting_mirror()
+    return mirror.entries(query, since, until)
+
+def forget_past_meeting(file_id):
+    """Drops a meeting whose file is gone from the manifest and the local mirror (and its search index)."""
+    if not st.session_state.gdrive_creds: return
+    get_meeting_mirror(account_key(st.session_state.gdrive_creds)).remove(file_id)
+    try: get_meeting_manifests().remove(meeting_data_folder(st.session_state.gdrive_creds), file_id)
+    except Exception: pass
+
+def load_chat_turns(record):
+    """Chat turns persisted for a saved meeting since it was saved (the mirrored copy if Drive fails)."""
+    if not st.session_state.gdrive_creds: return []
+    try: return get_chat_logs().load(meeting_data_folder(st.session_state.gdrive_creds), record["name"])
+    except Exception: return get_meeting_mirror(account_key(st.session_state.gdrive_creds)).chat(record["id"])
+
+def persist_chat_turns():
+    """Queues chat turns not yet persisted for the open meeting; written in the background as one small delta."""
+    record = st.session_state.meeting_record
+    turns = st.session_state.chat_history[st.session_state.chat_persisted:]
+    if not record or not turns or not st.session_state.gdrive_creds: return
+    folder = meeting_data_folder(st.session_state.gdrive_creds)
+    if not folder: return
+    get_chat_logs().append(folder, record["name"], turns)
+    st.session_state.chat_persisted = len(st.session_state.chat_history)
+    # History counts them now; the next sync replaces this with what reached Drive
+    mirror = get_meeting_mirror(account_key(st.session_state.gdrive_creds))
+    try: mirror.set_chat(record["id"], mirror.chat(record["id"]) + turns)
+    except Exception: pass
+
+def restore_meeting(d, record):
+    """Puts a saved analysis (``record`` = its Drive {"id", "name"}) back into the session (Review, Chat and Basecamp tabs)."""
+    st.session_state.ai_results = d.get("ai_results", {})
+    st.session_state.saved_participants_input = d.get("participants", "")
+    # Restore Chat History: the record's own plus turns appended since
+    st.session_state.chat_history = d.get("chat_history", []) + load_chat_turns(record)
+    st.session_state.meeting_record = record
+    st.session_state.publish = None
+    st.session_state.chat_persisted = len(st.session_state.chat_history)
+    st.session_state.detected_title = d.get("detected_title", "Meeting")
+    # Format 2 meetings arrive without their transcript; Chat fetches it on first use
+    st.session_state.transcript_ref = transcript_ref(d) if needs_transcript(d) else None
+
+    # Restore Reps
+    p_input = st.session_state.saved_participants_input
+    c_list = [l.replace("(Client)","").strip() for l in p_input.split('\n') if "(Client)" in l]
+    i_list = [l.replace("(iFoundries)","").strip() for l in p_input.split('\n') if "(iFoundries)" in l]
+    st.session_state.auto_client_reps = "\n".join(c_list)
+    st.session_state.auto_ifoundries_reps = ", ".join(i_list)
+    if CHAT_RETRIEVAL and not st.session_state.transcript_ref: get_meeting_index(st.session_state.ai_results.get("full_transcript", ""))
 
-def load_meeting_data(file_id):
+def download_drive_file(file_id):
+    service = get_drive_services().get(st.session_state.gdrive_creds)
+    fh = io.BytesIO()
+    downloader = MediaIoBaseDownload(fh, service.files().get_media(fileId=file_id))
+    done = False
+    while done is False:
+        status, done = get_service_limits().call("drive", downloader.next_chunk)
+    return fh.getvalue()
+
+def load_meeting_data(file_id, full=True):
+    """A saved meeting in either storage format. ``full=False`` skips a format 2 meeting's transcript part."""
     if not st.session_state.gdrive_creds: return None
     try:
-        service = build("drive", "v3", credentials=st.session_state.gdrive_creds)
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while done is False:
-            status, done = downloader.next_chunk()
-        fh.seek(0)
-        return json.load(fh)
+        d = decode(download_drive_file(file_id))
     except: return None
+    if full and needs_transcript(d):
+        try: d = merge_transcript(d, decode(download_drive_file(transcript_ref(d)["id"])))
+        except Exception: pass  # sections still load; the transcript is fetched again when needed
+    return d
 
-# --- Basecamp Helpers ---
-def get_basecamp_projects(_session):
+def ensure_transcript():
+    """Fetches the loaded meeting's transcript part the first time Chat needs it. False if it couldn't be fetched."""
+    ref = st.session_state.transcript_ref
+    if not ref or "full_transcript" in st.session_state.ai_results: return True
     try:
-        response = _session.get(f"{BASECAMP_API_BASE}/projects.json")
-        response.raise_for_status()
-        return sorted([(p['name'], p['id']) for p in response.json() if p['status'] == 'active'], key=lambda x: x[0])
+        part = decode(download_drive_file(ref["id"]))
+    except Exception:
+        return False
+    st.session_state.ai_results.update(transcript_fields(part))
+    st.session_state.transcript_ref = None
+    record = st.session_state.meeting_record
+    if record:
+        try: get_meeting_mirror(account_key(st.session_state.gdrive_creds)).put_transcript(record["id"], part)
+        except Exception: pass
+    return True
+
+# --- Basecamp Helpers ---
+def get_basecamp_projects(_client):
+    """Active projects loaded so far (waits only for the first page; the rest arrive in the background)."""
+    try: return sorted([(p['name'], p['id']) for p in _client.projects().first_page() if p['status'] == 'active'], key=lambda x: x[0])
     except: return []
 
-def get_project_tools(_session, project_id):
-    try:
-        response = _session.get(f"{BASECAMP_API_BASE}/projects/{project_id}.json")
-        response.raise_for_status()
-        return response.json().get('dock', [])
+def get_project_tools(_client, project_id):
+    try: return _client.dock(project_id)
     except: return []
 
-def get_todolists(_session, todoset_id, project_id):
-    try:
-        url = f"{BASECAMP_API_BASE}/buckets/{project_id}/todosets/{todoset_id}/todolists.json"
-        resp = _session.get(url)
-        return sorted([(t['title'], t['id']) for t in resp.json()], key=lambda x: x[0])
+def get_todolists(_client, todoset_id, project_id):
+    try: return sorted([(t['title'], t['id']) for t in _client.todolists(project_id, todoset_id).wait()], key=lambda x: x[0])
     except: return []
 
+@st.fragment(run_every=1)
+def render_listing_progress(listing, noun, shown_pages):
+    """Progress of a Basecamp listing still loading; reruns the page as new pages land so the selector grows."""
+    if listing.done or listing.pages > shown_pages: st.rerun()
+    total = f" of {listing.total}" if listing.total else ""
+    st.caption(f"⏳ Loading more {noun}… ({len(listing.items)}{total} loaded)")
+
+def basecamp_attach(_session, file_bytes, file_name):
+    """Uploads an attachment and returns its sgid. Raises on failure; safe on worker threads."""
+    headers = _session.headers.copy()
+    headers.update({'Content-Type': 'application/octet-stream', 'Content-Length': str(len(file_bytes))})
+    resp = _session.post(f"{BASECAMP_API_BASE}/attachments.json?name={file_name}", data=file_bytes, headers=headers)
+    resp.raise_for_status()
+    return resp.json()['attachable_sgid']
+
 def upload_bc_attachment(_session, file_bytes, file_name):
     try:
-        headers = _session.headers.copy()
-        headers.update({'Content-Type': 'application/octet-stream', 'Content-Length': str(len(file_bytes))})
-        resp = _session.post(f"{BASECAMP_API_BASE}/attachments.json?name={file_name}", data=file_bytes, headers=headers)
-        return resp.json()['attachable_sgid']
+        return basecamp_attach(_session, file_bytes, file_name)
     except Exception as e:
         st.error(f"Basecamp Upload Error: {e}")
         return None
 
+def basecamp_post(_session, project_id, tool_type, tool_id, sub_id, title, content, attachment_sgid):
+    """Creates the to-do, message or upload and returns Basecamp's JSON for it. Raises on failure; safe on worker threads."""
+    attach_html = f'<bc-attachment sgid="{attachment_sgid}"></bc-attachment>' if attachment_sgid else ""
+
+    if tool_type == "To-dos":
+        url = f"{BASECAMP_API_BASE}/buckets/{project_id}/todolists/{sub_id}/todos.json"
+        payload = {"content": title, "description": content + attach_html}
+    elif tool_type == "Message Board":
+        url = f"{BASECAMP_API_BASE}/buckets/{project_id}/message_boards/{tool_id}/messages.json"
+        payload = {"subject": title, "content": content + attach_html, "status": "active"}
+    elif tool_type in ("Docs & Files", "Docs"):
+        url = f"{BASECAMP_API_BASE}/buckets/{project_id}/vaults/{tool_id}/uploads.json"
+        payload = {"attachable_sgid": attachment_sgid, "base_name": title, "content": content}
+    else:
+        raise ValueError(f"Unknown Basecamp tool: {tool_type}")
+
+    resp = _session.post(url, json=payload)
+    resp.raise_for_status()
+    return resp.json()
+
 def post_to_basecamp(_session, project_id, tool_type, tool_id, sub_id, title, content, attachment_sgid):
     try:
-        attach_html = f'<bc-attachment sgid="{attachment_sgid}"></bc-attachment>' if attachment_sgid else ""
-        
-        if tool_type == "To-dos":
-            url = f"{BASECAMP_API_BASE}/buckets/{project_id}/todolists/{sub_id}/todos.json"
-            payload = {"content": title, "description": content + attach_html}
-        elif tool_type == "Message Board":
-            url = f"{BASECAMP_API_BASE}/buckets/{project_id}/message_boards/{tool_id}/messages.json"
-            payload = {"subject": title, "content": content + attach_html, "status": "active"}
-        elif tool_type == "Docs & Files":
-            url = f"{BASECAMP_API_BASE}/buckets/{project_id}/vaults/{tool_id}/uploads.json"
-            payload = {"attachable_sgid": attachment_sgid, "base_name": title, "content": content}
-
-        resp = _session.post(url, json=payload)
-        resp.raise_for_status()
+        basecamp_post(_session, project_id, tool_type, tool_id, sub_id, title, content, attachment_sgid)
         return True
     except Exception as e:
         st.error(f"Basecamp Post Error: {e}")
         return False
 
+# --- Publishing (Generate) ---
+def publish_destinations(file_bytes, file_name, drive_folder=None, basecamp=None):
+    """Destinations for a generated doc. ``basecamp`` holds session, project_id, tool_type, tool_id, sub_id, title, content."""
+    creds = st.session_state.gdrive_creds
+    destinations = []
+    if drive_folder and creds:
+        destinations.append(Destination(
+            f"Drive ({drive_folder})",
+            [("upload", lambda r: drive_upload(creds, file_bytes, file_name, drive_folder))],
+            link=lambda r: f"https://drive.google.com/file/d/{r['upload']}/view"))
+    if basecamp:
+        bc = basecamp
+        destinations.append(Destination(
+            f"Basecamp ({bc['tool_type']})",
+            [("attachment", lambda r: basecamp_attach(bc["session"], file_bytes, file_name)),
+             ("post", lambda r: basecamp_post(bc["session"], bc["project_id"], bc["tool_type"], bc["tool_id"],
+                                              bc["sub_id"], bc["title"], bc["content"], r["attachment"]))],
+            link=lambda r: r["post"].get("app_url")))
+    return destinations
+
+def render_publish_status():
+    """Per-destination outcome of the last Generate, with a Retry for each one that failed."""
+    state = st.session_state.publish
+    if state["destinations"]:
+        st.caption(format_publish_summary(state["destinations"], state["seconds"]))
+    for i, d in enumerate(state["destinations"]):
+        if d.ok:
+            st.success(f"✅ {d.name} · {d.seconds:.1f}s" + (f" · [open]({d.url})" if d.url else ""))
+            continue
+        c1, c2 = st.columns([5, 1])
+        c1.error(f"{d.name} failed after {d.attempts} attempt(s): {d.error}")
+        if c2.button("Retry", key=f"publish_retry_{i}"):
+            with st.spinner(f"Retrying {d.name}..."):
+                d.run(PUBLISH_RETRIES)
+            st.rerun()
+    st.download_button("Download", state["bytes"], state["file_name"])
+
 # --- AI Analysis ---
-def get_visual_metadata(file_path):
+def get_visual_metadata(file_path, artifacts=None):
     if shutil.which("ffmpeg") is None: return None
-    thumbnail_path = "temp_thumb.jpg"
+    own_artifacts = artifacts is None
+    artifacts = artifacts or ArtifactTracker()
     result_data = {"datetime_sg": None, "duration": 0, "title": "Meeting_Minutes", "venue": ""}
     try:
-        # Duration
-        cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", file_path]
-        res = subprocess.run(cmd, capture_output=True, text=True)
-        if res.returncode == 0: result_data["duration"] = float(res.stdout.strip())
-
-        # Vision
-        subprocess.run(['ffmpeg', '-i', file_path, '-ss', '00:00:01', '-vframes', '1', '-q:v', '2', '-y', thumbnail_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-        if os.path.exists(thumbnail_path):
-            vision = genai.GenerativeModel('gemini-2.5-flash-lite')
-            with open(thumbnail_path, "rb") as img: img_data = img.read()
-            prompt = """Analyze this meeting screenshot. Return JSON: { "datetime": "YYYY-MM-DD HH:MM", "title": "Center Text", "venue": "Corner Text" }. If not found, use "None"."""
-            resp = vision.generate_content([{'mime_type': 'image/jpeg', 'data': img_data}, prompt])
+        video = probe_video(file_path) or {"duration": 0, "has_video": False}
+        result_data["duration"] = video["duration"]
+        if not video["has_video"]: return result_data  # audio-only upload: nothing to read
+
+        # Several keyframe-seeked candidates (per-call temp files), blank/loading screens dropped
+        frames, _ = sample_frames(file_path, artifacts.temp_path, video["duration"], VISION_FRAMES, VISION_SCENE_WINDOW_SEC)
+        if frames:
+            images = []
+            for frame in frames:
+                with open(frame["path"], "rb") as img: images.append({'mime_type': 'image/jpeg', 'data': img.read()})
+            prompt = f"""These are {len(images)} frames from the start of one meeting recording, in time order. Some may be blank or loading screens; use whichever shows the meeting details. Return JSON: {{ "datetime": "YYYY-MM-DD HH:MM", "title": "Center Text", "venue": "Corner Text" }}. If not found, use "None"."""
+            resp = vision_model.generate_content([*images, prompt])
             try:
                 data = json.loads(resp.text.strip().replace("```json", "").replace("```", ""))
                 if data.get("title") != "None": result_data["title"] = data["title"].replace(" ", "_")
@@ -258,98 +620,372 @@ def get_visual_metadata(file_path):
             except: pass
     except: pass
     finally:
-        if os.path.exists(thumbnail_path): os.remove(thumbnail_path)
+        if own_artifacts: artifacts.cleanup()
     return result_data
 
-def get_structured_notes_google(audio_file_path, file_name, participants_context):
+def build_recognition_config(ingest):
+    return speech.RecognitionConfig(encoding=speech.RecognitionConfig.AudioEncoding[ingest["encoding"]], sample_rate_hertz=ingest["sample_rate_hertz"] or 0, language_code=STT_LANGUAGE_CODE, enable_automatic_punctuation=True, use_enhanced=True, model=STT_MODEL, diarization_config=speech.SpeakerDiarizationConfig(enable_speaker_diarization=True, min_speaker_count=STT_MIN_SPEAKERS, max_speaker_count=STT_MAX_SPEAKERS))
+
+def transcribe_in_segments(audio_file_path, file_name, duration, report, owner="", cache_key=None):
+    """Splits long recordings into overlapping segments and transcribes them concurrently.
+
+    Each segment's operation stays in the tracker until the run is stitched, so analysing the same
+    recording again (after a restart or refresh) reattaches to the segments already paid for.
+    """
+    bucket = storage_client.bucket(GCS_BUCKET_NAME)
+    blob_stem = run_blob_stem(file_name)
+    segments = plan_segments(duration, STT_SEGMENT_SEC, STT_SEGMENT_OVERLAP_SEC)
+    tracker = get_operation_tracker()
+    earlier = tracker.segment_operations(owner, cache_key)
+    registered = []
+
+    def reattach(index, start, length):
+        name, info = earlier[index]
+        if (info.get("start"), info.get("length")) != (start, length): return None
+        try:
+            operation = reattach_operation(speech_client, name)
+            words = words_from_response(operation.result(timeout=3600))
+        except Exception:
+            tracker.finish(name)  # gone or failed on Google's side: transcribe this segment again
+            return None
+        finally:
+            # The run that uploaded it didn't get to clean up; nothing reads the segment's audio any more
+            if info.get("blob_name"):
+                try: bucket.blob(info["blob_name"]).delete()
+                except: pass
+        registered.append(name)
+        return OffsetMap(info.get("speech_offsets", [])).map_words(words)
+
+    # Runs in worker threads: no st.* calls in here
+    def recognize(index, start, length):
+        if index in earlier:
+            words = reattach(index, start, length)
+            if words is not None: return words
+        ingest = ingest_audio(bucket, audio_file_path, f"{blob_stem}_part{index:02d}", TRANSCODE_PROFILE, streaming=STREAMING_INGEST, vad={"min_silence": VAD_MIN_SILENCE_SEC} if VAD_TRIM else None, clip=(start, length))
+        try:
+            audio = speech.RecognitionAudio(uri=f"gs://{GCS_BUCKET_NAME}/{ingest['blob_name']}")
+            operation = get_service_limits().call_write("speech", speech_client.long_running_recognize, config=build_recognition_config(ingest), audio=audio)
+            tracker.register(operation.operation.name, owner=owner, file_name=file_name, cache_key=cache_key, segment=index, segments=len(segments), start=start, length=length, duration=length, blob_name=ingest["blob_name"], speech_offsets=ingest["offset_map"].to_list())
+            registered.append(operation.operation.name)
+            words = words_from_response(operation.result(timeout=3600))
+        finally:
+            try: bucket.blob(ingest["blob_name"]).delete()
+            except: pass
+        return ingest["offset_map"].map_words(words)
+
+    def on_progress(done, total):
+        report.progress(int(done * 100 / total), f"Transcribing {total} segments: {done}/{total} done")
+
+    result = transcribe_segments(segments, recognize, STT_MAX_PARALLEL, on_progress)
+    # Only now: if a segment failed, a retry still reuses the ones that finished
+    for name in {*registered, *(name for name, _ in earlier.values())}: tracker.finish(name)
+    return result
+
+def transcript_from_response(response, speech_offsets):
+    """Every result in the response -> (Transcript, text), word times mapped back past any VAD trim."""
+    transcript = Transcript.from_words(OffsetMap(speech_offsets).map_words(words_from_response(response)))
+    text = transcript.render()
+    if not text.strip():
+        text = " ".join(r.alternatives[0].transcript for r in response.results if r.alternatives)
+    return transcript, text
+
+def transcribe_recording(audio_file_path, file_name, report, owner="", cache_key=None):
+    """Ingest + Speech-to-Text. Returns {"full_transcript", "transcript", "speech_offsets", "ingest_stats"} or {"error"}."""
+    audio_blob_name = None
+    operation_in_flight = False
+    ingest_stats = {}
+    speech_offsets = []
     try:
-        with st.spinner(f"Converting {file_name}..."):
-            base_name = os.path.splitext(audio_file_path)[0]
-            flac_file_path = f"{base_name}.flac"
-            subprocess.run(["ffmpeg", "-i", audio_file_path, "-vn", "-acodec", "flac", "-y", flac_file_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-
-        with st.spinner(f"Uploading to Google Cloud..."):
-            gcs_uri = upload_to_gcs(flac_file_path, f"{os.path.splitext(file_name)[0]}.flac")
-            if not gcs_uri: return {"error": "Upload failed."}
-
-        progress_bar = st.progress(0, text="Transcribing...")
-        audio = speech.RecognitionAudio(uri=gcs_uri)
-        config = speech.RecognitionConfig(encoding=speech.RecognitionConfig.AudioEncoding.FLAC, language_code="en-US", enable_automatic_punctuation=True, use_enhanced=True, model="video", diarization_config=speech.SpeakerDiarizationConfig(enable_speaker_diarization=True, min_speaker_count=2, max_speaker_count=6))
-        operation = speech_client.long_running_recognize(config=config, audio=audio)
-        
-        while not operation.done():
-            if operation.metadata: progress_bar.progress(operation.metadata.progress_percent, text=f"Transcribing: {operation.metadata.progress_percent}%")
-            time.sleep(2)
+        probe = probe_audio(audio_file_path)
+        duration = probe["duration"] if probe else 0
 
-        progress_bar.progress(100, text="Done!")
-        response = operation.result(timeout=3600)
-        progress_bar.empty()
+        if PARALLEL_STT and duration >= PARALLEL_STT_MIN_SEC:
+            report.progress(0, "Transcribing...")
+            words, stt_timings = transcribe_in_segments(audio_file_path, file_name, duration, report, owner, cache_key)
+            report.clear_progress()
+            ingest_stats = {"stt": stt_timings}
+            report.note(f"Transcribed {len(stt_timings['segments'])} segments in {stt_timings['wall_seconds']:.0f}s (serial equivalent {stt_timings['serial_seconds']:.0f}s).")
+            if not words: return {"error": "Transcription failed."}
+            transcript = Transcript.from_words(words)
+            full_transcript = transcript.render()
+        else:
+            with report.stage(f"Converting & uploading {file_name} to Google Cloud..."):
+                gcs_uri, ingest = ingest_audio_to_gcs(audio_file_path, run_blob_stem(file_name), report)
+                if not gcs_uri: return {"error": "Upload failed."}
+                audio_blob_name = ingest["blob_name"]
+                ingest_stats = ingest["stats"]
+                speech_offsets = ingest["offset_map"].to_list()
+                report.note(f"Ingest throughput — {format_stage_stats(ingest_stats)}")
+                if ingest_stats.get("vad", {}).get("removed_seconds"):
+                    report.note(f"Trimmed {ingest_stats['vad']['removed_seconds']:.0f}s of silence before transcription.")
 
-        if not response.results: return {"error": "Transcription failed."}
+            report.progress(0, "Transcribing...")
+            audio = speech.RecognitionAudio(uri=gcs_uri)
+            operation = get_service_limits().call_write("speech", speech_client.long_running_recognize, config=build_recognition_config(ingest), audio=audio)
+            # Remember the operation so a rerun/refresh can reattach instead of paying for it twice
+            operation_name = operation.operation.name
+            tracker = get_operation_tracker()
+            tracker.register(operation_name, owner=owner, file_name=file_name, cache_key=cache_key, blob_name=audio_blob_name, duration=duration, ingest_stats=ingest_stats, speech_offsets=speech_offsets)
+            operation_in_flight = True
 
-        result = response.results[-1]
-        words = result.alternatives[0].words
-        full_transcript = ""
-        curr = -1
-        for w in words:
-            if w.speaker_tag != curr:
-                curr = w.speaker_tag
-                full_transcript += f"\n\nSpeaker {curr}: "
-            full_transcript += w.word + " "
-
-        with st.spinner("Analyzing with Gemini..."):
-            # --- UPDATED PROMPT FOR ROBUST EXTRACTION ---
-            prompt = f"""
-            You are an expert meeting secretary. Context: {participants_context}
-            Transcript: {full_transcript}
-            
-            TASKS:
-            1. Identify speakers using context.
-            2. Extract Sections using these EXACT headers:
-            
-            ## OVERVIEW ##
-            [Brief summary of WHO met and WHAT was discussed (2-3 sentences).]
-            
-            ## DISCUSSION ##
-            [Detailed bullet points with headers]
+            response = wait_for_operation(operation, duration, lambda pct: report.progress(pct or 0, f"Transcribing: {pct or 0}%"))
+            operation_in_flight = False
+            tracker.finish(operation_name)
+
+            report.progress(100, "Done!")
+            report.clear_progress()
+
+            if not response.results: return {"error": "Transcription failed."}
+            transcript, full_transcript = transcript_from_response(response, speech_offsets)
+
+        return {"full_transcript": full_transcript, "transcript": transcript.to_dict(), "ingest_stats": ingest_stats, "speech_offsets": speech_offsets}
+    finally:
+        try:
+            # Keep the audio while Google is still reading it; the resume path cleans it up
+            if audio_blob_name and not operation_in_flight: storage_client.bucket(GCS_BUCKET_NAME).blob(audio_blob_name).delete()
+        except: pass
+
+def transcript_cache_params():
+    """Everything that changes the transcript for the same audio bytes."""
+    return {"language_code": STT_LANGUAGE_CODE, "model": STT_MODEL, "speakers": [STT_MIN_SPEAKERS, STT_MAX_SPEAKERS], "profile": TRANSCODE_PROFILE, "vad": VAD_MIN_SILENCE_SEC if VAD_TRIM else None, "segments": [PARALLEL_STT_MIN_SEC, STT_SEGMENT_SEC, STT_SEGMENT_OVERLAP_SEC] if PARALLEL_STT else None}
+
+def stream_gemini_text(prompt):
+    for chunk in gemini_model.generate_content(prompt, stream=True):
+        if chunk.parts: yield chunk.text
+
+def summarize_with_gemini(full_transcript, participants_context, final_prompt, on_text=None):
+    """One call for normal meetings; chunked map-reduce past SUMMARY_CHUNK_TOKENS. Returns (text, stats).
+    The final call is streamed into ``on_text`` piece by piece when given."""
+    summarizer = MapReduceSummarizer(lambda prompt: gemini_model.generate_content(prompt).text, SUMMARY_CHUNK_TOKENS, SUMMARY_MAX_PARALLEL, stream=stream_gemini_text)
+    return summarizer.summarize(full_transcript, participants_context, final_prompt, on_text)
+
+# Review tab fields, keyed like ai_results; same headers the regex parser below accepts (any case/spacing)
+REVIEW_SECTIONS = {"overview": "OVERVIEW", "discussion": "DISCUSSION", "next_steps": "NEXT STEPS"}
+
+def summarize_transcript(full_transcript, participants_context, report):
+    """Gemini pass over the transcript. Returns the Review tab sections."""
+    # --- UPDATED PROMPT FOR ROBUST EXTRACTION ---
+    def final_prompt(content):
+        return f"""
+        You are an expert meeting secretary. Context: {participants_context}
+        Transcript: {content}
+        
+        TASKS:
+        1. Identify speakers using context.
+        2. Extract Sections using these EXACT headers:
+        
+        ## OVERVIEW ##
+        [Brief summary of WHO met and WHAT was discussed (2-3 sentences).]
+        
+        ## DISCUSSION ##
+        [Detailed bullet points with headers]
+        
+        ## NEXT STEPS ##
+        List ALL specific, actionable items. **CRITICAL: Take any specific requests made by the Client and convert them into Action Items here.**
+        FORMAT:
+        * **Action:** [Specific Task] (Assigned to: [Name]) - Deadline: [Time if mentioned]
+        """
+
+    with report.stage("Analyzing with Gemini..."):
+        parser = SectionStreamParser(REVIEW_SECTIONS)
+        text, summary_stats = summarize_with_gemini(full_transcript, participants_context, final_prompt, lambda piece: report.sections(parser.feed(piece)))
+        report.note(format_summary_stats(summary_stats))
+        
+        # --- ROBUST REGEX PARSER ---
+        overview = ""
+        discussion = ""
+        next_steps = ""
+        
+        try:
+            # Extract Overview (Look for ## OVERVIEW ## ... ## DISCUSSION ##)
+            ov_match = re.search(r'##\s*OVERVIEW\s*##(.*?)(?=##\s*DISCUSSION|##\s*NEXT STEPS|$)', text, re.DOTALL | re.IGNORECASE)
+            if ov_match: overview = ov_match.group(1).strip()
             
-            ## NEXT STEPS ##
-            List ALL specific, actionable items. **CRITICAL: Take any specific requests made by the Client and convert them into Action Items here.**
-            FORMAT:
-            * **Action:** [Specific Task] (Assigned to: [Name]) - Deadline: [Time if mentioned]
-            """
-            text = gemini_model.generate_content(prompt).text
+            # Extract Discussion (Look for ## DISCUSSION ## ... ## NEXT STEPS ##)
+            disc_match = re.search(r'##\s*DISCUSSION\s*##(.*?)(?=##\s*NEXT STEPS|$)', text, re.DOTALL | re.IGNORECASE)
+            if disc_match: discussion = disc_match.group(1).strip()
             
-            # --- ROBUST REGEX PARSER ---
-            overview = ""
-            discussion = ""
-            next_steps = ""
+            # Extract Next Steps (Look for ## NEXT STEPS ## ... End)
+            ns_match = re.search(r'##\s*NEXT STEPS\s*##(.*)', text, re.DOTALL | re.IGNORECASE)
+            if ns_match: next_steps = ns_match.group(1).strip()
             
-            try:
-                # Extract Overview (Look for ## OVERVIEW ## ... ## DISCUSSION ##)
-                ov_match = re.search(r'##\s*OVERVIEW\s*##(.*?)(?=##\s*DISCUSSION|##\s*NEXT STEPS|$)', text, re.DOTALL | re.IGNORECASE)
-                if ov_match: overview = ov_match.group(1).strip()
-                
-                # Extract Discussion (Look for ## DISCUSSION ## ... ## NEXT STEPS ##)
-                disc_match = re.search(r'##\s*DISCUSSION\s*##(.*?)(?=##\s*NEXT STEPS|$)', text, re.DOTALL | re.IGNORECASE)
-                if disc_match: discussion = disc_match.group(1).strip()
-                
-                # Extract Next Steps (Look for ## NEXT STEPS ## ... End)
-                ns_match = re.search(r'##\s*NEXT STEPS\s*##(.*)', text, re.DOTALL | re.IGNORECASE)
-                if ns_match: next_steps = ns_match.group(1).strip()
-                
-                # Fallback if regex fails completely
-                if not overview and not discussion:
-                    discussion = text # Dump everything so user sees something
-            except: 
-                discussion = text
-
-            return {"overview": overview, "discussion": discussion, "next_steps": next_steps, "full_transcript": full_transcript}
+            # Fallback if regex fails completely
+            if not overview and not discussion:
+                discussion = text # Dump everything so user sees something
+        except: 
+            discussion = text
+
+        report.sections({"overview": overview, "discussion": discussion, "next_steps": next_steps}, force=True)
+        return {"overview": overview, "discussion": discussion, "next_steps": next_steps, "summary_stats": summary_stats}
+
+def get_structured_notes_google(audio_file_path, file_name, participants_context, report=None, owner=""):
+    report = report or StreamlitReporter()
+    try:
+        started = time.perf_counter()
+        cache = get_transcript_cache()
+        cache_key = cache.key_for(audio_file_path, transcript_cache_params())
+        transcript = cache.get(cache_key)
+        if transcript:
+            report.note("♻️ Reusing cached transcript for this recording.")
+        else:
+            transcript = transcribe_recording(audio_file_path, file_name, report, owner, cache_key)
+            if "error" in transcript: return transcript
+            cache.put(cache_key, transcript)
+        timings = {"transcription": round(time.perf_counter() - started, 2)}
+        started = time.perf_counter()
+        notes = summarize_transcript(transcript["full_transcript"], participants_context, report)
+        timings["summary"] = round(time.perf_counter() - started, 2)
+        return {**notes, **transcript, "stage_timings": timings}
     except Exception as e: return {"error": str(e)}
-    finally:
-        try: bucket = storage_client.bucket(GCS_BUCKET_NAME); bucket.blob(f"{os.path.splitext(file_name)[0]}.flac").delete()
+
+def resume_structured_notes(operation_name, participants_context, owner, report=None):
+    """Reattaches to an in-flight transcription (after a rerun/refresh) and finishes the analysis."""
+    report = report or StreamlitReporter()
+    tracker = get_operation_tracker()
+    info = tracker.get(operation_name, owner)
+    if not info or info.get("segment") is not None: return {"error": "That transcription is no longer being tracked."}
+    try:
+        operation = reattach_operation(speech_client, operation_name)
+        report.progress(0, "Reattached — transcribing...")
+        response = wait_for_operation(operation, info.get("duration", 0), lambda pct: report.progress(pct or 0, f"Transcribing: {pct or 0}%"))
+        report.clear_progress()
+        tracker.finish(operation_name)
+        try: storage_client.bucket(GCS_BUCKET_NAME).blob(info["blob_name"]).delete()
         except: pass
 
+        if not response.results: return {"error": "Transcription failed."}
+        structured, text = transcript_from_response(response, info.get("speech_offsets", []))
+        transcript = {"full_transcript": text, "transcript": structured.to_dict(), "ingest_stats": info.get("ingest_stats", {}), "speech_offsets": info.get("speech_offsets", [])}
+        if info.get("cache_key"): get_transcript_cache().put(info["cache_key"], transcript)
+        return {**summarize_transcript(transcript["full_transcript"], participants_context, report), **transcript}
+    except Exception as e: return {"error": str(e)}
+
+def auto_save_analysis(res, source_name, participants, detected, creds):
+    """Auto-saves a finished analysis to Drive (Meeting_Data). Safe to call from a worker thread."""
+    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M")
+    save_data = {
+        "ai_results": res, 
+        "participants": participants, 
+        "date": str(datetime.datetime.now()),
+        "chat_history": [],
+        "detected_title": detected.get("title"),
+        "meeting_date": detected.get("date")
+    }
+    return save_analysis_data_to_drive(save_data, f"Data_{source_name}_{ts}.json", creds)
+
+# --- Background analysis jobs (no st.* / session_state in here: these run on worker threads) ---
+def format_stage_timings(timings):
+    """e.g. 'vision 6.2s ∥ transcription 84.0s → summary 11.5s → save 0.9s · total 97.1s (back-to-back 103.3s)'"""
+    line = f"vision {timings.get('vision', 0):.1f}s ∥ transcription {timings.get('transcription', 0):.1f}s → summary {timings.get('summary', 0):.1f}s"
+    if "save" in timings: line += f" → save {timings['save']:.1f}s"
+    serial = sum(timings.get(k, 0) for k in ("vision", "transcription", "summary", "save"))
+    return f"{line} · total {timings.get('total', 0):.1f}s (back-to-back {serial:.1f}s)"
+
+def run_analysis_job(job, audio_file_path, file_name, participants_context, owner, creds, default_title):
+    report = JobReporter(job)
+    started = time.perf_counter()
+
+    def timed_visual_metadata():
+        vision_started = time.perf_counter()
+        return get_visual_metadata(audio_file_path, artifacts) or {}, round(time.perf_counter() - vision_started, 2)
+
+    with ArtifactTracker() as artifacts, ThreadPoolExecutor(max_workers=1, thread_name_prefix="vision") as pool:
+        artifacts.add(audio_file_path)
+        # ffprobe + thumbnail + Gemini Vision need nothing from the transcript: run them while the upload and STT do
+        vision = pool.submit(timed_visual_metadata)
+        res = get_structured_notes_google(audio_file_path, file_name, participants_context, report, owner)
+        meta, vision_seconds = vision.result()
+    if "error" in res: raise RuntimeError(res["error"])
+    detected = {"title": meta.get("title") or default_title, "venue": meta.get("venue", "")}
+    if meta.get("datetime_sg"):
+        end = meta["datetime_sg"] + datetime.timedelta(seconds=meta["duration"])
+        detected["date"] = meta["datetime_sg"].date().isoformat()
+        detected["time"] = f"{meta['datetime_sg'].strftime('%I:%M %p')} - {end.strftime('%I:%M %p')}"
+    timings = {"vision": vision_seconds, **res.get("stage_timings", {})}
+    res["stage_timings"] = timings
+    with report.stage("Saving to Drive..."):
+        save_started = time.perf_counter()
+        saved = auto_save_analysis(res, file_name, participants_context, detected, creds)
+        timings["save"] = round(time.perf_counter() - save_started, 2)
+    timings["total"] = round(time.perf_counter() - started, 2)
+    report.note(f"Stages: {format_stage_timings(timings)}")
+    return {"ai_results": res, "participants": participants_context, "detected": detected, "record": saved}
+
+def run_resume_job(job, operation_name, participants_context, file_name, owner, creds, default_title):
+    report = JobReporter(job)
+    res = resume_structured_notes(operation_name, participants_context, owner, report)
+    if "error" in res: raise RuntimeError(res["error"])
+    with report.stage("Saving to Drive..."):
+        saved = auto_save_analysis(res, file_name, participants_context, {"title": default_title}, creds)
+    return {"ai_results": res, "participants": participants_context, "detected": {"title": default_title}, "record": saved}
+
+def split_participants(participants_input):
+    cl = [l.replace("(Client)","").strip() for l in participants_input.split('\n') if "(Client)" in l]
+    il = [l.replace("(iFoundries)","").strip() for l in participants_input.split('\n') if "(iFoundries)" in l]
+    return "\n".join(cl), ", ".join(il)
+
+def open_job_result(job_id):
+    """Loads a finished job into the Review & Chat tabs."""
+    job = get_job_queue().store.get(job_id)
+    if not job or job["owner"] != session_owner() or not job["result"]: return False
+    result = job["result"]
+    st.session_state.ai_results = result["ai_results"]
+    st.session_state.saved_participants_input = result["participants"]
+    st.session_state.auto_client_reps, st.session_state.auto_ifoundries_reps = split_participants(result["participants"])
+    st.session_state.chat_history = []
+    st.session_state.transcript_ref = None
+    # Chat about a freshly analysed meeting is persisted against the record the job saved
+    st.session_state.meeting_record = result.get("record")
+    st.session_state.chat_persisted = 0
+    st.session_state.publish = None
+    detected = result.get("detected", {})
+    if detected.get("title"): st.session_state.detected_title = detected["title"]
+    if detected.get("venue"): st.session_state.detected_venue = detected["venue"]
+    if detected.get("date"): st.session_state.detected_date = datetime.date.fromisoformat(detected["date"])
+    if detected.get("time"): st.session_state.detected_time = detected["time"]
+    st.session_state.live_job = None
+    if CHAT_RETRIEVAL: get_meeting_index(st.session_state.ai_results.get("full_transcript", ""))
+    return True
+
+@st.fragment(run_every=2)
+def render_live_review():
+    """Review fields filled from the summary as it streams in; the editable result replaces them when the job ends."""
+    job = get_job_queue().store.get(st.session_state.live_job, with_result=False)
+    if not job or job["status"] in (DONE, FAILED):
+        if job and job["status"] == DONE: open_job_result(job["id"])
+        st.session_state.live_job = None
+        st.rerun()
+    partial = job["partial"] or {}
+    st.info(f"⏳ **{job['title']}**: {job['stage']} Sections appear here as they are written.")
+    st.text_area("Overview (Green Box)", partial.get("overview", ""), disabled=True)
+    st.text_area("Discussion", partial.get("discussion", ""), height=300, disabled=True)
+    st.text_area("Next Steps (Includes Client Requests)", partial.get("next_steps", ""), height=200, disabled=True)
+
+def render_job_list(key_prefix, limit=10):
+    """Job table for the current user: progress while running, Open/Remove once finished."""
+    jobs = get_job_queue().store.list(owner=session_owner(), limit=limit)
+    if not jobs:
+        st.caption("No analysis jobs yet.")
+        return
+    for job in jobs:
+        created = datetime.datetime.fromtimestamp(job["created"]).strftime("%d %b %H:%M")
+        jc1, jc2, jc3 = st.columns([6, 2, 2])
+        with jc1:
+            st.markdown(f"**{job['title']}** · {created} · `{job['status']}`")
+            if job["status"] in (QUEUED, RUNNING):
+                st.progress(job["progress"] or 0, text=f"{job['stage']} {job['message'] or ''}".strip())
+            elif job["status"] == FAILED:
+                st.caption(f"❌ {job['error']}")
+            elif job["message"]:
+                st.caption(job["message"])
+        if job["status"] == DONE and jc2.button("Open", key=f"{key_prefix}_open_{job['id']}"):
+            if open_job_result(job["id"]):
+                st.toast("Loaded! Check Tab 2 and 3.")
+                st.rerun()
+        if job["status"] in (DONE, FAILED) and jc3.button("Remove", key=f"{key_prefix}_rm_{job['id']}"):
+            get_job_queue().store.delete(job["id"])
+            st.rerun()
+
 # --- Markdown Parsers ---
 def _add_rich_text(paragraph, text):
     # Splits by **bold**, keeping the delimiters
@@ -484,6 +1120,7 @@ def add_markdown_to_doc(doc, text):
 if 'gdrive_creds' not in st.session_state: st.session_state.gdrive_creds = None
 if 'basecamp_token' not in st.session_state: st.session_state.basecamp_token = None
 if 'user_real_name' not in st.session_state: st.session_state.user_real_name = ""
+if 'user_account_id' not in st.session_state: st.session_state.user_account_id = ""
 if 'detected_date' not in st.session_state: st.session_state.detected_date = None
 if 'detected_time' not in st.session_state: st.session_state.detected_time = None
 if 'detected_title' not in st.session_state: st.session_state.detected_title = "Meeting_Minutes"
@@ -513,8 +1150,9 @@ if AUTO_LOGIN_MODE and "code" in st.query_params and not st.session_state.baseca
         else:
             token = response.json()
             st.session_state.basecamp_token = token
-            real_name = fetch_basecamp_name(token)
+            real_name, account_id = fetch_basecamp_identity(token)
             if real_name: st.session_state.user_real_name = real_name
+            st.session_state.user_account_id = account_id
             st.toast("✅ Basecamp Login Successful!", icon="🎉")
             st.query_params.clear()
             time.sleep(1)
@@ -531,7 +1169,7 @@ with st.sidebar:
     if st.session_state.basecamp_token:
         st.success(f"✅ Connected: {st.session_state.user_real_name}")
         if st.button("Logout Basecamp"):
-            st.session_state.basecamp_token = None; st.session_state.user_real_name = ""; st.rerun()
+            st.session_state.basecamp_token = None; st.session_state.user_real_name = ""; st.session_state.user_account_id = ""; st.rerun()
     else:
         bc = OAuth2Session(BASECAMP_CLIENT_ID, redirect_uri=BASECAMP_REDIRECT_URI)
         url, _ = bc.authorization_url(BASECAMP_AUTH_URL, type="web_server")
@@ -540,7 +1178,7 @@ with st.sidebar:
             st.markdown(f"[Authorize]({url})"); c = st.text_input("Code")
             if c: 
                 st.session_state.basecamp_token = requests.post(BASECAMP_TOKEN_URL, data={"type":"web_server","client_id":BASECAMP_CLIENT_ID,"client_secret":BASECAMP_CLIENT_SECRET,"redirect_uri":BASECAMP_REDIRECT_URI,"code":c}).json()
-                st.session_state.user_real_name = fetch_basecamp_name(st.session_state.basecamp_token)
+                st.session_state.user_real_name, st.session_state.user_account_id = fetch_basecamp_identity(st.session_state.basecamp_token)
                 st.rerun()
 
     st.divider()
@@ -604,6 +1242,11 @@ if not (st.session_state.basecamp_token and st.session_state.gdrive_creds):
 if 'ai_results' not in st.session_state: st.session_state.ai_results = {}
 if 'chat_history' not in st.session_state: st.session_state.chat_history = []
 if 'saved_participants_input' not in st.session_state: st.session_state.saved_participants_input = ""
+if 'live_job' not in st.session_state: st.session_state.live_job = None
+if 'transcript_ref' not in st.session_state: st.session_state.transcript_ref = None
+if 'publish' not in st.session_state: st.session_state.publish = None
+if 'meeting_record' not in st.session_state: st.session_state.meeting_record = None
+if 'chat_persisted' not in st.session_state: st.session_state.chat_persisted = 0
 
 st.title("🤖 AI Meeting Manager")
 
@@ -613,47 +1256,61 @@ with tab1:
     st.header("1. Analyze Audio")
     participants = st.text_area("Participants", "Client (Client)\niFoundries (iFoundries)")
     up = st.file_uploader("Upload", type=['mp3','mp4','m4a','wav'])
+    cs = get_transcript_cache().stats()
+    st.caption(f"Transcript cache: {cs['hits']} hits / {cs['misses']} misses · {cs['entries']} entries ({cs['bytes'] / 1e6:.1f} MB)")
+    if get_gemini_cache():
+        gs = get_gemini_cache().stats()
+        st.caption(f"Gemini cache: {gs['hit_rate']:.0%} hit rate · {gs['entries']} entries · {gs['seconds_saved']:.0f}s of model time saved")
+    ls = format_limit_stats(get_service_limits().stats())
+    if ls: st.caption(f"API usage since restart: {ls}")
     
+    owner = session_owner()
+    job_queue = get_job_queue()
+    active_files = {j["params"].get("file_name") for j in job_queue.store.list(owner) if j["status"] in (QUEUED, RUNNING)}
+    job_creds = {"creds": st.session_state.gdrive_creds, "default_title": st.session_state.detected_title}
+
+    # In-flight transcriptions from an earlier run that no job is polling any more
+    segmented = {}
+    for op_name, op_info in get_operation_tracker().pending(owner):
+        if op_info.get("file_name") in active_files: continue
+        # Segments of one recording aren't resumable on their own: analysing it again picks them up
+        if op_info.get("segment") is not None:
+            segmented.setdefault(op_info.get("cache_key") or op_name, []).append((op_name, op_info)); continue
+        oc1, oc2, oc3 = st.columns([6, 2, 2])
+        oc1.info(f"⏳ **{op_info.get('file_name', 'Recording')}** (started {datetime.datetime.fromtimestamp(op_info['started']).strftime('%d %b %H:%M')}) is still transcribing.")
+        if oc2.button("Resume", key=f"resume_{op_name}"):
+            st.session_state.live_job = job_queue.submit(owner, "resume", op_info.get("file_name", "Recording"), run_resume_job, {
+                "operation_name": op_name, "participants_context": participants,
+                "file_name": op_info.get("file_name", "Recording"), "owner": owner, **job_creds
+            })
+            st.rerun()
+        if oc3.button("Discard", key=f"discard_{op_name}"):
+            get_operation_tracker().finish(op_name); st.rerun()
+    for key, ops in segmented.items():
+        op_info = ops[0][1]
+        sc1, sc2 = st.columns([8, 2])
+        sc1.info(f"⏳ **{op_info.get('file_name', 'Recording')}** was being transcribed in {op_info.get('segments', len(ops))} segments; analyze it again to reuse the {len(ops)} already started.")
+        if sc2.button("Discard", key=f"discard_segments_{key}"):
+            for op_name, _ in ops: get_operation_tracker().finish(op_name)
+            st.rerun()
+
     if st.button("Analyze"):
         if up:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".{up.name.split('.')[-1]}") as tmp:
-                tmp.write(up.getvalue()); path = tmp.name
-            
-            st.session_state.chat_history = []
-            st.session_state.saved_participants_input = participants
-            
-            # Parse Reps
-            cl = [l.replace("(Client)","").strip() for l in participants.split('\n') if "(Client)" in l]
-            il = [l.replace("(iFoundries)","").strip() for l in participants.split('\n') if "(iFoundries)" in l]
-            st.session_state.auto_client_reps = "\n".join(cl)
-            st.session_state.auto_ifoundries_reps = ", ".join(il)
-
-            # Metadata
-            with st.spinner("Extracting Metadata..."):
-                meta = get_visual_metadata(path)
-                if meta['datetime_sg']:
-                    st.session_state.detected_date = meta['datetime_sg'].date()
-                    end = meta['datetime_sg'] + datetime.timedelta(seconds=meta['duration'])
-                    st.session_state.detected_time = f"{meta['datetime_sg'].strftime('%I:%M %p')} - {end.strftime('%I:%M %p')}"
-                    if meta['title']: st.session_state.detected_title = meta['title']
-                    if meta['venue']: st.session_state.detected_venue = meta['venue']
-            
-            # Analyze
-            res = get_structured_notes_google(path, up.name, participants)
-            if "error" in res: st.error(res["error"])
-            else:
-                st.session_state.ai_results = res
-                # Auto-Save
-                ts = datetime.datetime.now().strftime("%Y%m%d_%H%M")
-                save_data = {
-                    "ai_results": res, 
-                    "participants": participants, 
-                    "date": str(datetime.datetime.now()),
-                    "chat_history": [],
-                    "detected_title": st.session_state.detected_title
-                }
-                save_analysis_data_to_drive(save_data, f"Data_{up.name}_{ts}.json")
-                st.success("Done! Check Review tab.")
+            path = spool_upload(up, upload_spool_dir())
+
+            st.session_state.live_job = job_queue.submit(owner, "analyze", up.name, run_analysis_job, {
+                "audio_file_path": path, "file_name": up.name,
+                "participants_context": participants, "owner": owner, **job_creds
+            })
+            st.success("Queued! Keep working — the Review tab fills in as the summary is written.")
+
+    # Refreshes itself while the tab is open
+    @st.fragment(run_every=3)
+    def render_job_queue():
+        st.subheader("Analysis Jobs")
+        render_job_list("t1")
+
+    render_job_queue()
 
 with tab2:
     st.header("2. Review")
@@ -671,9 +1328,15 @@ with tab2:
     irep = c2.text_input("iFoundries Reps", st.session_state.auto_ifoundries_reps)
     
     st.subheader("Content")
-    overview = st.text_area("Overview (Green Box)", st.session_state.ai_results.get("overview", ""))
-    disc = st.text_area("Discussion", st.session_state.ai_results.get("discussion", ""), height=300)
-    next_s = st.text_area("Next Steps (Includes Client Requests)", st.session_state.ai_results.get("next_steps", ""), height=200)
+    if st.session_state.live_job:
+        render_live_review()
+        overview = st.session_state.ai_results.get("overview", "")
+        disc = st.session_state.ai_results.get("discussion", "")
+        next_s = st.session_state.ai_results.get("next_steps", "")
+    else:
+        overview = st.text_area("Overview (Green Box)", st.session_state.ai_results.get("overview", ""))
+        disc = st.text_area("Discussion", st.session_state.ai_results.get("discussion", ""), height=300)
+        next_s = st.text_area("Next Steps (Includes Client Requests)", st.session_state.ai_results.get("next_steps", ""), height=200)
     
     st.divider()
     do_d = st.checkbox("Upload to Drive", True)
@@ -682,17 +1345,26 @@ with tab2:
     pid, tool, tid, subid, btitle, bdesc = None, None, None, None, "", ""
     
     if do_b:
-        sess = get_basecamp_session_user()
-        projs = get_basecamp_projects(sess)
-        pname = st.selectbox("Project", [p[0] for p in projs])
+        bc = get_basecamp_client()
+        sess = bc.session if bc else None
+        if bc and st.button("↻ Refresh Basecamp lists", help="Projects and lists are cached for a few minutes."): bc.invalidate()
+        projs = get_basecamp_projects(bc)
+        listing = bc.projects() if bc else None
+        names = [p[0] for p in projs]
+        # Options grow while later pages load: keep the pick across those reruns
+        prev = st.session_state.get("bc_project_name")
+        pname = st.selectbox("Project", names, index=names.index(prev) if prev in names else 0)
+        st.session_state.bc_project_name = pname
+        if listing and not listing.done: render_listing_progress(listing, "projects", listing.pages)
+        elif listing and listing.error and listing.items: st.caption(f"⚠️ Only {len(listing.items)} projects loaded: {listing.error}")
         if pname:
             pid = next(p[1] for p in projs if p[0]==pname)
             tool = st.selectbox("Where to post?", ["To-dos", "Message Board", "Docs"])
-            dock = get_project_tools(sess, pid)
+            dock = get_project_tools(bc, pid)
             
             if tool == "To-dos":
                 tid = next((t['id'] for t in dock if t['name']=='todoset'), None)
-                lists = get_todolists(sess, tid, pid)
+                lists = get_todolists(bc, tid, pid)
                 lname = st.selectbox("List", [l[0] for l in lists])
                 if lname: subid = next(l[1] for l in lists if l[0]==lname); btitle = st.text_input("Title", f"Minutes - {date}")
             elif tool == "Message Board":
@@ -735,16 +1407,17 @@ with tab2:
         
         doc.paragraphs[-1].text = f"Prepared by: {prep}"
         
-        b = io.BytesIO(); doc.save(b); b.seek(0)
+        b = io.BytesIO(); doc.save(b)
         fn = f"{st.session_state.detected_title}_{date}.docx"
         
-        if do_d: upload_to_drive_user(b, fn, "Meeting Notes")
-        if do_b and pid:
-            sgid = upload_bc_attachment(sess, b.getvalue(), fn)
-            post_to_basecamp(sess, pid, tool, tid, subid, btitle, "Attached.", sgid)
-        
-        st.success("Done!")
-        st.download_button("Download", b, fn)
+        # Drive and Basecamp in parallel; each reports (and retries) on its own
+        basecamp = {"session": sess, "project_id": pid, "tool_type": tool, "tool_id": tid, "sub_id": subid,
+                    "title": btitle, "content": "Attached."} if do_b and pid else None
+        destinations = publish_destinations(b.getvalue(), fn, "Meeting Notes" if do_d else None, basecamp)
+        with st.spinner("Publishing..."):
+            destinations, seconds = publish(destinations, PUBLISH_RETRIES)
+        st.session_state.publish = {"destinations": destinations, "seconds": seconds, "bytes": b.getvalue(), "file_name": fn}
+    if st.session_state.publish: render_publish_status()
 
 with tab3:
     st.header("💬 Chat")
@@ -761,11 +1434,16 @@ with tab3:
         upload_to_drive_user(b, f"Chat_{st.session_state.detected_title}.docx", "Chats")
         st.success("Saved!")
 
+    use_retrieval = CHAT_RETRIEVAL and st.toggle("Relevant passages only", True, help="Send the most relevant parts of the transcript with each question instead of all of it.")
+    if st.session_state.meeting_record: st.caption(f"New messages are saved with {st.session_state.meeting_record['name']} in Meeting_Data.")
+
     # Chat Box
     box = st.container(height=500)
     with box:
         for m in st.session_state.chat_history:
-            st.chat_message(m["role"], avatar="👤" if m["role"]=="user" else "🤖").markdown(m["content"])
+            msg = st.chat_message(m["role"], avatar="👤" if m["role"]=="user" else "🤖")
+            msg.markdown(m["content"])
+            if m.get("metrics"): msg.caption(m["metrics"])
     
     if p := st.chat_input("Ask a question..."):
         st.session_state.chat_history.append({"role":"user", "content":p})
@@ -773,39 +1451,113 @@ with tab3:
         
         with box.chat_message("assistant", avatar="🤖"):
             with st.spinner("Thinking..."):
+                if not ensure_transcript(): st.warning("Couldn't fetch this meeting's transcript from Drive; answering from the notes only.")
+                ai = st.session_state.ai_results
+                if use_retrieval:
+                    index = get_meeting_index(ai.get('full_transcript',''))
+                    material = f"Meeting notes: {ai.get('overview','')}\n{ai.get('discussion','')}\n{ai.get('next_steps','')}\nRelevant transcript excerpts (in meeting order): {index.context_for(p, CHAT_TOP_K)}"
+                    mode = f"retrieval top-{CHAT_TOP_K}/{len(index)}"
+                else:
+                    material = f"Transcript: {ai.get('full_transcript','')}"
+                    mode = "full transcript"
                 prompt = f"""
                 Role: Secretary.
                 Context: {st.session_state.saved_participants_input}
-                Transcript: {st.session_state.ai_results.get('full_transcript','')}
+                {material}
                 Question: {p}
                 Rules: Professional voice. Use real names. Concise.
                 """
-                resp = gemini_model.generate_content(prompt).text
+                metrics = ChatTurnMetrics(mode, prompt)
+                resp = metrics.observe(gemini_model.generate_content(prompt))
                 st.markdown(resp)
-                st.session_state.chat_history.append({"role":"assistant", "content":resp})
+                st.caption(metrics.caption())
+                record_chat_metrics(os.path.join(LOCAL_CACHE_DIR, "chat_metrics.jsonl"), metrics)
+                st.session_state.chat_history.append({"role":"assistant", "content":resp, "metrics": metrics.caption()})
+                persist_chat_turns()
 
 with tab4:
     st.header("📂 History")
     if st.button("Refresh"): st.rerun()
+    with st.expander("Analysis Jobs", expanded=False):
+        render_job_list("t4", limit=25)
+    mirror = get_meeting_mirror(account_key(st.session_state.gdrive_creds))
     files = list_past_meetings()
-    if files:
-        sel = st.selectbox("Select Meeting", [f['name'] for f in files])
-        if st.button("Load"):
-            fid = next(f['id'] for f in files if f['name'] == sel)
-            d = load_meeting_data(fid)
-            if d:
-                st.session_state.ai_results = d.get("ai_results", {})
-                st.session_state.saved_participants_input = d.get("participants", "")
-                # Restore Chat History!
-                st.session_state.chat_history = d.get("chat_history", [])
-                st.session_state.detected_title = d.get("detected_title", "Meeting")
-                
-                # Restore Reps
-                p_input = st.session_state.saved_participants_input
-                c_list = [l.replace("(Client)","").strip() for l in p_input.split('\n') if "(Client)" in l]
-                i_list = [l.replace("(iFoundries)","").strip() for l in p_input.split('\n') if "(iFoundries)" in l]
-                st.session_state.auto_client_reps = "\n".join(c_list)
-                st.session_state.auto_ifoundries_reps = ", ".join(i_list)
-
-                st.success("Loaded! Check Tab 2 and 3.")
-                time.sleep(1); st.rerun()
+    hc1, hc2 = st.columns([3, 1])
+    hq = hc1.text_input("Filter meetings", placeholder="title, participant or topic")
+    hdates = hc2.date_input("Meeting dates", value=(), key="history_dates")
+    h_since, h_until = (hdates[0], hdates[1]) if isinstance(hdates, (list, tuple)) and len(hdates) == 2 else (None, None)
+    shown = mirror.entries(hq, h_since, h_until) if (hq or h_since) else files
+    pages = max(1, -(-len(shown) // HISTORY_PAGE_SIZE))
+    page = st.number_input(f"Page (of {pages})", 1, pages, 1) if pages > 1 else 1
+    last = mirror.last_sync
+    if mirror.syncing: sync_note = "syncing with Drive..."
+    elif last.get("error"): sync_note = "Drive unreachable, showing the local copy"
+    elif last.get("at"): sync_note = f"synced {int(time.time() - last['at'])}s ago"
+    else: sync_note = "local copy"
+    st.caption(f"{len(shown)} of {len(files)} meetings · {sync_note}")
+    for m in shown[(page - 1) * HISTORY_PAGE_SIZE:page * HISTORY_PAGE_SIZE]:
+        with st.expander(f"{m['meeting_date']} · {m['title'].replace('_', ' ')}"):
+            st.caption(" · ".join(filter(None, [
+                ", ".join(l.strip() for l in m["participants"].split("\n") if l.strip()),
+                f"{(m['size'] or 0) / 1024:.0f} KB" if m["size"] else "",
+                f"{m['chat_turns']} chat messages" if m["chat_turns"] else "",
+            ])))
+            for key, text in m["previews"].items():
+                st.markdown(f"**{key.replace('_', ' ').title()}:** {text}")
+            if st.button("Load", key=f"load_{m['id']}"):
+                d = mirror.get(m["id"]) or load_meeting_data(m["id"], full=False)
+                if d:
+                    restore_meeting(d, {"id": m["id"], "name": m["name"]})
+                    st.success("Loaded! Check Tab 2 and 3.")
+                    time.sleep(1); st.rerun()
+                else:
+                    forget_past_meeting(m["id"])
+                    st.error("That meeting could not be loaded (it may have been deleted from Drive).")
+    if st.session_state.gdrive_creds and st.button("Re-sync with Drive", help="Re-scan Meeting_Data, copy anything missing and drop meetings that were deleted."):
+        with st.spinner("Scanning Meeting_Data..."):
+            try: get_meeting_manifests().rebuild(meeting_data_folder(st.session_state.gdrive_creds))
+            except Exception: pass
+            result = sync_meeting_mirror(full=True, wait=True)
+        if result: st.success(f"Copied {result['copied']}, removed {result['removed']} · {mirror.stats()['records']} meetings.")
+        else: st.error("Couldn't reach Drive; History is showing the local copy.")
+        time.sleep(1); st.rerun()
+
+    # --- Search & chat across every saved meeting ---
+    st.divider()
+    st.subheader("🔎 Search All Meetings")
+    search_index = get_meeting_search(account_key(st.session_state.gdrive_creds))
+    si = search_index.stats()
+    missing = len({f['id'] for f in files} - search_index.known_ids()) if files else 0
+    st.caption(f"Index: {si['meetings']} meetings · {si['passages']} passages" + (f" · {missing} not indexed yet" if missing else ""))
+    if missing and st.button(f"Index {missing} older meetings"):
+        with st.spinner("Indexing..."):
+            folder = meeting_data_folder(st.session_state.gdrive_creds)
+            source = DriveSource(folder) if folder else None
+            added = search_index.backfill(files, lambda file_id: mirror.get(file_id, source=source))
+        st.success(f"Indexed {added} meetings."); st.rerun()
+
+    sq = st.text_input("Search", placeholder="e.g. what did the client ask for about the homepage")
+    dates = st.date_input("Meeting dates (optional)", value=(), help="Pick a start and end date to limit the search.")
+    since, until = (dates[0], dates[1]) if isinstance(dates, (list, tuple)) and len(dates) == 2 else (None, None)
+    if sq:
+        t0 = time.perf_counter()
+        context, hits = search_index.context_for(sq, CHAT_TOP_K * 2, since, until)
+        semantic_note = {"late": " · keyword matches only (the semantic ranking wasn't ready in time; search again for it)",
+                         "unavailable": " · keyword matches only (semantic ranking unavailable)"}.get(hits.semantic, "")
+        st.caption(f"{len(hits)} passages from {len({h['file_id'] for h in hits})} meetings in {(time.perf_counter() - t0) * 1000:.0f} ms{semantic_note}")
+        for h in hits:
+            with st.expander(f"{h['date']} · {h['title'].replace('_', ' ')} · {h['label']}"):
+                st.markdown(h["text"])
+        if st.button("Ask across these meetings"):
+            with st.spinner("Thinking..."):
+                prompt = f"""
+                Role: Secretary answering from several past meetings.
+                Excerpts (grouped by meeting, oldest first):
+                {context}
+                Question: {sq}
+                Rules: Professional voice. Use real names. Say which meeting (title and date) each point comes from. Concise.
+                """
+                metrics = ChatTurnMetrics(f"multi-meeting top-{len(hits)}", prompt)
+                st.markdown(metrics.observe(gemini_model.generate_content(prompt)))
+                st.caption(metrics.caption())
+                record_chat_metrics(os.path.join(LOCAL_CACHE_DIR, "chat_metrics.jsonl"), metrics)
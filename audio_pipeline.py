@@ -0,0 +1,458 @@
+"""Audio ingest helpers shared by app.py and appver2.py.
+
+Kept free of Streamlit calls so the same code can run inside the UI thread
+or anywhere else; callers decide how to surface errors and stats.
+"""
+import bisect
+import json
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Resumable uploads require chunk sizes that are a multiple of 256 KB.
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+PIPE_READ_SIZE = 256 * 1024
+
+
+# -----------------------------------------------------
+# TRANSCODE PROFILES
+# -----------------------------------------------------
+# Speech-to-Text resamples everything to 16 kHz mono internally, so anything
+# above that is just bytes to convert, upload and bill. "source_flac" keeps the
+# old behaviour (original rate and channel layout) for comparison.
+TRANSCODE_PROFILES = {
+    "source_flac": {
+        "codec": "flac", "format": "flac", "ext": "flac", "content_type": "audio/flac",
+        "encoding": "FLAC", "sample_rate": None, "channels": None, "bitrate": None,
+    },
+    "speech_flac": {
+        "codec": "flac", "format": "flac", "ext": "flac", "content_type": "audio/flac",
+        "encoding": "FLAC", "sample_rate": 16000, "channels": 1, "bitrate": None,
+    },
+    "speech_opus": {
+        "codec": "libopus", "format": "ogg", "ext": "ogg", "content_type": "audio/ogg",
+        "encoding": "OGG_OPUS", "sample_rate": 16000, "channels": 1, "bitrate": "24k",
+    },
+}
+DEFAULT_PROFILE = "speech_flac"
+
+# ffprobe reports decoder names, which differ from the encoder names above
+_PROBE_CODEC_NAMES = {"flac": "flac", "libopus": "opus"}
+
+
+def probe_audio(file_path):
+    """Returns codec/rate/channels of the first audio stream, or None if ffprobe fails."""
+    cmd = ["ffprobe", "-v", "error", "-show_entries",
+           "stream=codec_type,codec_name,sample_rate,channels:format=format_name,duration",
+           "-of", "json", file_path]
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True)
+        if res.returncode != 0:
+            return None
+        info = json.loads(res.stdout or "{}")
+    except (OSError, ValueError):
+        return None
+
+    streams = info.get("streams", [])
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    if not audio:
+        return None
+    fmt = info.get("format", {})
+    return {
+        "codec": audio.get("codec_name"),
+        "sample_rate": int(audio.get("sample_rate") or 0),
+        "channels": int(audio.get("channels") or 0),
+        "format": fmt.get("format_name", ""),
+        "duration": float(fmt.get("duration") or 0),
+        "has_video": any(s.get("codec_type") == "video" for s in streams),
+    }
+
+
+def fits_profile(probe, profile):
+    """True when the file can be sent to Speech-to-Text as-is for this profile."""
+    if not probe or probe["has_video"]:
+        return False
+    if probe["codec"] != _PROBE_CODEC_NAMES.get(profile["codec"]):
+        return False
+    if profile["format"] not in probe["format"].split(","):
+        return False
+    if profile["sample_rate"] and probe["sample_rate"] != profile["sample_rate"]:
+        return False
+    if profile["channels"] and probe["channels"] != profile["channels"]:
+        return False
+    return True
+
+
+def profile_ffmpeg_args(profile, audio_filter=None):
+    args = ["-vn"]
+    if audio_filter:
+        args += ["-af", audio_filter]
+    if profile["channels"]:
+        args += ["-ac", str(profile["channels"])]
+    if profile["sample_rate"]:
+        args += ["-ar", str(profile["sample_rate"])]
+    args += ["-c:a", profile["codec"]]
+    if profile["bitrate"]:
+        args += ["-b:a", profile["bitrate"]]
+    return args + ["-f", profile["format"]]
+
+
+def record_profile_stats(log_path, entry):
+    """Appends one profile measurement as a JSON line so profiles can be compared later."""
+    if not log_path:
+        return
+    try:
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        with open(log_path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(entry) + "\n")
+    except OSError:
+        pass
+
+
+# -----------------------------------------------------
+# VOICE-ACTIVITY TRIMMING
+# -----------------------------------------------------
+# Waiting rooms, screen-share pauses and "you're on mute" gaps are transcoded,
+# uploaded and billed like speech. ffmpeg's silencedetect finds them cheaply;
+# only gaps longer than ``min_silence`` are cut and ``pad`` seconds are kept on
+# each side so word onsets/trailing syllables are not clipped.
+VAD_DEFAULTS = {"noise_db": -35, "min_silence": 3.0, "pad": 0.4, "min_saving": 0.05}
+
+_SILENCE_START = re.compile(r"silence_start:\s*(-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end:\s*(-?[\d.]+)")
+
+
+def detect_silences(file_path, noise_db=-35, min_silence=3.0, input_args=()):
+    """Returns [(start, end), ...] of silent spans, in seconds of the (clipped) input."""
+    cmd = ["ffmpeg", "-nostdin", "-hide_banner", *input_args, "-i", file_path, "-vn",
+           "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}", "-f", "null", "-"]
+    res = subprocess.run(cmd, capture_output=True, text=True)
+    if res.returncode != 0:
+        return []
+    spans, start = [], None
+    for line in res.stderr.splitlines():
+        m = _SILENCE_START.search(line)
+        if m:
+            start = max(float(m.group(1)), 0.0)
+            continue
+        m = _SILENCE_END.search(line)
+        if m and start is not None:
+            spans.append((start, float(m.group(1))))
+            start = None
+    if start is not None:
+        spans.append((start, float("inf")))  # silent until EOF
+    return spans
+
+
+class OffsetMap:
+    """Maps times in the trimmed audio back to the original recording.
+
+    Stored as parallel lists of kept segments: where each one starts in the
+    trimmed stream, where it started in the original, and its length.
+    """
+
+    def __init__(self, segments=None):
+        self.trimmed_starts, self.original_starts, self.lengths = [], [], []
+        for trimmed, original, length in segments or []:
+            self.trimmed_starts.append(trimmed)
+            self.original_starts.append(original)
+            self.lengths.append(length)
+
+    @classmethod
+    def from_keep_spans(cls, spans):
+        segments, cursor = [], 0.0
+        for start, end in spans:
+            segments.append((round(cursor, 3), start, round(end - start, 3)))
+            cursor += end - start
+        return cls(segments)
+
+    def to_original(self, t):
+        if not self.trimmed_starts:
+            return t
+        i = bisect.bisect_right(self.trimmed_starts, t) - 1
+        i = max(i, 0)
+        return self.original_starts[i] + min(t - self.trimmed_starts[i], self.lengths[i])
+
+    def map_words(self, words):
+        """``words`` (``transcription.Word`` tuples) with start/end moved back to the original recording.
+
+        Every transcript built from trimmed audio must go through this.
+        """
+        if not self:
+            return list(words)
+        return [w._replace(start=self.to_original(w.start), end=self.to_original(w.end)) for w in words]
+
+    def to_list(self):
+        return [list(seg) for seg in zip(self.trimmed_starts, self.original_starts, self.lengths)]
+
+    def __bool__(self):
+        return bool(self.trimmed_starts)
+
+
+def plan_vad_trim(file_path, duration, noise_db=-35, min_silence=3.0, pad=0.4, min_saving=0.05,
+                  input_args=()):
+    """Works out which spans to keep. Returns (keep_spans, stats), or (None, stats) when not worth it."""
+    started = time.perf_counter()
+    silences = detect_silences(file_path, noise_db, min_silence, input_args)
+    keep, cursor = [], 0.0
+    for s_start, s_end in silences:
+        # No padding is needed where the silence touches the start or end of the file
+        cut_start = s_start + pad if s_start > 0 else 0.0
+        cut_end = s_end - pad if s_end < duration else duration
+        if cut_end - cut_start <= 0:
+            continue
+        if cut_start > cursor:
+            keep.append((round(cursor, 3), round(cut_start, 3)))
+        cursor = cut_end
+    if cursor < duration:
+        keep.append((round(cursor, 3), round(duration, 3)))
+
+    kept = sum(end - start for start, end in keep)
+    stats = {
+        "original_seconds": round(duration, 2),
+        "kept_seconds": round(kept, 2),
+        "removed_seconds": round(duration - kept, 2),
+        "segments": len(keep),
+        "detect_seconds": round(time.perf_counter() - started, 3),
+    }
+    if not keep or duration <= 0 or (duration - kept) / duration < min_saving:
+        stats.update(kept_seconds=round(duration, 2), removed_seconds=0, segments=1)
+        return None, stats
+    return keep, stats
+
+
+def trim_filter(keep_spans):
+    """ffmpeg audio filter that keeps only ``keep_spans`` and closes the gaps."""
+    expr = "+".join(f"between(t,{start},{end})" for start, end in keep_spans)
+    return f"aselect='{expr}',asetpts=N/SR/TB"
+
+
+# -----------------------------------------------------
+# THROUGHPUT METERING
+# -----------------------------------------------------
+class ThroughputMeter:
+    """Counts bytes moved through one pipeline stage and how long it took."""
+
+    def __init__(self, name):
+        self.name = name
+        self.bytes = 0
+        self.started = None
+        self.finished = None
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def add(self, n):
+        self.bytes += n
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def as_dict(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        seconds = max(end - (self.started or end), 1e-9)
+        return {
+            "bytes": self.bytes,
+            "seconds": round(seconds, 3),
+            "mb_per_s": round(self.bytes / seconds / 1e6, 2),
+        }
+
+
+def format_stage_stats(stats):
+    """One-line human summary, e.g. 'transcode: 41.2 MB in 12.1s (3.4 MB/s)'."""
+    parts = []
+    for name, s in stats.items():
+        if not isinstance(s, dict) or "bytes" not in s:
+            continue
+        parts.append(f"{name}: {s['bytes'] / 1e6:.1f} MB in {s['seconds']:.1f}s ({s['mb_per_s']} MB/s)")
+    return " | ".join(parts)
+
+
+# -----------------------------------------------------
+# STREAMING TRANSCODE -> GCS
+# -----------------------------------------------------
+def _drain(stream, sink):
+    # ffmpeg writes progress to stderr; if nobody reads it the pipe fills up and
+    # ffmpeg blocks, which in turn stalls stdout.
+    for line in iter(stream.readline, b""):
+        sink.append(line)
+        if len(sink) > 50:
+            del sink[:-50]
+    stream.close()
+
+
+def _discard_blob(blob):
+    """Deletes whatever a failed upload left at ``blob``; usually nothing, as an unfinalized resumable upload creates no object."""
+    from google.api_core.exceptions import NotFound
+    try:
+        blob.delete()
+    except Exception as e:
+        # Best effort: the caller is already raising the real error. Anything but "nothing there" may leave a blob behind.
+        if not isinstance(e, NotFound):
+            logger.warning("Could not delete partial upload gs://%s/%s: %s", getattr(blob.bucket, "name", "?"), blob.name, e)
+
+
+def stream_transcode_to_gcs(bucket, source_path, blob_name, ffmpeg_output_args,
+                            content_type, chunk_size=UPLOAD_CHUNK_SIZE, timeout=3600, input_args=()):
+    """Pipes ffmpeg output straight into a chunked resumable GCS upload.
+
+    Transcoding and upload overlap and no intermediate audio file is written.
+    ``ffmpeg_output_args`` must include an explicit ``-f <format>`` because the
+    output is a pipe. Returns per-stage throughput stats; raises on failure.
+    """
+    command = ["ffmpeg", "-nostdin", "-hide_banner", *input_args, "-i", source_path,
+               *ffmpeg_output_args, "pipe:1"]
+    transcode = ThroughputMeter("transcode")
+    upload = ThroughputMeter("upload")
+
+    blob = bucket.blob(blob_name, chunk_size=chunk_size)
+
+    # The writer is opened only once ffmpeg is running: if Popen fails there is nothing to clean up
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr_tail = []
+    stderr_thread = threading.Thread(target=_drain, args=(proc.stderr, stderr_tail), daemon=True)
+    stderr_thread.start()
+
+    try:
+        writer = blob.open("wb", chunk_size=chunk_size, content_type=content_type, timeout=timeout)
+        transcode.start()
+        upload.start()
+        while True:
+            data = proc.stdout.read(PIPE_READ_SIZE)
+            if not data:
+                break
+            transcode.add(len(data))
+            writer.write(data)
+            upload.add(len(data))
+        returncode = proc.wait()
+        transcode.stop()
+        stderr_thread.join(timeout=5)
+        if returncode != 0:
+            tail = b"".join(stderr_tail[-5:]).decode("utf-8", "replace").strip()
+            raise RuntimeError(f"ffmpeg exited with {returncode}: {tail}")
+        if transcode.bytes == 0:
+            raise RuntimeError("ffmpeg produced no audio output.")
+        # Closing flushes the final partial chunk and finalizes the upload.
+        writer.close()
+        upload.stop()
+    except Exception:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        # Never close() the writer here: that would finalize a truncated object.
+        # Leaving it unclosed releases the buffered chunk with this frame; the
+        # unfinished resumable session is abandoned and expires on the GCS side.
+        _discard_blob(blob)
+        raise
+    finally:
+        proc.stdout.close()
+
+    return {"transcode": transcode.as_dict(), "upload": upload.as_dict()}
+
+
+# -----------------------------------------------------
+# INGEST ENTRY POINT
+# -----------------------------------------------------
+def run_blob_stem(file_name):
+    """GCS object stem for one analysis run: the upload's name plus a random suffix.
+
+    Jobs run concurrently, and two uploads can share a file name; without the
+    suffix one job's cleanup would delete the audio the other is transcribing.
+    """
+    return f"{os.path.splitext(file_name)[0]}_{uuid.uuid4().hex[:12]}"
+
+
+def upload_file_to_gcs(bucket, file_path, blob_name, content_type, timeout=3600):
+    upload = ThroughputMeter("upload")
+    upload.start()
+    bucket.blob(blob_name).upload_from_filename(file_path, content_type=content_type, timeout=timeout)
+    upload.add(os.path.getsize(file_path))
+    upload.stop()
+    return upload.as_dict()
+
+
+def ingest_audio(bucket, source_path, blob_stem, profile_name=DEFAULT_PROFILE,
+                 streaming=True, stats_log=None, vad=None, clip=None):
+    """Gets ``source_path`` into GCS in the shape Speech-to-Text needs.
+
+    Skips ffmpeg entirely when ffprobe shows the upload already fits the
+    profile and there is no silence worth trimming. ``vad`` is a dict of
+    ``plan_vad_trim`` settings (None disables trimming). ``clip`` is an
+    optional (start, length) window in seconds, used for segmented STT.
+
+    Returns ``{"blob_name", "encoding", "sample_rate_hertz", "offset_map",
+    "stats"}`` where ``encoding`` is a ``RecognitionConfig.AudioEncoding``
+    member name and ``offset_map`` maps trimmed times back to the original.
+    """
+    profile = TRANSCODE_PROFILES[profile_name]
+    blob_name = f"{blob_stem}.{profile['ext']}"
+    started = time.perf_counter()
+    probe = probe_audio(source_path)
+    input_args = ()
+    if clip:
+        # Input-side seek: ffmpeg jumps straight to the window instead of decoding up to it
+        input_args = ("-ss", str(clip[0]), "-t", str(clip[1]))
+        if probe:
+            probe = {**probe, "duration": max(min(clip[1], probe["duration"] - clip[0]), 0)}
+
+    audio_filter, offset_map, vad_stats = None, OffsetMap(), None
+    if vad is not None and probe and probe["duration"]:
+        keep, vad_stats = plan_vad_trim(source_path, probe["duration"], input_args=input_args,
+                                        **{**VAD_DEFAULTS, **vad})
+        if keep:
+            audio_filter = trim_filter(keep)
+            offset_map = OffsetMap.from_keep_spans(keep)
+
+    skipped = not clip and audio_filter is None and fits_profile(probe, profile)
+
+    if skipped:
+        stats = {"upload": upload_file_to_gcs(bucket, source_path, blob_name, profile["content_type"])}
+    elif streaming:
+        stats = stream_transcode_to_gcs(bucket, source_path, blob_name,
+                                        profile_ffmpeg_args(profile, audio_filter), profile["content_type"],
+                                        input_args=input_args)
+    else:
+        transcode = ThroughputMeter("transcode")
+        fd, out_path = tempfile.mkstemp(suffix=f".{profile['ext']}")
+        os.close(fd)
+        try:
+            transcode.start()
+            command = ["ffmpeg", "-nostdin", *input_args, "-i", source_path,
+                       *profile_ffmpeg_args(profile, audio_filter), "-y", out_path]
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            transcode.add(os.path.getsize(out_path))
+            transcode.stop()
+            stats = {"transcode": transcode.as_dict(),
+                     "upload": upload_file_to_gcs(bucket, out_path, blob_name, profile["content_type"])}
+        finally:
+            if os.path.exists(out_path):
+                os.remove(out_path)
+
+    sample_rate = profile["sample_rate"] or (probe["sample_rate"] if probe else None)
+    stats["profile"] = {
+        "name": profile_name,
+        "skipped_transcode": skipped,
+        "source_bytes": os.path.getsize(source_path),
+        "clip": list(clip) if clip else None,
+        "output_bytes": stats["upload"]["bytes"],
+        "seconds": round(time.perf_counter() - started, 3),
+        "duration": probe["duration"] if probe else 0,
+    }
+    if vad_stats:
+        stats["vad"] = vad_stats
+    record_profile_stats(stats_log, {"ts": time.time(), "streaming": streaming, **stats["profile"],
+                                     "vad_removed_seconds": vad_stats["removed_seconds"] if vad_stats else 0})
+    return {
+        "blob_name": blob_name,
+        "encoding": profile["encoding"],
+        "sample_rate_hertz": sample_rate,
+        "offset_map": offset_map,
+        "stats": stats,
+    }
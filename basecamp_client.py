@@ -0,0 +1,246 @@
+"""Pooled, cache-aware Basecamp API access.
+
+With "Upload to Basecamp" ticked, every rerun of the Review tab (so every
+keystroke in any field on it) built a new ``OAuth2Session``, opened new
+connections and fetched ``projects.json``, the project's dock and its
+to-do lists again. Now:
+
+- ``BasecampClients`` keeps one ``BasecampClient`` per Basecamp account
+  for the whole process. Its session (and connection pool) is reused, so
+  requests ride kept-alive connections, and it goes through the shared
+  Basecamp rate limiter once.
+- ``BasecampClient.get_json`` caches GET responses. Within ``ttl`` a cached
+  body is returned with no request at all, so widget reruns cost nothing.
+  After that the request carries ``If-None-Match`` / ``If-Modified-Since``,
+  and Basecamp's ``304 Not Modified`` renews the entry without a body.
+- Writes (attachments, posts) use ``client.session`` directly and are
+  never cached.
+
+Listings (projects, to-do lists) are paginated: Basecamp returns one page
+plus ``Link: <...page=2>; rel="next"`` and ``X-Total-Count``. Reading
+only the first page silently truncated large accounts. ``iter_pages``
+yields page 1 as soon as it arrives; when the total count says how many
+pages there are, the rest are requested concurrently (the session's rate
+limiter keeps that within Basecamp's quota), otherwise ``rel="next"`` is
+followed page by page. ``Listing`` runs that on a background thread so
+the UI can offer page 1 at once and add the rest as they land.
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from requests.adapters import HTTPAdapter
+
+_NEXT_LINK = re.compile(r'<([^>]+)>\s*;\s*rel="?next"?')
+
+
+def token_key(token):
+    """Stable per-account key for a Basecamp OAuth token dict (the refresh token outlives access tokens)."""
+    ident = (token or {}).get("refresh_token") or (token or {}).get("access_token") or ""
+    return hashlib.sha256(ident.encode("utf-8")).hexdigest()[:16]
+
+
+def next_link(headers):
+    """The ``rel="next"`` URL of a Link header, or None."""
+    match = _NEXT_LINK.search((headers or {}).get("Link") or "")
+    return match.group(1) if match else None
+
+
+def page_url(url, page):
+    """``url`` with its ``page`` query parameter set to ``page``."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != "page"] + [("page", str(page))]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _total_count(headers):
+    try:
+        return int((headers or {}).get("X-Total-Count"))
+    except (TypeError, ValueError):
+        return None
+
+
+class Listing:
+    """The items of a paginated GET, filled in page by page on a background thread."""
+
+    def __init__(self, client, path, ttl=None):
+        self.items = []
+        self.pages = 0
+        self.total = None
+        self.error = None
+        self.done = False
+        self.started = time.time()
+        self._first = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(client, path, ttl), name="basecamp-listing", daemon=True)
+        self._thread.start()
+
+    def _run(self, client, path, ttl):
+        try:
+            for page in client.iter_pages(path, ttl, on_total=lambda n: setattr(self, "total", n)):
+                self.items = self.items + page  # replaced, not extended: readers never see a list mid-update
+                self.pages += 1
+                self._first.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._first.set()
+
+    def first_page(self, timeout=None):
+        """Items so far, waiting for the first page. Raises the fetch error if not even that arrived."""
+        self._first.wait(timeout)
+        if self.error and not self.items:
+            raise self.error
+        return self.items
+
+    def wait(self, timeout=None):
+        """Every item (waits for the last page)."""
+        self._thread.join(timeout)
+        if self.error and not self.items:
+            raise self.error
+        return self.items
+
+
+class BasecampClient:
+    """One account's session plus a conditional-GET cache keyed by URL."""
+
+    def __init__(self, session, base_url, ttl=300, max_entries=256, max_workers=4):
+        self.session = session
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_workers = max_workers
+        self._cache = {}  # url -> {"etag", "modified", "data", "next", "total", "fetched"}
+        self._listings = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "revalidated": 0, "fetched": 0}
+
+    def url(self, path):
+        return path if path.startswith("http") else f"{self.base_url}/{path.lstrip('/')}"
+
+    def get_json(self, path, ttl=None):
+        """GET ``path`` as JSON: cached within ``ttl``, then revalidated with the stored ETag / Last-Modified."""
+        return self._get(self.url(path), ttl)["data"]
+
+    def _get(self, url, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            entry = self._cache.get(url)
+        if entry and time.time() - entry["fetched"] < ttl:
+            self._count("hits")
+            return entry
+
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["modified"]:
+            headers["If-Modified-Since"] = entry["modified"]
+        resp = self.session.get(url, headers=headers)
+        if resp.status_code == 304 and entry:
+            self._count("revalidated")
+            entry = {**entry, "fetched": time.time()}
+        else:
+            resp.raise_for_status()
+            self._count("fetched")
+            entry = {"etag": resp.headers.get("ETag"), "modified": resp.headers.get("Last-Modified"),
+                     "data": resp.json(), "next": next_link(resp.headers), "total": _total_count(resp.headers),
+                     "fetched": time.time()}
+        with self._lock:
+            self._cache[url] = entry
+            if len(self._cache) > self.max_entries:
+                oldest = min(self._cache, key=lambda u: self._cache[u]["fetched"])
+                del self._cache[oldest]
+        return entry
+
+    def iter_pages(self, path, ttl=None, on_total=None):
+        """Yields each page's items in page order, page 1 first; later pages are fetched concurrently when the total is known."""
+        entry = self._get(self.url(path), ttl)
+        if on_total and entry["total"] is not None:
+            on_total(entry["total"])
+        yield entry["data"]
+        url, per_page = entry["next"], len(entry["data"])
+        if url and entry["total"] and per_page:
+            urls = [page_url(url, n) for n in range(2, math.ceil(entry["total"] / per_page) + 1)]
+            if urls:
+                with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="basecamp-page") as pool:
+                    for entry in pool.map(lambda u: self._get(u, ttl), urls):
+                        yield entry["data"]
+                # Anything added since the count was taken
+                url = entry["next"]
+        while url:
+            entry = self._get(url, ttl)
+            yield entry["data"]
+            url = entry["next"]
+
+    def listing(self, path, ttl=None):
+        """A shared ``Listing`` of ``path``; started again once it is older than ``ttl`` (pages revalidate via ETag)."""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            listing = self._listings.get(path)
+            if listing is None or (listing.done and (listing.error or time.time() - listing.started >= ttl)):
+                listing = self._listings[path] = Listing(self, path, ttl)
+            return listing
+
+    def invalidate(self, path=None):
+        """Forgets one cached URL (and its listing), or everything; the next read revalidates."""
+        with self._lock:
+            if path is None:
+                self._cache.clear()
+                self._listings.clear()
+            else:
+                self._cache.pop(self.url(path), None)
+                self._listings.pop(path, None)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    # --- Metadata ---
+    def projects(self):
+        """``Listing`` of every project (all pages)."""
+        return self.listing("projects.json")
+
+    def dock(self, project_id):
+        return self.get_json(f"projects/{project_id}.json").get("dock", [])
+
+    def todolists(self, project_id, todoset_id):
+        """``Listing`` of a to-do set's lists (all pages)."""
+        return self.listing(f"buckets/{project_id}/todosets/{todoset_id}/todolists.json")
+
+
+class BasecampClients:
+    """Process-wide pool: one ``BasecampClient`` per account.
+
+    ``make_session(token)`` builds a ``requests.Session``-like object
+    (an ``OAuth2Session`` with headers and rate limiting); it is called
+    once per account, and again only when the access token changes.
+    """
+
+    def __init__(self, make_session, base_url, ttl=300, pool_size=8):
+        self.make_session = make_session
+        self.base_url = base_url
+        self.ttl = ttl
+        self.pool_size = pool_size
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        key = token_key(token)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._clients[key] = BasecampClient(self._session(token), self.base_url, self.ttl)
+            elif getattr(client.session, "token", {}).get("access_token") != token.get("access_token"):
+                # Same account, new access token: fresh session, cached metadata stays valid
+                client.session = self._session(token)
+            return client
+
+    def _session(self, token):
+        session = self.make_session(token)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        return session
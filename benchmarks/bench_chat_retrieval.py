@@ -0,0 +1,88 @@
+"""Chat prompt size with and without retrieval, and real TTFT from the app's metrics log.
+
+Synthetic mode builds a long multi-speaker transcript with a few planted
+facts, then compares the prompt tokens of a full-transcript turn against a
+top-k BM25 turn and checks the planted fact is among the retrieved passages.
+
+    python benchmarks/bench_chat_retrieval.py --turns 3000
+    python benchmarks/bench_chat_retrieval.py --log .cache/chat_metrics.jsonl
+"""
+import argparse
+import collections
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval import BM25Index  # noqa: E402
+from summarization import estimate_tokens  # noqa: E402
+
+VOCAB = ("project timeline design review budget client feedback website launch content update meeting "
+         "schedule report page layout banner colour font mobile desktop login server deploy testing").split()
+FACTS = {
+    "When is the payment gateway going live?": "the payment gateway goes live on the fourteenth of March",
+    "Who owns the accessibility audit?": "Priya will own the accessibility audit and report back",
+    "What did we decide about the newsletter vendor?": "we decided to drop Mailwave as the newsletter vendor",
+}
+
+
+def synthetic_transcript(turns, seed=7):
+    rng = random.Random(seed)
+    parts = []
+    fact_positions = {rng.randrange(turns): fact for fact in FACTS.values()}
+    for i in range(turns):
+        words = [rng.choice(VOCAB) for _ in range(rng.randint(8, 80))]
+        if i in fact_positions:
+            words[len(words) // 2:len(words) // 2] = fact_positions[i].split()
+        parts.append(f"\n\nSpeaker {rng.randint(1, 4)}: " + " ".join(words) + " ")
+    return "".join(parts)
+
+
+def run_synthetic(turns, k, passage_tokens):
+    transcript = synthetic_transcript(turns)
+    started = time.perf_counter()
+    index = BM25Index.from_transcript(transcript, passage_tokens)
+    build = time.perf_counter() - started
+    full_tokens = estimate_tokens(transcript)
+    print(f"transcript: {turns} turns, ~{full_tokens:,} tokens; {len(index)} passages; index built in {build * 1000:.0f} ms")
+    print(f"{'question':<50}{'full tok':>10}{'top-k tok':>11}{'search ms':>11}  fact found")
+    for question, fact in FACTS.items():
+        started = time.perf_counter()
+        context = index.context_for(question, k)
+        search_ms = (time.perf_counter() - started) * 1000
+        print(f"{question:<50}{full_tokens:>10,}{estimate_tokens(context):>11,}{search_ms:>11.2f}  {fact in context}")
+
+
+def run_log(path):
+    by_mode = collections.defaultdict(list)
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            entry = json.loads(line)
+            by_mode[entry["mode"].split(" ")[0]].append(entry)
+    print(f"{'mode':<12}{'turns':>7}{'median TTFT s':>15}{'median prompt tok':>19}{'median total s':>16}")
+    for mode, entries in sorted(by_mode.items()):
+        print(f"{mode:<12}{len(entries):>7}"
+              f"{statistics.median(e['ttft_seconds'] for e in entries):>15.2f}"
+              f"{statistics.median(e['prompt_tokens'] for e in entries):>19,.0f}"
+              f"{statistics.median(e['total_seconds'] for e in entries):>16.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=3000, help="speaker turns in the synthetic transcript")
+    parser.add_argument("--k", type=int, default=6, help="passages per question (CHAT_TOP_K)")
+    parser.add_argument("--passage-tokens", type=int, default=300, help="CHAT_PASSAGE_TOKENS")
+    parser.add_argument("--log", help="summarise a chat_metrics.jsonl written by the app instead")
+    args = parser.parse_args()
+    if args.log:
+        run_log(args.log)
+    else:
+        run_synthetic(args.turns, args.k, args.passage_tokens)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Peak memory of spooling an upload to disk: ``getvalue()`` vs ``spool_upload``.
+
+Streamlit's ``UploadedFile`` is a ``BytesIO`` built from bytes that the
+upload manager keeps a reference to; the benchmark builds the same thing.
+"shared" is that state as uploaded, where CPython's ``getvalue()`` hands
+back the existing object without copying. "exported" is the same file
+while a memoryview of its buffer is alive (any ``getbuffer()`` caller),
+which forces ``getvalue()`` to copy the whole recording. Each run gets a
+fresh process so ``ru_maxrss`` is not polluted by the previous one.
+
+    python benchmarks/bench_upload_spool.py --mb 300
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uploads import spool_upload  # noqa: E402
+
+
+def _legacy(upload, directory):
+    # What tab 1 used to do
+    with tempfile.NamedTemporaryFile(delete=False, dir=directory, suffix=".mp4") as tmp:
+        tmp.write(upload.getvalue())
+        return tmp.name
+
+
+def _spooled(upload, directory):
+    return spool_upload(upload, directory)
+
+
+def _measure(variant, buffer_state, size_mb, directory, queue):
+    record_data = os.urandom(1024 * 1024) * size_mb  # held by Streamlit's upload manager
+    upload = io.BytesIO(record_data)
+    upload.name = "recording.mp4"
+    export = upload.getbuffer() if buffer_state == "exported" else None  # noqa: F841
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    started = time.perf_counter()
+    path = {"getvalue": _legacy, "spool_upload": _spooled}[variant](upload, directory)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    ok = os.path.getsize(path) == len(record_data)
+    os.remove(path)
+    # ru_maxrss is KiB on Linux
+    queue.put((peak / 2**20, (rss_after - rss_before) / 1024, elapsed, ok))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=int, default=200, help="simulated upload size in MiB")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"upload size: {args.mb} MiB")
+        print(f"{'buffer':<10}{'variant':<14}{'traced peak MiB':>17}{'RSS growth MiB':>16}{'seconds':>9}  ok")
+        for buffer_state in ("shared", "exported"):
+            for variant in ("getvalue", "spool_upload"):
+                proc = ctx.Process(target=_measure, args=(variant, buffer_state, args.mb, directory, queue))
+                proc.start()
+                peak, rss, elapsed, ok = queue.get()
+                proc.join()
+                print(f"{buffer_state:<10}{variant:<14}{peak:>17.1f}{rss:>16.1f}{elapsed:>9.2f}  {ok}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Append-only persistence of chat turns for saved meetings.
+
+A meeting record was written once, with an empty ``chat_history``, so a
+conversation about a saved meeting was lost unless someone exported it
+with "Save Chat to Drive". Rewriting the record per turn would re-upload
+the sections (and, in format 1, the transcript) every time.
+
+Turns now go to small delta files next to the record,
+``Data_<stem>.chat.<seq>.json`` = ``{"seq", "turns": [...]}``, one per
+flush. ``ChatLogWriter`` flushes on a background thread and batches
+whatever piled up while a write was in flight, so a turn costs one small
+upload and the chat never waits on Drive. Loading lists the deltas (one
+request), downloads them in parallel and concatenates them in ``seq``
+order after the record's own ``chat_history``.
+
+Once a meeting has more than ``COMPACT_AFTER`` deltas, loading folds them
+into one delta that lists the names it ``replaces`` and deletes those; a
+crash between the two steps is harmless because replaced deltas are
+skipped whether or not they were deleted.
+"""
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from meeting_storage import CHAT_INFIX, chat_delta_name, chat_delta_seq, record_stem
+
+COMPACT_AFTER = 20
+
+
+class ChatLog:
+    """The chat deltas of one saved meeting. ``folder`` is a ``meeting_folder.DriveFolder``."""
+
+    def __init__(self, folder, record_name, max_workers=4):
+        self.folder = folder
+        self.record_name = record_name
+        self.max_workers = max_workers
+        self.next_seq = None
+        self._lock = threading.Lock()
+
+    def _deltas(self):
+        files = self.folder.list_prefixed(record_stem(self.record_name) + CHAT_INFIX)
+        deltas = [(chat_delta_seq(f["name"]), f) for f in files]
+        return sorted(((seq, f) for seq, f in deltas if seq is not None), key=lambda d: (d[0], d[1].get("createdTime", "")))
+
+    def load(self, compact=True):
+        """Every persisted turn, oldest first (compacting the deltas if there are many, unless ``compact=False``).
+
+        Readers other than the meeting's ``ChatLogWriter`` (the History mirror)
+        pass ``compact=False``: compaction writes a delta, and two writers
+        would pick the same ``seq``.
+        """
+        with self._lock:
+            deltas = self._deltas()
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                bodies = list(pool.map(lambda d: self.folder.read_json(d[1]["id"]), deltas))
+            replaced = {name for body in bodies for name in body.get("replaces", [])}
+            live = [(seq, f, body) for (seq, f), body in zip(deltas, bodies) if f["name"] not in replaced]
+            turns = [turn for _, _, body in live for turn in body.get("turns", [])]
+            self.next_seq = max((seq for seq, _ in deltas), default=0) + 1
+            if compact and len(live) > COMPACT_AFTER:
+                self._compact(turns, live)
+            return turns
+
+    def _compact(self, turns, live):
+        names = [f["name"] for _, f, _ in live]
+        self._write({"turns": turns, "replaces": names})
+        for _, f, _ in live:
+            try:
+                self.folder.delete(f["id"])
+            except Exception:
+                pass  # skipped on load anyway: the compacted delta lists it
+
+    def append(self, turns):
+        """Persists ``turns`` as one new delta."""
+        if not turns:
+            return
+        with self._lock:
+            if self.next_seq is None:
+                self.next_seq = max((seq for seq, _ in self._deltas()), default=0) + 1
+            self._write({"turns": list(turns)})
+
+    def _write(self, body):
+        seq = self.next_seq
+        payload = json.dumps({"seq": seq, **body}, separators=(",", ":")).encode("utf-8")
+        self.folder.create(chat_delta_name(self.record_name, seq), payload)
+        self.next_seq = seq + 1
+
+
+class ChatLogWriter:
+    """Process-wide: one ``ChatLog`` per meeting and a background flusher that batches pending turns."""
+
+    def __init__(self, max_workers=2):
+        self._logs = {}
+        self._pending = {}
+        self._flushing = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chatlog")
+        self.stats = {"writes": 0, "turns": 0, "failures": 0}
+
+    def log(self, folder, record_name):
+        with self._lock:
+            log = self._logs.get((folder.folder_id, record_name))
+            if log is None:
+                log = self._logs[(folder.folder_id, record_name)] = ChatLog(folder, record_name)
+            log.folder = folder  # the newest caller's credentials
+            return log
+
+    def load(self, folder, record_name):
+        return self.log(folder, record_name).load()
+
+    def append(self, folder, record_name, turns):
+        """Queues ``turns``; returns at once. Turns queued while a write is running go out together in the next one."""
+        log = self.log(folder, record_name)
+        key = (folder.folder_id, record_name)
+        with self._lock:
+            self._pending.setdefault(key, []).extend(turns)
+            if key in self._flushing:
+                return
+            self._flushing.add(key)
+        self._pool.submit(self._flush, key, log)
+
+    def _flush(self, key, log):
+        while True:
+            with self._lock:
+                turns = self._pending.pop(key, [])
+                if not turns:
+                    self._flushing.discard(key)
+                    return
+            try:
+                log.append(turns)
+                self._count(writes=1, turns=len(turns))
+            except Exception:
+                self._count(failures=1)
+                with self._lock:
+                    # Keep them (in order) for the next append to retry
+                    self._pending[key] = turns + self._pending.get(key, [])
+                    self._flushing.discard(key)
+                return
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, value in deltas.items():
+                self.stats[name] += value
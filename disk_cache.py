@@ -0,0 +1,123 @@
+"""One JSON file per entry in a directory, with LRU bounds and hit counters.
+
+Shared by ``TranscriptCache`` and ``GeminiCache``. File mtimes double as
+the LRU clock (a hit touches the file), so the order survives restarts
+without a separate index. Entries and the counters file are written to a
+temp file first and moved into place with ``os.replace``, so a reader
+never sees half a file.
+
+Lookups only bump the in-memory counters. They reach ``_stats.json`` on
+each put and otherwise at most every ``STATS_FLUSH_SECONDS``, keeping a
+disk write off the hit path.
+"""
+import json
+import os
+import threading
+import time
+
+
+class DiskCache:
+    """Base class: subclasses add ``get``/``put`` on top of ``_load``, ``_store``, ``_discard`` and ``_count``.
+
+    Least-recently-used entries are evicted past ``max_entries`` files or ``max_bytes`` (either may be None).
+    """
+
+    STATS_FILE = "_stats.json"
+    STATS_FLUSH_SECONDS = 30
+    COUNTERS = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __init__(self, directory, max_entries=None, max_bytes=None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._stats = dict(self.COUNTERS)
+        try:
+            with open(self._path(self.STATS_FILE), encoding="utf-8") as fh:
+                self._stats.update(json.load(fh))
+        except (OSError, ValueError):
+            pass
+        self._stats_saved = time.time()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write_json(self, path, value):
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(value, fh, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    # --- Called with the lock held ---
+    def _load(self, key):
+        """The stored entry (touched as recently used), or None if it is missing or unreadable."""
+        path = self._path(f"{key}.json")
+        try:
+            with open(path, encoding="utf-8") as fh:
+                value = json.load(fh)
+            os.utime(path, None)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, key, value):
+        self._write_json(self._path(f"{key}.json"), value)
+        self._evict()
+        self._save_stats()
+
+    def _discard(self, key):
+        try:
+            os.remove(self._path(f"{key}.json"))
+        except OSError:
+            pass
+
+    def _count(self, counter, amount=1):
+        self._stats[counter] = round(self._stats[counter] + amount, 3)
+
+    def _lookup_done(self):
+        if time.time() - self._stats_saved >= self.STATS_FLUSH_SECONDS:
+            self._save_stats()
+
+    def _save_stats(self):
+        try:
+            self._write_json(self._path(self.STATS_FILE), {**self._stats, "updated": time.time()})
+            self._stats_saved = time.time()
+        except OSError:
+            pass
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json") or name == self.STATS_FILE:
+                continue
+            try:
+                info = os.stat(self._path(name))
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, name))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        count, total = len(entries), sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if (self.max_entries is None or count <= self.max_entries) and (self.max_bytes is None or total <= self.max_bytes):
+                break
+            try:
+                os.remove(self._path(name))
+                count, total = count - 1, total - size
+                self._stats["evictions"] += 1
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            entries = self._entries()
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+            }
@@ -0,0 +1,157 @@
+"""Drive service objects and folder IDs, reused across reruns and sessions.
+
+Each Drive helper used to ``build("drive", "v3", ...)`` (parsing the
+discovery document) and then look its folder up with a ``files().list``
+query before doing any real work. Generating notes and saving the analysis
+cost four Drive requests where two uploads would do.
+
+``DriveServiceCache`` keeps one built service per credential token *and
+thread*, because googleapiclient/httplib2 services must not be shared
+between threads. A refreshed access token gets a freshly built service.
+``FolderCache`` remembers folder IDs per account. A cached ID is used
+without a lookup. It is checked again (one ``files().get``) when it is
+older than ``ttl``, and on its first use in each session, because Drive
+happily uploads into a trashed folder and the user would never see those
+files. When an upload into it fails with 404, a non-quota 403 or a 400
+about its parent (the folder was deleted or is no longer reachable), the
+folder is resolved again and the upload retried once. Finding (or
+creating) a folder is serialised per account and name, so sessions and
+jobs that miss the cache together don't each create their own copy.
+"""
+import collections
+import hashlib
+import threading
+import time
+import weakref
+
+from rate_limits import is_rate_limit
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+
+
+def account_key(creds):
+    """Stable per-account key: the refresh token survives access-token refreshes."""
+    ident = getattr(creds, "refresh_token", None) or getattr(creds, "token", None) or repr(id(creds))
+    return hashlib.sha256(ident.encode("utf-8")).hexdigest()[:16]
+
+
+def _is_bad_parent(error):
+    """True if a create failed because of its parent folder: gone (404), not ours any more (403) or rejected (400)."""
+    try:
+        status = int(getattr(getattr(error, "resp", None), "status", None))
+    except (TypeError, ValueError):
+        return False
+    if status == 404:
+        return True
+    if status == 403:
+        return not is_rate_limit(error)
+    return status == 400 and "parent" in str(error).lower()
+
+
+class DriveServiceCache:
+    """LRU of ``build_service(creds)`` results keyed on (account, access token, thread)."""
+
+    def __init__(self, build_service, max_entries=32):
+        self._build = build_service
+        self.max_entries = max_entries
+        self._services = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"built": 0, "reused": 0}
+
+    def get(self, creds):
+        key = (account_key(creds), getattr(creds, "token", None), threading.get_ident())
+        with self._lock:
+            service = self._services.get(key)
+            if service is not None:
+                self._services.move_to_end(key)
+                self.stats["reused"] += 1
+                return service
+        service = self._build(creds)
+        with self._lock:
+            self._services[key] = service
+            self.stats["built"] += 1
+            while len(self._services) > self.max_entries:
+                self._services.popitem(last=False)
+        return service
+
+
+class FolderCache:
+    """Folder name -> ID per account. ``execute(request)`` runs a Drive request (rate-limited by the caller)."""
+
+    def __init__(self, execute, ttl=6 * 3600):
+        self.execute = execute
+        self.ttl = ttl
+        self._ids = {}
+        self._checked = weakref.WeakKeyDictionary()  # session -> folder names validated in it
+        self._lock = threading.Lock()
+        self._resolving = {}  # (account, name) -> lock held while finding or creating it
+        self.stats = {"hits": 0, "validated": 0, "resolved": 0}
+
+    def folder_id(self, service, account, name, session=None):
+        """The folder's ID: cached, re-validated past ``ttl`` or on ``session``'s first use, otherwise found (or created) by name.
+
+        ``session`` is any weak-referenceable object that lives as long as a
+        user session (the apps pass its Drive credentials).
+        """
+        with self._lock:
+            entry = self._ids.get((account, name))
+            unchecked = session is not None and name not in self._checked.get(session, ())
+        if entry and time.time() - entry[1] < self.ttl and not unchecked:
+            self.stats["hits"] += 1
+            return entry[0]
+        if entry:
+            try:
+                meta = self.execute(service.files().get(fileId=entry[0], fields="id, trashed"))
+                if not meta.get("trashed"):
+                    self.stats["validated"] += 1
+                    self._mark_checked(session, name)
+                    return self._remember(account, name, entry[0])
+            except Exception:
+                pass
+        with self._lock:
+            resolving = self._resolving.setdefault((account, name), threading.Lock())
+        with resolving:
+            with self._lock:
+                current = self._ids.get((account, name))
+            if current and current is not entry:
+                # Another caller found, created or re-validated it while we waited
+                folder_id = current[0]
+            else:
+                folder_id = self._remember(account, name, self._find_or_create(service, name))
+        self._mark_checked(session, name)
+        return folder_id
+
+    def invalidate(self, account, name):
+        with self._lock:
+            self._ids.pop((account, name), None)
+
+    def within(self, service, account, name, fn, session=None):
+        """``fn(folder_id)``, re-resolving the folder and retrying once if the create failed because of it."""
+        try:
+            return fn(self.folder_id(service, account, name, session))
+        except Exception as e:
+            if not _is_bad_parent(e):
+                raise
+            self.invalidate(account, name)
+            return fn(self.folder_id(service, account, name, session))
+
+    def _mark_checked(self, session, name):
+        if session is None:
+            return
+        with self._lock:
+            self._checked.setdefault(session, set()).add(name)
+
+    def _remember(self, account, name, folder_id):
+        if folder_id:
+            with self._lock:
+                self._ids[(account, name)] = (folder_id, time.time())
+        return folder_id
+
+    def _find_or_create(self, service, name):
+        self.stats["resolved"] += 1
+        query = f"mimeType='{FOLDER_MIME}' and name='{name}' and trashed=false"
+        items = self.execute(service.files().list(q=query, fields="files(id)")).get("files", [])
+        if items:
+            return items[0]["id"]
+        folder = self.execute(service.files().create(body={"name": name, "mimeType": FOLDER_MIME}, fields="id"))
+        return folder.get("id")
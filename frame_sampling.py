@@ -0,0 +1,120 @@
+"""Frame sampling for meeting-metadata detection (title, date, venue).
+
+Reading a single frame at 00:00:01 with ``-ss`` after ``-i`` made ffmpeg
+decode everything up to that point, and the one frame was often a black or
+"connecting..." screen. Frames are now grabbed with input-side seeking
+(``-ss`` before ``-i`` jumps to the nearest keyframe), several candidate
+times are sampled concurrently, and near-empty frames are dropped: a
+black or flat loading screen compresses to a fraction of the JPEG size of
+a slide or title card, so JPEG size is a cheap stand-in for "has text".
+
+Optionally, ffmpeg's scene-change score over the opening minutes adds the
+moments the picture actually changed (slides appearing, screen share
+starting) as extra candidates.
+
+Like audio_pipeline, nothing here calls Streamlit; output paths come from
+the caller (``ArtifactTracker.temp_path``) so concurrent jobs never share
+a file.
+"""
+import json
+import os
+import re
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Seconds into the recording to sample: title cards tend to appear early, shared screens a little later
+SAMPLE_OFFSETS = (1.0, 5.0, 15.0, 45.0, 90.0)
+FRAME_MAX_WIDTH = 1280
+# Frames under this fraction of the largest candidate's JPEG size are treated as blank
+MIN_RELATIVE_BYTES = 0.35
+
+_PTS_TIME = re.compile(r"pts_time:\s*([\d.]+)")
+
+
+def probe_video(file_path):
+    """{"duration", "has_video"} from ffprobe, or None if ffprobe fails."""
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "stream=codec_type:format=duration", "-of", "json", file_path]
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True)
+        if res.returncode != 0:
+            return None
+        info = json.loads(res.stdout or "{}")
+    except (OSError, ValueError):
+        return None
+    streams = info.get("streams", [])
+    try:
+        duration = float(info.get("format", {}).get("duration") or 0)
+    except ValueError:
+        duration = 0.0
+    return {"duration": duration, "has_video": any(s.get("codec_type") == "video" for s in streams)}
+
+
+def scene_change_times(file_path, window=120.0, threshold=0.3, limit=6):
+    """Timestamps in the first ``window`` seconds where the picture changes by more than ``threshold``.
+
+    Decodes the window at thumbnail size, so it costs a few seconds; only
+    used when the caller asks for it.
+    """
+    cmd = ["ffmpeg", "-hide_banner", "-nostats", "-t", str(window), "-i", file_path, "-an", "-sn",
+           "-vf", f"scale=320:-2,select='gt(scene,{threshold})',showinfo", "-f", "null", "-"]
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True)
+    except OSError:
+        return []
+    times = [float(t) for t in _PTS_TIME.findall(res.stderr)]
+    # A frame just after the cut has settled (transitions/fades are mid-change at the cut itself)
+    return [round(t + 0.5, 2) for t in times[:limit]]
+
+
+def extract_frame(file_path, at, out_path, max_width=FRAME_MAX_WIDTH):
+    """One JPEG at ``at`` seconds using input-side (keyframe) seeking. Returns its size in bytes (0 on failure)."""
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-ss", f"{at:.2f}", "-i", file_path,
+           "-frames:v", "1", "-an", "-vf", f"scale='min({max_width},iw)':-2", "-q:v", "3", "-y", out_path]
+    try:
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return os.path.getsize(out_path)
+    except OSError:
+        return 0
+
+
+def candidate_times(duration, offsets=SAMPLE_OFFSETS, extra=()):
+    """Sorted, de-duplicated sample times that fall inside the recording."""
+    limit = max(duration - 0.5, 0.0) if duration else None
+    times = {round(t, 1) for t in (*offsets, *extra) if limit is None or t <= limit}
+    if not times and duration:
+        times = {round(duration / 2, 1)}
+    return sorted(times)
+
+
+def sample_frames(file_path, temp_path, duration=0.0, count=3, scene_window=0.0, max_workers=4):
+    """Picks up to ``count`` informative frames from the start of a video.
+
+    ``temp_path(suffix)`` supplies a fresh output path per frame. Returns
+    (frames, stats): frames are ``[{"time", "path", "bytes"}]`` in time
+    order; stats has candidate counts and timings.
+    """
+    started = time.perf_counter()
+    stats = {"candidates": 0, "kept": 0, "scene_seconds": 0.0}
+    extra = ()
+    if scene_window:
+        scene_started = time.perf_counter()
+        extra = scene_change_times(file_path, min(scene_window, duration or scene_window))
+        stats["scene_seconds"] = round(time.perf_counter() - scene_started, 3)
+        stats["scene_changes"] = len(extra)
+
+    times = candidate_times(duration, extra=extra)
+    paths = [temp_path(".jpg") for _ in times]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        sizes = list(pool.map(extract_frame, [file_path] * len(times), times, paths))
+    candidates = [{"time": t, "path": p, "bytes": b} for t, p, b in zip(times, paths, sizes) if b]
+    stats["candidates"] = len(candidates)
+
+    if candidates:
+        floor = max(c["bytes"] for c in candidates) * MIN_RELATIVE_BYTES
+        informative = [c for c in candidates if c["bytes"] >= floor]
+        candidates = sorted(sorted(informative, key=lambda c: c["bytes"], reverse=True)[:count],
+                            key=lambda c: c["time"])
+    stats["kept"] = len(candidates)
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return candidates, stats
@@ -0,0 +1,125 @@
+"""Response cache in front of Gemini ``generate_content`` calls.
+
+Re-analysing a transcript with the same participants, repeating a chat
+question after a rerun, or re-reading the same thumbnail all send
+byte-identical requests. ``CachedModel`` wraps a ``GenerativeModel`` and
+answers those from disk. Entries are keyed on the model name, the prompt
+with indentation and blank-line runs normalised away, and a hash of any
+image bytes.
+
+Entries expire after ``ttl`` seconds and the least-recently-used ones are
+evicted past ``max_entries``; storage, LRU order and hit counters come
+from ``disk_cache.DiskCache``, as for ``TranscriptCache``.
+"""
+import hashlib
+import re
+import time
+
+from disk_cache import DiskCache
+
+_BLANK_RUNS = re.compile(r"\n{3,}")
+
+
+def normalize_prompt(text):
+    """Strips per-line indentation/trailing space (f-string prompts are indented) and collapses blank runs."""
+    lines = [line.strip() for line in text.strip().splitlines()]
+    return _BLANK_RUNS.sub("\n\n", "\n".join(lines))
+
+
+def cache_key(model_name, contents):
+    """sha256 over the model name and each part: normalised text, or the hash of inline image bytes."""
+    if isinstance(contents, (str, dict)):
+        contents = [contents]
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    for part in contents:
+        if isinstance(part, str):
+            digest.update(b"\x00text\x00" + normalize_prompt(part).encode("utf-8"))
+        elif isinstance(part, dict) and "data" in part:
+            digest.update(b"\x00blob\x00" + part.get("mime_type", "").encode("utf-8"))
+            digest.update(hashlib.sha256(part["data"]).digest())
+        else:
+            digest.update(b"\x00repr\x00" + repr(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class GeminiCache(DiskCache):
+    """One small JSON file per response: ``{"text", "model", "created", "seconds"}``."""
+
+    COUNTERS = {**DiskCache.COUNTERS, "expired": 0, "seconds_saved": 0.0}
+
+    def __init__(self, directory, ttl=7 * 24 * 3600, max_entries=2000):
+        super().__init__(directory, max_entries=max_entries)
+        self.ttl = ttl
+
+    def get(self, key):
+        """Cached text, or None on a miss / expired entry."""
+        with self._lock:
+            entry = self._load(key)
+            if entry is not None and self.ttl and time.time() - entry.get("created", 0) > self.ttl:
+                self._discard(key)
+                self._count("expired")
+                entry = None
+            if entry is None:
+                self._count("misses")
+            else:
+                self._count("hits")
+                self._count("seconds_saved", entry.get("seconds", 0.0))
+            self._lookup_done()
+        return entry["text"] if entry else None
+
+    def put(self, key, text, model_name, seconds):
+        with self._lock:
+            self._store(key, {"text": text, "model": model_name, "created": time.time(), "seconds": round(seconds, 3)})
+
+
+class CachedResponse:
+    """Stands in for a ``GenerateContentResponse`` (and a one-chunk stream of it) on a cache hit."""
+
+    usage_metadata = None
+    from_cache = True
+
+    def __init__(self, text):
+        self.text = text
+        self.parts = [text] if text else []
+
+    def __iter__(self):
+        yield self
+
+
+class CachedModel:
+    """Drop-in for ``GenerativeModel.generate_content`` that consults a ``GeminiCache`` first."""
+
+    def __init__(self, model, cache, model_name=None):
+        self.model = model
+        self.cache = cache
+        self.model_name = model_name or getattr(model, "model_name", "gemini")
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        if kwargs or self.cache is None:
+            # generation_config/safety overrides change the answer; don't guess at keying them
+            return self.model.generate_content(contents, stream=stream, **kwargs)
+        key = cache_key(self.model_name, contents)
+        text = self.cache.get(key)
+        if text is not None:
+            return CachedResponse(text)
+        started = time.perf_counter()
+        if stream:
+            return self._stream_and_store(key, self.model.generate_content(contents, stream=True), started)
+        response = self.model.generate_content(contents)
+        try:
+            self.cache.put(key, response.text, self.model_name, time.perf_counter() - started)
+        except (ValueError, OSError):
+            pass  # blocked/empty responses have no .text; never cache those
+        return response
+
+    def _stream_and_store(self, key, chunks, started):
+        parts = []
+        for chunk in chunks:
+            if chunk.parts:
+                parts.append(chunk.text)
+            yield chunk
+        if parts:
+            try:
+                self.cache.put(key, "".join(parts), self.model_name, time.perf_counter() - started)
+            except OSError:
+                pass
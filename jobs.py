@@ -0,0 +1,165 @@
+"""Background job queue for the Analyze pipeline.
+
+Analysis used to run inside the Streamlit rerun, so a dropped websocket or a
+click elsewhere threw the work away and one slow meeting tied up the
+session. Jobs now run on a process-wide worker pool and their state lives in
+a small SQLite table, so any session (or the same user after a refresh) can
+see queued, running, finished and failed work and pick up the results.
+While a job runs, ``partial`` holds whatever sections of the summary have
+streamed in so far, for the Review tab to show before the job finishes.
+"""
+import json
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT,
+    kind TEXT,
+    title TEXT,
+    status TEXT,
+    stage TEXT,
+    progress INTEGER,
+    message TEXT,
+    params TEXT,
+    result TEXT,
+    error TEXT,
+    created REAL,
+    updated REAL,
+    partial TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_owner_created ON jobs (owner, created);
+"""
+
+
+class JobStore:
+    """Persisted job table. Every call opens its own connection, so it is safe from any thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            if "partial" not in {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                conn.execute("ALTER TABLE jobs ADD COLUMN partial TEXT")  # job tables from before streaming
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def create(self, owner, kind, title, params=None):
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, owner, kind, title, status, stage, progress, message, params, result, error, "
+                "created, updated) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                (job_id, owner, kind, title, QUEUED, "Queued", 0, "", json.dumps(params or {}),
+                 None, None, now, now),
+            )
+        return job_id
+
+    def update(self, job_id, **fields):
+        for key in ("result", "partial"):
+            if key in fields:
+                fields[key] = json.dumps(fields[key], default=str)
+        fields["updated"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+    def _row(self, row, with_result):
+        job = dict(row)
+        job["params"] = json.loads(job["params"] or "{}")
+        job["result"] = json.loads(job["result"]) if with_result and job["result"] else None
+        job["partial"] = json.loads(job["partial"]) if job["partial"] else None
+        return job
+
+    def get(self, job_id, with_result=True):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row, with_result) if row else None
+
+    def list(self, owner=None, limit=50):
+        """Newest first, without the (potentially large) result payloads."""
+        query, args = "SELECT * FROM jobs", ()
+        if owner is not None:
+            query, args = query + " WHERE owner = ?", (owner,)
+        with self._connect() as conn:
+            rows = conn.execute(f"{query} ORDER BY created DESC LIMIT ?", (*args, limit)).fetchall()
+        return [self._row(r, with_result=False) for r in rows]
+
+    def delete(self, job_id):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def fail_interrupted(self):
+        """Jobs that were queued/running when the process died cannot be resumed in-process."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE status IN (?, ?)",
+                (FAILED, "Interrupted by a server restart. Please run it again.", time.time(), QUEUED, RUNNING),
+            )
+
+
+class JobContext:
+    """Handed to the job function so it can report stage progress."""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.id = job_id
+
+    def update(self, stage=None, progress=None, message=None, partial=None):
+        fields = {}
+        if stage is not None:
+            fields["stage"] = stage
+        if progress is not None:
+            fields["progress"] = int(max(0, min(progress, 100)))
+        if message is not None:
+            fields["message"] = message
+        if partial is not None:
+            fields["partial"] = partial
+        if fields:
+            self.store.update(self.id, **fields)
+
+
+class JobQueue:
+    """Worker pool that runs ``fn(job, **params)`` and records the outcome in ``store``."""
+
+    def __init__(self, store, max_workers=2):
+        self.store = store
+        self.store.fail_interrupted()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analyze-job")
+
+    def submit(self, owner, kind, title, fn, params):
+        """Queues ``fn(job, **params)``. JSON-serialisable params are also stored for display."""
+        job_id = self.store.create(owner, kind, title, {k: v for k, v in params.items() if _jsonable(v)})
+        self._pool.submit(self._run, job_id, fn, params)
+        return job_id
+
+    def _run(self, job_id, fn, params):
+        job = JobContext(self.store, job_id)
+        self.store.update(job_id, status=RUNNING, stage="Starting", progress=0)
+        try:
+            result = fn(job, **params)
+            self.store.update(job_id, status=DONE, stage="Done", progress=100, result=result)
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, error=str(e) or e.__class__.__name__,
+                              message=traceback.format_exc(limit=3))
+
+
+def _jsonable(value):
+    try:
+        json.dumps(value)
+        return True
+    except (TypeError, ValueError):
+        return False
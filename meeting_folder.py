@@ -0,0 +1,133 @@
+"""The Meeting_Data folder in Drive, and the History entry of a saved meeting.
+
+``DriveFolder`` wraps the few Drive calls made against Meeting_Data: the
+local mirror (meeting_mirror) lists records and chat deltas changed since
+its cursor and downloads them, chat_log reads and writes the deltas, and
+meeting_manifest keeps ``_manifest.json`` up to date.
+Listings follow every page; Drive returns at most 1000 files per request.
+
+``history_entry`` is the short view of one saved analysis (title, dates,
+participants, size, the start of each section) that History renders and
+filters without opening the meeting; the manifest holds one per meeting.
+"""
+import datetime
+import io
+
+from meeting_search import meeting_date_of
+from meeting_storage import CHAT_INFIX, GZIP_MIME, chat_delta_seq, decode, is_meeting_file
+
+PREVIEW_CHARS = 240
+PREVIEW_SECTIONS = ("overview", "discussion", "next_steps", "client_reqs")
+
+
+def _now_rfc3339():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def history_entry(file_id, name, data, size=None, created=None):
+    """History's view of one saved analysis."""
+    results = data.get("ai_results") or {}
+    previews = {}
+    for key in PREVIEW_SECTIONS:
+        text = results.get(key)
+        if isinstance(text, str) and text.strip():
+            text = " ".join(text.split())
+            previews[key] = text[:PREVIEW_CHARS] + ("…" if len(text) > PREVIEW_CHARS else "")
+    return {
+        "id": file_id,
+        "name": name,
+        "title": data.get("detected_title") or name,
+        "meeting_date": meeting_date_of(data),
+        "created": created or _now_rfc3339(),
+        "participants": data.get("participants", ""),
+        "size": size,
+        "chat_turns": len(data.get("chat_history") or []),
+        "previews": previews,
+    }
+
+
+class DriveFolder:
+    """Drive calls against one folder.
+
+    ``get_service()`` returns a Drive service usable on the calling thread
+    (sync downloads run on several threads); ``execute(request)`` runs a
+    request.
+    """
+
+    def __init__(self, get_service, folder_id, execute):
+        self.get_service = get_service
+        self.folder_id = folder_id
+        self.execute = execute
+
+    @property
+    def service(self):
+        return self.get_service()
+
+    def find(self, name):
+        """{"id", "version"} of the named file in this folder, or None."""
+        query = f"'{self.folder_id}' in parents and name = '{name}' and trashed = false"
+        files = self.execute(self.service.files().list(q=query, fields="files(id, version)")).get("files", [])
+        return files[0] if files else None
+
+    def version(self, file_id):
+        return self.execute(self.service.files().get(fileId=file_id, fields="version")).get("version")
+
+    def read_json(self, file_id):
+        return decode(self.execute(self.service.files().get_media(fileId=file_id)))
+
+    def create(self, name, payload):
+        from googleapiclient.http import MediaIoBaseUpload
+        media = MediaIoBaseUpload(io.BytesIO(payload), mimetype="application/json")
+        body = {"name": name, "parents": [self.folder_id]}
+        return self.execute(self.service.files().create(body=body, media_body=media, fields="id, version"))
+
+    def update(self, file_id, payload):
+        from googleapiclient.http import MediaIoBaseUpload
+        media = MediaIoBaseUpload(io.BytesIO(payload), mimetype="application/json")
+        return self.execute(self.service.files().update(fileId=file_id, media_body=media, fields="id, version"))
+
+    def list_prefixed(self, prefix):
+        """[{"id", "name", "createdTime"}] of files whose name starts with ``prefix`` (all pages)."""
+        escaped = prefix.replace("\\", "\\\\").replace("'", "\\'")
+        query = f"'{self.folder_id}' in parents and name contains '{escaped}' and trashed = false"
+        files, page_token = [], None
+        while True:
+            page = self.execute(self.service.files().list(
+                q=query, fields="nextPageToken, files(id, name, createdTime)", pageSize=1000, pageToken=page_token))
+            files.extend(f for f in page.get("files", []) if f["name"].startswith(prefix))
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return files
+
+    def delete(self, file_id):
+        self.execute(self.service.files().delete(fileId=file_id))
+
+    def list_json(self, modified_after=None):
+        """Every saved meeting in the folder (all pages, either storage format), newest first."""
+        query = (f"'{self.folder_id}' in parents and trashed = false"
+                 f" and (mimeType = 'application/json' or mimeType = '{GZIP_MIME}')")
+        if modified_after:
+            query += f" and modifiedTime > '{modified_after}'"
+        files, page_token = [], None
+        while True:
+            page = self.execute(self.service.files().list(
+                q=query, fields="nextPageToken, files(id, name, createdTime, modifiedTime, size)",
+                orderBy="createdTime desc", pageSize=1000, pageToken=page_token))
+            files.extend(f for f in page.get("files", []) if is_meeting_file(f["name"]))
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return files
+
+    def list_chat_deltas(self, modified_after=None):
+        """Every chat delta file (see chat_log) in the folder, optionally only those modified after an RFC 3339 time."""
+        query = f"'{self.folder_id}' in parents and trashed = false and name contains '{CHAT_INFIX}'"
+        if modified_after:
+            query += f" and modifiedTime > '{modified_after}'"
+        files, page_token = [], None
+        while True:
+            page = self.execute(self.service.files().list(
+                q=query, fields="nextPageToken, files(id, name, modifiedTime)", pageSize=1000, pageToken=page_token))
+            files.extend(f for f in page.get("files", []) if chat_delta_seq(f["name"]) is not None)
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return files
@@ -0,0 +1,168 @@
+"""A small manifest of the meetings saved in Drive's Meeting_Data folder.
+
+``_manifest.json`` lives next to the meetings with one History entry each
+(see ``meeting_folder.history_entry``: title, dates, participants, size,
+the start of each section). A device whose local mirror (meeting_mirror)
+is empty, a first visit or a fresh server disk, seeds History from this
+one small download instead of fetching a part per meeting; the mirror
+copies the records themselves in the background.
+
+Drive has no compare-and-swap, so writers are careful instead: writes in
+this process are serialised per folder, each write re-reads the manifest
+if its ``version`` moved since it was read, and the version is checked
+again just before uploading. Whatever still slips through (two processes
+writing in the same instant, meetings saved by older builds) is healed by
+``reconcile``: it lists records modified since the manifest's ``synced``
+mark (all of them, if the manifest was lost or is unreadable) and adds
+any it is missing, so the manifest rebuilds itself.
+"""
+import datetime
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from meeting_folder import history_entry
+
+MANIFEST_NAME = "_manifest.json"
+MANIFEST_VERSION = 1
+# Clock skew allowance when asking Drive for "modified since"
+RECONCILE_SLACK = datetime.timedelta(minutes=10)
+# Re-check Drive for a newer manifest at most this often per folder
+REFRESH_SECONDS = 20
+
+
+def _now_rfc3339():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _empty_manifest():
+    return {"v": MANIFEST_VERSION, "entries": {}, "synced": None, "updated": None}
+
+
+class _FolderState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.file_id = None
+        self.version = None
+        self.manifest = None
+        self.checked = 0.0
+
+
+class ManifestStore:
+    """Process-wide: one cached manifest (and one writer lock) per Meeting_Data folder (a ``meeting_folder.DriveFolder``)."""
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _state(self, folder):
+        with self._lock:
+            return self._states.setdefault(folder.folder_id, _FolderState())
+
+    # --- Reads ---
+    def entries(self, folder, reconcile=True):
+        """Manifest entries, newest first. Rebuilt from the folder if the manifest is missing or unreadable."""
+        state = self._state(folder)
+        with state.lock:
+            if state.manifest is None or time.time() - state.checked > REFRESH_SECONDS:
+                self._refresh(folder, state)
+                if reconcile:
+                    self._reconcile(folder, state)
+            entries = list(state.manifest["entries"].values())
+        return sorted(entries, key=lambda e: e.get("created") or "", reverse=True)
+
+    def _refresh(self, folder, state):
+        """Loads the manifest if Drive has a newer version than the one held (one small request otherwise)."""
+        state.checked = time.time()
+        if state.file_id is None:
+            found = folder.find(MANIFEST_NAME)
+            if found:
+                state.file_id = found["id"]
+        if state.file_id is None:
+            state.manifest, state.version = _empty_manifest(), None
+            return
+        try:
+            version = folder.version(state.file_id)
+            if state.manifest is not None and version == state.version:
+                return
+            manifest = folder.read_json(state.file_id)
+            if manifest.get("v") != MANIFEST_VERSION or not isinstance(manifest.get("entries"), dict):
+                raise ValueError("unrecognised manifest")
+            state.manifest, state.version = manifest, version
+        except Exception:
+            # Deleted or corrupt: start over; reconcile refills it from the folder
+            state.file_id, state.manifest, state.version = None, _empty_manifest(), None
+
+    def _reconcile(self, folder, state, prune=False):
+        """Adds meetings the manifest is missing (modified since its last sync, or all of them if it is new)."""
+        synced = state.manifest.get("synced")
+        since = None
+        if synced and not prune:
+            since = (datetime.datetime.strptime(synced[:19], "%Y-%m-%dT%H:%M:%S") - RECONCILE_SLACK).strftime("%Y-%m-%dT%H:%M:%S")
+        started = _now_rfc3339()
+        files = folder.list_json(since)
+        entries = state.manifest["entries"]
+        missing = [f for f in files if f["id"] not in entries]
+        changed = bool(missing)
+        if prune:
+            present = {f["id"] for f in files}
+            for file_id in [i for i in entries if i not in present]:
+                del entries[file_id]
+                changed = True
+
+        def describe(f):
+            # A format 2 record's meta part has everything the entry shows
+            try:
+                return history_entry(f["id"], f["name"], folder.read_json(f["id"]), int(f.get("size") or 0) or None, f.get("createdTime"))
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for entry in pool.map(describe, missing):
+                if entry:
+                    entries[entry["id"]] = entry
+        state.manifest["synced"] = started
+        if changed or not state.file_id:
+            self._write(folder, state)
+
+    # --- Writes ---
+    def add(self, folder, entry):
+        self._mutate(folder, lambda entries: entries.__setitem__(entry["id"], entry))
+
+    def remove(self, folder, file_id):
+        self._mutate(folder, lambda entries: entries.pop(file_id, None))
+
+    def rebuild(self, folder):
+        """Full re-scan of the folder: adds missing meetings and drops entries whose file is gone."""
+        state = self._state(folder)
+        with state.lock:
+            self._refresh(folder, state)
+            self._reconcile(folder, state, prune=True)
+            return len(state.manifest["entries"])
+
+    def _mutate(self, folder, change, attempts=3):
+        state = self._state(folder)
+        with state.lock:
+            for _ in range(attempts):
+                self._refresh(folder, state)
+                change(state.manifest["entries"])
+                # Someone else wrote between our read and now: re-read (their entries) and apply again
+                if state.file_id and folder.version(state.file_id) != state.version:
+                    state.checked = 0.0
+                    state.version = None
+                    continue
+                break
+            self._write(folder, state)
+
+    def _write(self, folder, state):
+        state.manifest["updated"] = _now_rfc3339()
+        payload = json.dumps(state.manifest, separators=(",", ":")).encode("utf-8")
+        if state.file_id:
+            result = folder.update(state.file_id, payload)
+        else:
+            result = folder.create(MANIFEST_NAME, payload)
+            state.file_id = result["id"]
+        state.version = result.get("version")
+        state.checked = time.time()
@@ -0,0 +1,500 @@
+"""Local SQLite mirror of a user's Meeting_Data records.
+
+History used to ask Drive for the folder listing (and, before that,
+every record) each time it rendered, so browsing was as slow
+as Drive and impossible when Drive was down. ``MeetingMirror`` keeps a
+copy of every record in SQLite: the History entry (see
+``meeting_folder.history_entry``), the meta part and the transcript
+part (gzipped, as in meeting_storage), plus an FTS5 table over titles,
+participants and sections for the History filter. Browsing, filtering
+and opening a meeting read only the mirror; Drive stays the source of
+truth and the mirror follows it.
+
+Sync is incremental. The mirror stores a cursor, the newest
+``modifiedTime`` it has copied (Drive's clock, not ours), and asks the
+source only for records modified after ``cursor - SYNC_SLACK``, so
+listing lag can't skip a record. Records whose ``modifiedTime`` matches
+the local copy are not downloaded again. Sync copies only what History
+shows: a format 2 record's meta part is mirrored straight away and its
+transcript part later, by ``fill_transcripts`` (run in the background
+after each sync) or the first time ``get`` is asked for it with a
+source, so the first sync of a fresh disk downloads one small part per
+meeting, not every transcript. A modifiedTime listing can't see
+deletions, so every ``full_every`` seconds the sync lists the whole folder
+(names and times only) and drops local records that are gone.
+
+Chat turns asked after saving live in delta files next to the record
+(see chat_log). Adding one doesn't touch the record's ``modifiedTime``, so
+sync also lists the deltas changed since the cursor and re-reads those
+meetings' chat. The turns are kept in their own table and counted into
+the History entries.
+
+A source is anything with ``changes(since) -> [{"id", "name",
+"modifiedTime", "createdTime", "size"}]``, ``read(file_id, transcript)
+-> dict`` (a record, transcript merged in when ``transcript``),
+``transcript(meta) -> dict`` (the transcript part of a meta part), ``chat_changes(since) ->
+[{"name", "modifiedTime"}]`` (chat delta files) and ``chat(record_name)
+-> [turn]``. ``DriveSource`` wraps a ``meeting_folder.DriveFolder``;
+``LocalSource`` serves a directory of saved records, which is enough to
+exercise sync without Drive.
+
+An empty mirror can be ``seed``ed from the Meeting_Data manifest (see
+meeting_manifest): History lists those entries straight away, and the
+first sync replaces each with the copied record.
+
+When an ``index`` (``meeting_search.MeetingIndex``) is given, records the
+sync copies are (re)indexed once their transcript is mirrored for cross-meeting search, and removed records
+are dropped from it.
+"""
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from chat_log import ChatLog
+from meeting_folder import history_entry
+from meeting_search import SECTION_LABELS
+from meeting_storage import (CHAT_INFIX, chat_delta_seq, decode, encode, is_meeting_file, merge_transcript,
+                             needs_transcript, record_stem, split_analysis, transcript_ref)
+
+# Listing-lag allowance when asking the source for "modified since the cursor"
+SYNC_SLACK = datetime.timedelta(minutes=10)
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    file_id TEXT PRIMARY KEY,
+    name TEXT,
+    created TEXT,
+    modified TEXT,
+    meeting_date TEXT,
+    entry TEXT,
+    meta BLOB,
+    transcript BLOB,
+    copied REAL
+);
+CREATE INDEX IF NOT EXISTS records_created ON records (created);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS chats (
+    file_id TEXT PRIMARY KEY,
+    turns BLOB,
+    count INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+    file_id UNINDEXED, title, participants, body, tokenize='porter unicode61'
+);
+"""
+
+
+def _shift(stamp, delta):
+    """RFC 3339 ``stamp`` moved by ``delta``, in the same format Drive queries accept."""
+    moved = datetime.datetime.strptime(stamp[:19], "%Y-%m-%dT%H:%M:%S") + delta
+    return moved.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _delta_stem(name):
+    """``Data_<stem>`` of the record a chat delta file belongs to."""
+    return name[:name.rindex(CHAT_INFIX)]
+
+
+def _match_all(query):
+    """Free text -> an FTS5 query requiring every word (as a prefix), quoted so punctuation is harmless."""
+    return " ".join(f'"{t.lower()}"*' for t in _TERM.findall(query))
+
+
+class DriveSource:
+    """Meeting_Data in Drive, through a ``meeting_folder.DriveFolder``."""
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def changes(self, since=None):
+        return self.folder.list_json(since)
+
+    def read(self, file_id, transcript=True):
+        data = self.folder.read_json(file_id)
+        if transcript and needs_transcript(data):
+            data = merge_transcript(data, self.transcript(data))
+        return data
+
+    def transcript(self, data):
+        return self.folder.read_json(transcript_ref(data)["id"])
+
+    def chat_changes(self, since=None):
+        return self.folder.list_chat_deltas(since)
+
+    def chat(self, record_name):
+        return ChatLog(self.folder, record_name).load(compact=False)
+
+
+class LocalSource:
+    """A directory of saved records (either storage format) standing in for Drive; file names are the IDs."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _stamp(self, seconds):
+        return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+    def _files(self, since=None):
+        files = []
+        for name in sorted(os.listdir(self.directory)):
+            st = os.stat(os.path.join(self.directory, name))
+            modified = self._stamp(st.st_mtime)
+            if since and modified[:19] <= since[:19]:
+                continue
+            files.append({"id": name, "name": name, "modifiedTime": modified,
+                          "createdTime": self._stamp(st.st_ctime), "size": str(st.st_size)})
+        return files
+
+    def changes(self, since=None):
+        return [f for f in self._files(since) if is_meeting_file(f["name"])]
+
+    def _load(self, name):
+        with open(os.path.join(self.directory, name), "rb") as fh:
+            return decode(fh.read())
+
+    def read(self, file_id, transcript=True):
+        data = self._load(file_id)
+        if transcript and needs_transcript(data):
+            data = merge_transcript(data, self.transcript(data))
+        return data
+
+    def transcript(self, data):
+        return self._load(transcript_ref(data)["name"])
+
+    def chat_changes(self, since=None):
+        return [{"name": f["name"], "modifiedTime": f["modifiedTime"]} for f in self._files(since)
+                if chat_delta_seq(f["name"]) is not None]
+
+    def chat(self, record_name):
+        return ChatLog(self, record_name).load(compact=False)
+
+    # The two ``DriveFolder`` methods ``ChatLog.load`` uses
+    def list_prefixed(self, prefix):
+        return [f for f in self._files() if f["name"].startswith(prefix)]
+
+    def read_json(self, file_id):
+        return self._load(file_id)
+
+
+class MeetingMirror:
+    """One user's records, mirrored into SQLite at ``path``."""
+
+    def __init__(self, path, index=None, max_workers=4, full_every=3600):
+        self.path = path
+        self.index = index
+        self.max_workers = max_workers
+        self.full_every = full_every
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._fill_lock = threading.Lock()
+        self.last_sync = {}
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _state(self, conn, key, default=None):
+        row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_state(self, conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (key, value))
+
+    # --- Writes ---
+    def put(self, file_id, name, data, modified=None, created=None, size=None):
+        """Stores (or replaces) one record. ``modified=None`` marks it to be re-checked on the next sync.
+
+        A meta part without its transcript is stored as is (pointer included); ``put_transcript`` completes it.
+        """
+        meta, heavy = split_analysis(data)
+        if heavy:
+            meta.pop("parts", None)
+        entry = history_entry(file_id, name, data, size, created)
+        results = data.get("ai_results") or {}
+        body = "\n".join(results[k] for k in SECTION_LABELS if isinstance(results.get(k), str))
+        with self._write_lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO records VALUES (?,?,?,?,?,?,?,?,?)",
+                         (file_id, name, entry["created"], modified, entry["meeting_date"], json.dumps(entry),
+                          encode(meta), encode(heavy) if heavy else None, time.time()))
+            conn.execute("DELETE FROM records_fts WHERE file_id = ?", (file_id,))
+            conn.execute("INSERT INTO records_fts VALUES (?,?,?,?)", (file_id, entry["title"], entry["participants"], body))
+        if not needs_transcript(data):
+            self._index(file_id, name, data)
+
+    def put_transcript(self, file_id, part, meta=None):
+        """Completes a record mirrored without its transcript and indexes it. False if there was nothing to complete.
+
+        ``meta`` is the stored meta blob the part was fetched for: if a sync replaced the record meanwhile, the part is dropped.
+        """
+        with self._write_lock, self._connect() as conn:
+            row = conn.execute("SELECT name, meta FROM records WHERE file_id = ? AND transcript IS NULL"
+                               " AND meta IS NOT NULL", (file_id,)).fetchone()
+            if not row or (meta is not None and row[1] != meta):
+                return False
+            conn.execute("UPDATE records SET transcript = ? WHERE file_id = ?", (encode(part), file_id))
+        self._index(file_id, row[0], merge_transcript(decode(row[1]), part))
+        return True
+
+    def _index(self, file_id, name, data):
+        if self.index is not None:
+            try:
+                self.index.add_meeting(file_id, name, data)
+            except Exception:
+                pass  # search is best-effort; the mirrored record is what History needs
+
+    def seed(self, entries):
+        """Adds History entries (e.g. from the manifest) for records not mirrored yet. Returns how many were added.
+
+        Seeded rows have no record: ``get`` returns None for them and the next sync copies them (their ``modified`` is unset).
+        """
+        added = 0
+        with self._write_lock, self._connect() as conn:
+            known = {row[0] for row in conn.execute("SELECT file_id FROM records")}
+            for entry in entries:
+                if entry["id"] in known:
+                    continue
+                conn.execute("INSERT INTO records (file_id, name, created, meeting_date, entry, copied) VALUES (?,?,?,?,?,?)",
+                             (entry["id"], entry["name"], entry["created"], entry["meeting_date"], json.dumps(entry), time.time()))
+                conn.execute("INSERT INTO records_fts VALUES (?,?,?,?)",
+                             (entry["id"], entry["title"], entry["participants"], "\n".join(entry["previews"].values())))
+                added += 1
+        return added
+
+    def set_chat(self, file_id, turns):
+        """Stores the chat turns persisted for a record since it was saved (its delta files)."""
+        with self._write_lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO chats VALUES (?,?,?)", (file_id, encode(list(turns)), len(turns)))
+
+    def remove(self, file_id):
+        with self._write_lock, self._connect() as conn:
+            conn.execute("DELETE FROM records WHERE file_id = ?", (file_id,))
+            conn.execute("DELETE FROM records_fts WHERE file_id = ?", (file_id,))
+            conn.execute("DELETE FROM chats WHERE file_id = ?", (file_id,))
+        if self.index is not None:
+            self.index.remove_meeting(file_id)
+
+    # --- Sync ---
+    def sync(self, source, full=None):
+        """Copies records added or changed at the source since the cursor; ``full`` (default: when due) also drops deleted ones.
+
+        Only meta parts are downloaded; transcript parts are left to ``fill_transcripts``.
+
+        Returns {"copied", "removed", "failed", "listed", "chats", "full", "seconds"}, also kept in ``last_sync``.
+        """
+        with self._sync_lock:
+            started = time.perf_counter()
+            with self._connect() as conn:
+                cursor = self._state(conn, "cursor")
+                last_full = float(self._state(conn, "last_full", 0))
+                local = dict(conn.execute("SELECT file_id, modified FROM records"))
+            if full is None:
+                full = not cursor or time.time() - last_full > self.full_every
+            since = None if full or not cursor else _shift(cursor, -SYNC_SLACK)
+            try:
+                files = source.changes(since)
+                deltas = source.chat_changes(since)
+            except Exception as e:
+                self.last_sync = {"error": str(e), "at": time.time()}
+                raise
+            todo = [f for f in files if local.get(f["id"]) != f.get("modifiedTime")]
+
+            def fetch(f):
+                try:
+                    return source.read(f["id"], transcript=False)
+                except Exception:
+                    return None
+
+            failed = []
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for f, data in zip(todo, pool.map(fetch, todo)):
+                    if data is None:
+                        failed.append(f)
+                        continue
+                    self.put(f["id"], f["name"], data, f.get("modifiedTime"), f.get("createdTime"),
+                             int(f.get("size") or 0) or None)
+
+            # New chat deltas don't change their record: refresh those meetings' chat separately
+            with self._connect() as conn:
+                by_stem = {record_stem(name): (file_id, name) for file_id, name in conn.execute("SELECT file_id, name FROM records")}
+            stamps_by_stem = {}
+            for d in deltas:
+                stamps_by_stem.setdefault(_delta_stem(d["name"]), []).append(d.get("modifiedTime"))
+            chat_todo = [(stem, *by_stem[stem]) for stem in stamps_by_stem if stem in by_stem]
+
+            def fetch_chat(item):
+                try:
+                    return source.chat(item[2])
+                except Exception:
+                    return None
+
+            chat_failed = []
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for (stem, file_id, _), turns in zip(chat_todo, pool.map(fetch_chat, chat_todo)):
+                    if turns is None:
+                        chat_failed.append(stem)
+                    else:
+                        self.set_chat(file_id, turns)
+
+            removed = 0
+            if full:
+                present = {f["id"] for f in files}
+                for file_id in [i for i in local if i not in present]:
+                    self.remove(file_id)
+                    removed += 1
+
+            # Never move the cursor past a record that failed to copy
+            stamps = [f["modifiedTime"] for f in (*files, *deltas) if f.get("modifiedTime")]
+            new_cursor = max([s for s in (cursor, *stamps) if s], default=None)
+            if failed or chat_failed:
+                new_cursor = min([new_cursor, *(f["modifiedTime"] for f in failed if f.get("modifiedTime")),
+                                  *(t for stem in chat_failed for t in stamps_by_stem[stem] if t)])
+            with self._write_lock, self._connect() as conn:
+                if new_cursor:
+                    self._set_state(conn, "cursor", new_cursor)
+                if full:
+                    self._set_state(conn, "last_full", str(time.time()))
+            self.last_sync = {"copied": len(todo) - len(failed), "removed": removed, "failed": len(failed) + len(chat_failed),
+                              "listed": len(files), "chats": len(chat_todo) - len(chat_failed),
+                              "full": full, "seconds": round(time.perf_counter() - started, 3),
+                              "at": time.time()}
+            return self.last_sync
+
+    def _pending(self):
+        """(file_id, stored meta blob, meta) of records mirrored without their transcript part."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT file_id, meta FROM records WHERE transcript IS NULL AND meta IS NOT NULL"
+                                " ORDER BY created DESC").fetchall()
+        pending = []
+        for file_id, blob in rows:
+            meta = decode(blob)
+            if needs_transcript(meta):
+                pending.append((file_id, blob, meta))
+        return pending
+
+    def fill_transcripts(self, source, limit=None):
+        """Downloads the transcript parts sync left behind, newest meeting first. Returns how many were stored."""
+        with self._fill_lock:
+            pending = self._pending()[:limit]
+
+            def fetch(item):
+                try:
+                    return source.transcript(item[2])
+                except Exception:
+                    return None  # stays pending; the next fill (or a get with a source) retries it
+
+            stored = 0
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                for (file_id, blob, _), part in zip(pending, pool.map(fetch, pending)):
+                    if part is not None and self.put_transcript(file_id, part, blob):
+                        stored += 1
+            return stored
+
+    def fill_in_background(self, source):
+        """Starts ``fill_transcripts`` on a daemon thread unless one is running."""
+        if self._fill_lock.locked():
+            return False
+
+        def run():
+            try:
+                self.fill_transcripts(source)
+            except Exception:
+                pass
+        threading.Thread(target=run, name="meeting-mirror-fill", daemon=True).start()
+        return True
+
+    def sync_in_background(self, source, min_interval=60, full=None):
+        """Starts ``sync`` (then ``fill_transcripts``) on a daemon thread unless one is running or the last one was under ``min_interval`` ago."""
+        if self._sync_lock.locked() or time.time() - self.last_sync.get("at", 0) < min_interval:
+            return False
+
+        def run():
+            try:
+                self.sync(source, full)
+            except Exception:
+                pass  # recorded in last_sync; History keeps serving the local copy
+            try:
+                self.fill_transcripts(source)
+            except Exception:
+                pass
+        threading.Thread(target=run, name="meeting-mirror-sync", daemon=True).start()
+        return True
+
+    @property
+    def syncing(self):
+        return self._sync_lock.locked()
+
+    # --- Reads ---
+    def entries(self, query="", since=None, until=None):
+        """History entries (newest first) whose title/participants/sections match every word of ``query``."""
+        sql, args = "SELECT r.entry, COALESCE(c.count, 0) FROM records r LEFT JOIN chats c ON c.file_id = r.file_id", []
+        where = []
+        match = _match_all(query)
+        if match:
+            where.append("r.file_id IN (SELECT file_id FROM records_fts WHERE records_fts MATCH ?)")
+            args.append(match)
+        if since:
+            where.append("r.meeting_date >= ?")
+            args.append(str(since))
+        if until:
+            where.append("r.meeting_date <= ?")
+            args.append(str(until))
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._connect() as conn:
+            rows = conn.execute(sql + " ORDER BY r.created DESC", args).fetchall()
+        entries = []
+        for entry, chat_turns in rows:
+            entry = json.loads(entry)
+            entry["chat_turns"] += chat_turns
+            entries.append(entry)
+        return entries
+
+    def get(self, file_id, transcript=True, source=None):
+        """The record (as saved, format 1 shape), or None if it isn't mirrored (or only seeded).
+
+        If its transcript part isn't mirrored yet, it is fetched from ``source`` and kept; without a source
+        (or if that fails) the meta part is returned, its ``parts`` pointer intact.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT meta, transcript FROM records WHERE file_id = ?", (file_id,)).fetchone()
+        if not row or row[0] is None:
+            return None
+        data = decode(row[0])
+        if not transcript:
+            return data
+        if row[1]:
+            return merge_transcript(data, decode(row[1]))
+        if source is not None and needs_transcript(data):
+            try:
+                part = source.transcript(data)
+            except Exception:
+                return data
+            self.put_transcript(file_id, part, row[0])
+            data = merge_transcript(data, part)
+        return data
+
+    def chat(self, file_id):
+        """Mirrored chat turns persisted since the record was saved ([] if none)."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT turns FROM chats WHERE file_id = ?", (file_id,)).fetchone()
+        return decode(row[0]) if row else []
+
+    def stats(self):
+        with self._connect() as conn:
+            count, stored = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(meta) + COALESCE(LENGTH(transcript), 0)), 0) FROM records").fetchone()
+            cursor = self._state(conn, "cursor")
+        return {"records": count, "bytes": stored, "cursor": cursor}
+
@@ -0,0 +1,359 @@
+"""Cross-meeting search over the analyses saved in Drive's Meeting_Data folder.
+
+Each saved meeting is broken into passages (its summary sections plus
+speaker-turn chunks of the transcript) and stored in a local SQLite FTS5
+table, one database per user. Meetings are added one at a time as they are
+saved, so the index never needs a full rebuild; ``backfill`` picks up
+meetings saved before the index existed.
+
+When an ``embed(texts, task_type) -> [[float]]`` function is supplied (and numpy is
+importable), passages also get embedding vectors and results are fused
+with a semantic ranking, so "what did the client ask for" also finds
+passages that say "requested" or "would like". Embedding is a network
+call, so neither saving nor searching waits on it for long: a meeting's
+passages are searchable by full text as soon as ``add_meeting`` returns
+and get their vectors on a background thread. The query embedding starts
+alongside the full-text query and is fused in if it arrives within
+``query_budget`` seconds; query vectors are cached, so a late query gets
+the semantic ranking next time. ``search`` says which of these happened
+(``SearchHits.semantic``) so the UI can tell the user.
+"""
+import array
+import collections
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from retrieval import STOPWORDS
+from summarization import chunk_turns, split_turns
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+# Reciprocal-rank-fusion constant: damps the influence of the very top ranks
+RRF_K = 60
+SECTION_LABELS = {
+    "overview": "Overview",
+    "discussion": "Discussion",
+    "next_steps": "Next steps",
+    "client_reqs": "Client requests",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meetings (
+    file_id TEXT PRIMARY KEY,
+    name TEXT,
+    title TEXT,
+    meeting_date TEXT,
+    participants TEXT,
+    indexed REAL
+);
+CREATE TABLE IF NOT EXISTS passages (
+    id INTEGER PRIMARY KEY,
+    file_id TEXT,
+    label TEXT,
+    text TEXT,
+    vector BLOB
+);
+CREATE INDEX IF NOT EXISTS passages_file ON passages (file_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS passages_fts USING fts5(
+    text, content='passages', content_rowid='id', tokenize='porter unicode61'
+);
+"""
+
+
+def _match_query(query):
+    """Free text -> an FTS5 OR-query of quoted terms (so user punctuation can never be a syntax error)."""
+    terms = {t.lower() for t in _TERM.findall(query) if len(t) > 1}
+    terms = (terms - STOPWORDS) or terms
+    return " OR ".join(f'"{t}"' for t in sorted(terms))
+
+
+def meeting_passages(data, passage_tokens=300):
+    """(label, text) passages for one saved analysis: summary sections first, then transcript chunks."""
+    results = data.get("ai_results", {}) or {}
+    passages = [(label, results[key].strip()) for key, label in SECTION_LABELS.items()
+                if isinstance(results.get(key), str) and results[key].strip()]
+    transcript = results.get("full_transcript") or ""
+    for i, chunk in enumerate(chunk_turns(split_turns(transcript), passage_tokens)):
+        passages.append((f"Transcript {i + 1}", chunk))
+    return passages
+
+
+def meeting_date_of(data):
+    """Best known meeting date (YYYY-MM-DD): the detected date if saved, else the analysis date."""
+    return (data.get("meeting_date") or str(data.get("date", "")))[:10]
+
+
+class SearchHits(list):
+    """``search`` results, plus how the semantic ranking went: "used", "late" (the query embedding missed
+    ``query_budget``), "unavailable" (no passage vectors yet, no numpy, or embedding failed) or "off" (no embedder)."""
+
+    def __init__(self, hits=(), semantic="off"):
+        super().__init__(hits)
+        self.semantic = semantic
+
+
+class MeetingIndex:
+    """Incremental FTS5 (+ optional vector) index of one user's saved meetings."""
+
+    def __init__(self, path, embed=None, passage_tokens=300, query_budget=2.0, query_cache_size=256):
+        self.path = path
+        self.embed = embed
+        self.passage_tokens = passage_tokens
+        self.query_budget = query_budget
+        self.query_cache_size = query_cache_size
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+        self._vectors = None  # (ids, matrix) cache, invalidated on every write
+        self._generation = 0  # bumped with it, so a build that overlapped a write isn't cached
+        self._query_vectors = collections.OrderedDict()  # normalised query -> Future of its embedding
+        self._query_lock = threading.Lock()
+        self._query_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="query-embed") if embed else None
+        self._embed_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="passage-embed") if embed else None
+        if embed:
+            # Passages indexed before a restart whose vectors never arrived
+            self._embed_pool.submit(self._embed_pending)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    # --- Writes ---
+    def add_meeting(self, file_id, name, data):
+        """(Re)indexes one saved analysis. Cheap for a single meeting; other meetings are untouched.
+
+        Full-text search finds it on return; its passage vectors are embedded in the background.
+        """
+        passages = meeting_passages(data, self.passage_tokens)
+        rows = []
+        with self._lock, self._connect() as conn:
+            self._delete(conn, file_id)
+            conn.execute(
+                "INSERT INTO meetings VALUES (?,?,?,?,?,?)",
+                (file_id, name, data.get("detected_title") or name, meeting_date_of(data),
+                 data.get("participants", ""), time.time()),
+            )
+            for label, text in passages:
+                cur = conn.execute("INSERT INTO passages (file_id, label, text) VALUES (?,?,?)", (file_id, label, text))
+                conn.execute("INSERT INTO passages_fts (rowid, text) VALUES (?, ?)", (cur.lastrowid, text))
+                rows.append((cur.lastrowid, text))
+            self._vectors = None
+            self._generation += 1
+        if self._embed_pool and rows:
+            self._embed_pool.submit(self._embed_passages, file_id, rows)
+        return len(passages)
+
+    def remove_meeting(self, file_id):
+        with self._lock, self._connect() as conn:
+            self._delete(conn, file_id)
+            self._vectors = None
+            self._generation += 1
+
+    def _delete(self, conn, file_id):
+        rows = conn.execute("SELECT id, text FROM passages WHERE file_id = ?", (file_id,)).fetchall()
+        for rowid, text in rows:
+            conn.execute("INSERT INTO passages_fts (passages_fts, rowid, text) VALUES ('delete', ?, ?)", (rowid, text))
+        conn.execute("DELETE FROM passages WHERE file_id = ?", (file_id,))
+        conn.execute("DELETE FROM meetings WHERE file_id = ?", (file_id,))
+
+    def known_ids(self):
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT file_id FROM meetings")}
+
+    def backfill(self, files, load, limit=None):
+        """Indexes Drive ``files`` ([{id, name}, ...]) not seen yet; ``load(file_id)`` fetches the JSON."""
+        known = self.known_ids()
+        added = 0
+        for f in files:
+            if f["id"] in known:
+                continue
+            data = load(f["id"])
+            if data:
+                self.add_meeting(f["id"], f["name"], data)
+                added += 1
+                if limit and added >= limit:
+                    break
+        return added
+
+    def stats(self):
+        with self._connect() as conn:
+            meetings = conn.execute("SELECT COUNT(*) FROM meetings").fetchone()[0]
+            passages = conn.execute("SELECT COUNT(*), COUNT(vector) FROM passages").fetchone()
+        return {"meetings": meetings, "passages": passages[0], "embedded": passages[1]}
+
+    # --- Reads ---
+    def search(self, query, k=8, since=None, until=None):
+        """Top-k passages across meetings (a ``SearchHits``), optionally limited to meeting dates in [since, until] (ISO dates)."""
+        where, args = [], []
+        if since:
+            where.append("m.meeting_date >= ?")
+            args.append(str(since))
+        if until:
+            where.append("m.meeting_date <= ?")
+            args.append(str(until))
+        date_filter = (" AND " + " AND ".join(where)) if where else ""
+        rankings = []
+
+        query_vec = self._query_vector(query)  # embeds while the full-text query runs
+        match = _match_query(query)
+        with self._connect() as conn:
+            if match:
+                rows = conn.execute(
+                    "SELECT p.id FROM passages_fts JOIN passages p ON p.id = passages_fts.rowid "
+                    f"JOIN meetings m ON m.file_id = p.file_id WHERE passages_fts MATCH ?{date_filter} "
+                    "ORDER BY bm25(passages_fts) LIMIT ?",
+                    (match, *args, k * 5),
+                ).fetchall()
+                rankings.append([r[0] for r in rows])
+
+            semantic, status = self._semantic_ranking(conn, query_vec, date_filter, args, k * 5)
+            if semantic:
+                rankings.append(semantic)
+
+            scores = {}
+            for ranking in rankings:
+                for rank, pid in enumerate(ranking):
+                    scores[pid] = scores.get(pid, 0.0) + 1.0 / (RRF_K + rank + 1)
+            top = sorted(scores, key=scores.get, reverse=True)[:k]
+            if not top:
+                return SearchHits(semantic=status)
+            rows = conn.execute(
+                "SELECT p.id, p.file_id, p.label, p.text, m.title, m.meeting_date, m.name FROM passages p "
+                f"JOIN meetings m ON m.file_id = p.file_id WHERE p.id IN ({','.join('?' * len(top))})",
+                top,
+            ).fetchall()
+        by_id = {r[0]: r for r in rows}
+        return SearchHits([
+            {"file_id": r[1], "label": r[2], "text": r[3], "title": r[4], "date": r[5], "name": r[6],
+             "score": round(scores[pid], 4)}
+            for pid in top if (r := by_id.get(pid))
+        ], status)
+
+    def context_for(self, query, k=8, since=None, until=None):
+        """Hits grouped per meeting (oldest first), formatted for a multi-meeting chat prompt."""
+        hits = self.search(query, k, since, until)
+        meetings = {}
+        for hit in hits:
+            meetings.setdefault((hit["date"], hit["title"]), []).append(hit)
+        blocks = []
+        for (date, title), group in sorted(meetings.items()):
+            body = "\n".join(f"[{h['label']}] {h['text']}" for h in group)
+            blocks.append(f"### Meeting: {title} ({date})\n{body}")
+        return "\n\n".join(blocks), hits
+
+    # --- Vectors ---
+    def _embed(self, texts, task_type="retrieval_document"):
+        if not self.embed or not texts:
+            return None
+        try:
+            return self.embed(texts, task_type)
+        except Exception:
+            return None  # full-text search still works; vectors are an optional extra
+
+    def _embed_passages(self, file_id, rows):
+        """Stores vectors for ``rows`` ([(passage id, text)]) unless the meeting was re-indexed or removed meanwhile."""
+        vectors = self._embed([text for _, text in rows])
+        if not vectors:
+            return 0
+        with self._lock, self._connect() as conn:
+            for (rowid, text), vector in zip(rows, vectors):
+                conn.execute("UPDATE passages SET vector = ? WHERE id = ? AND file_id = ? AND text = ?",
+                             (_pack(vector), rowid, file_id, text))
+            self._vectors = None
+            self._generation += 1
+        return len(rows)
+
+    def _embed_pending(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT file_id, id, text FROM passages WHERE vector IS NULL ORDER BY id").fetchall()
+        by_meeting = collections.defaultdict(list)
+        for file_id, rowid, text in rows:
+            by_meeting[file_id].append((rowid, text))
+        for file_id, meeting_rows in by_meeting.items():
+            self._embed_passages(file_id, meeting_rows)
+
+    def wait_for_embeddings(self):
+        """Blocks until passage embeddings queued so far are stored (tests, benchmarks)."""
+        if self._embed_pool:
+            self._embed_pool.submit(lambda: None).result()
+
+    def _query_vector(self, query):
+        """Future of the query's embedding (cached per normalised query), or None without an embedder."""
+        if not self.embed:
+            return None
+        key = " ".join(query.lower().split())
+        with self._query_lock:
+            future = self._query_vectors.get(key)
+            if future is not None:
+                self._query_vectors.move_to_end(key)
+                return future
+            future = self._query_pool.submit(self._embed, [query], "retrieval_query")
+            self._query_vectors[key] = future
+            while len(self._query_vectors) > self.query_cache_size:
+                self._query_vectors.popitem(last=False)
+        future.add_done_callback(lambda f: f.result() is None and self._forget_query(key, f))
+        return future
+
+    def _forget_query(self, key, future):
+        # A failed embedding is retried by the next search instead of being cached
+        with self._query_lock:
+            if self._query_vectors.get(key) is future:
+                del self._query_vectors[key]
+
+    def _semantic_ranking(self, conn, query_future, date_filter, args, limit):
+        """(passage ids by similarity, status): see ``SearchHits`` for the statuses."""
+        if query_future is None:
+            return [], "off"
+        try:
+            import numpy as np
+        except ImportError:
+            return [], "unavailable"
+        with self._lock:
+            vectors, generation = self._vectors, self._generation
+        if vectors is None:
+            rows = conn.execute("SELECT id, vector FROM passages WHERE vector IS NOT NULL").fetchall()
+            if not rows:
+                return [], "unavailable"
+            ids = np.array([r[0] for r in rows])
+            matrix = np.vstack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-9
+            vectors = (ids, matrix)
+            with self._lock:
+                # A save or removal since we read the generation may not be in these rows
+                if self._generation == generation:
+                    self._vectors = vectors
+        ids, matrix = vectors
+        try:
+            query_vec = query_future.result(timeout=self.query_budget)
+        except FutureTimeout:
+            return [], "late"  # full-text results now; the vector lands in the cache for the next search
+        if not query_vec:
+            return [], "unavailable"
+        q = np.asarray(query_vec[0], dtype=np.float32)
+        scores = matrix @ (q / (np.linalg.norm(q) + 1e-9))
+        if date_filter:
+            allowed = {r[0] for r in conn.execute(
+                f"SELECT p.id FROM passages p JOIN meetings m ON m.file_id = p.file_id WHERE 1=1{date_filter}", args)}
+            scores = np.where(np.isin(ids, list(allowed)), scores, -np.inf)
+        order = np.argsort(-scores)[:limit]
+        return [int(ids[i]) for i in order if np.isfinite(scores[i])], "used"
+
+
+def _pack(vector):
+    return array.array("f", vector).tobytes() if vector is not None else None
+
+
+def gemini_embedder(genai, model="models/text-embedding-004", batch_size=100, limiter=None):
+    """``embed(texts, task_type)`` backed by the Gemini embedding API (through ``limiter.call`` when given)."""
+    call = limiter.call if limiter else (lambda fn, **kwargs: fn(**kwargs))
+
+    def embed(texts, task_type="retrieval_document"):
+        vectors = []
+        for i in range(0, len(texts), batch_size):
+            result = call(genai.embed_content, model=model, content=texts[i:i + batch_size], task_type=task_type)
+            vectors.extend(result["embedding"])
+        return vectors
+    return embed
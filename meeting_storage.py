@@ -0,0 +1,133 @@
+"""Storage format for the analyses saved in Drive's Meeting_Data folder.
+
+Format 1 (``Data_*.json``) was one pretty-printed JSON document holding
+everything: sections, participants, chat history and the transcript in
+two forms (plain text and word-level with timings), which is most of the
+bytes. Opening a meeting from History downloaded all of it just to show
+the Review tab.
+
+Format 2 saves a meeting as two gzipped compact-JSON files:
+
+- ``Data_<stem>.json.gz``, the *meta* part: everything format 1 had,
+  except the ``HEAVY_KEYS`` of ``ai_results``, plus
+  ``"format": 2`` and ``"parts": {"transcript": {"id", "name", "bytes"}}``;
+- ``Data_<stem>.transcript.json.gz``: just those heavy keys. The plain
+  ``full_transcript`` is left out when the structured ``transcript``
+  (``transcription.Transcript.to_dict``) renders back to it, and
+  ``transcript_fields`` rebuilds it on load.
+
+Opening a meeting fetches the meta part; the transcript part is fetched
+the first time something needs the transcript (Chat, search indexing).
+Chat turns asked after saving go to ``Data_<stem>.chat.<seq>.json`` delta
+files (see chat_log), never back into the record.
+
+``decode`` tells the formats apart by content (gzip magic vs plain JSON),
+so format 1 files keep loading unchanged.
+"""
+import gzip
+import json
+import re
+
+from transcription import Transcript
+
+FORMAT_VERSION = 2
+GZIP_MIME = "application/gzip"
+META_SUFFIX = ".json.gz"
+TRANSCRIPT_SUFFIX = ".transcript.json.gz"
+# The large, rarely needed parts of ``ai_results``
+HEAVY_KEYS = ("full_transcript", "transcript", "speech_offsets")
+CHAT_INFIX = ".chat."
+# Every saved meeting's file name starts with this (the manifest and other folder files don't)
+RECORD_PREFIX = "Data_"
+_CHAT_DELTA = re.compile(r"\.chat\.(\d{5})\.json$")
+
+
+def encode(obj, level=6):
+    """Compact JSON, gzipped."""
+    return gzip.compress(json.dumps(obj, separators=(",", ":")).encode("utf-8"), compresslevel=level)
+
+
+def format_of(data):
+    """The storage format a saved record was written in (format 1 files predate the field)."""
+    return data.get("format", 1)
+
+
+def decode(payload):
+    """Parses either format: gzipped JSON (format 2) or plain JSON (format 1)."""
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    if payload[:2] == b"\x1f\x8b":
+        payload = gzip.decompress(payload)
+    data = json.loads(payload)
+    if isinstance(data, dict) and format_of(data) > FORMAT_VERSION:
+        raise ValueError(f"saved with a newer storage format ({format_of(data)}); update the app to open it")
+    return data
+
+
+def record_stem(filename):
+    """``Data_<stem>`` of a record in either format (``.json`` or ``.json.gz``)."""
+    for suffix in (META_SUFFIX, ".json"):
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+def part_names(filename):
+    """(meta name, transcript name) for a legacy-style ``Data_<stem>.json`` file name."""
+    stem = record_stem(filename)
+    return stem + META_SUFFIX, stem + TRANSCRIPT_SUFFIX
+
+
+def chat_delta_name(record_name, seq):
+    return f"{record_stem(record_name)}{CHAT_INFIX}{seq:05d}.json"
+
+
+def chat_delta_seq(name):
+    """The sequence number of a chat delta file name, or None if it isn't one."""
+    match = _CHAT_DELTA.search(name)
+    return int(match.group(1)) if match else None
+
+
+def is_meeting_file(name):
+    """True for ``Data_*`` files that are a saved meeting (format 1 or a format 2 meta part), not a transcript or chat part."""
+    if not name.startswith(RECORD_PREFIX) or name.endswith(TRANSCRIPT_SUFFIX) or chat_delta_seq(name) is not None:
+        return False
+    return name.endswith(".json") or name.endswith(META_SUFFIX)
+
+
+def split_analysis(data):
+    """(meta, transcript_part) of a full analysis dict; the meta part's ``parts`` pointer is filled in by the caller."""
+    results = data.get("ai_results") or {}
+    heavy = {k: results[k] for k in HEAVY_KEYS if k in results}
+    structured = heavy.get("transcript")
+    if structured and "full_transcript" in heavy and Transcript.from_dict(structured).render() == heavy["full_transcript"]:
+        del heavy["full_transcript"]  # the words are already in the structured form
+    meta = {
+        **data,
+        "format": FORMAT_VERSION,
+        "ai_results": {k: v for k, v in results.items() if k not in HEAVY_KEYS},
+    }
+    return meta, heavy
+
+
+def transcript_ref(data):
+    """The transcript part's pointer ({"id", "name", "bytes"}) if ``data`` is a format 2 meta part, else None."""
+    return (data.get("parts") or {}).get("transcript")
+
+
+def needs_transcript(data):
+    """True if ``data`` is a meta part whose transcript hasn't been merged in yet."""
+    return bool(transcript_ref(data)) and "full_transcript" not in (data.get("ai_results") or {})
+
+
+def transcript_fields(transcript_part):
+    """A transcript part with ``full_transcript`` rendered from the structured transcript if it was left out."""
+    part = dict(transcript_part or {})
+    if "full_transcript" not in part and part.get("transcript"):
+        part["full_transcript"] = Transcript.from_dict(part["transcript"]).render()
+    return part
+
+
+def merge_transcript(data, transcript_part):
+    """A copy of meta ``data`` with the transcript part folded back into ``ai_results`` (format 1 shape)."""
+    return {**data, "ai_results": {**(data.get("ai_results") or {}), **transcript_fields(transcript_part)}}
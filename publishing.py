@@ -0,0 +1,101 @@
+"""Publishing a generated document to several destinations at once.
+
+"Generate" used to upload the .docx to Drive, then upload it to Basecamp
+as an attachment, then create the Basecamp post, one after the other, so
+the user waited for the sum of every round trip, and a Drive error was
+reported in the middle of a half-finished Basecamp post.
+
+Each destination is now a ``Destination``: a short list of named steps
+run in order on its own worker thread, so destinations overlap and one
+failing never blocks (or undoes) another. Step results are kept, so a
+retry resumes at the step that failed: retrying a Basecamp post whose
+attachment already uploaded doesn't upload it again. Steps are mostly
+non-idempotent writes, so a failure is retried automatically only when
+``rate_limits.classify`` says resending a write is safe (rate limits,
+connects that never reached the service); anything else is left for the
+user to retry from the UI. The steps run under ``single_attempt_writes``,
+so ``retries`` is the whole retry budget for a write rather than being
+multiplied by the limiter's own retries.
+
+Like jobs and reporting, nothing here calls Streamlit: steps must be
+plain functions of their inputs.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limits import classify, single_attempt_writes
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+
+class Destination:
+    """One place to publish to. ``steps`` is ``[(label, fn)]``; ``fn(results)`` gets the earlier steps' results by label."""
+
+    def __init__(self, name, steps, link=None):
+        self.name = name
+        self.steps = steps
+        self.link = link  # link(results) -> URL of what was published, shown once done
+        self.results = {}
+        self.status = PENDING
+        self.attempts = 0
+        self.seconds = 0.0
+        self.error = None
+
+    def run(self, retries=1, backoff=1.0):
+        """Runs the steps not done yet; retries retryable failures up to ``retries`` times. Returns self."""
+        self.status = RUNNING
+        started = time.perf_counter()
+        for attempt in range(retries + 1):
+            self.attempts += 1
+            label = None
+            try:
+                with single_attempt_writes():
+                    for label, fn in self.steps:
+                        if label not in self.results:
+                            self.results[label] = fn(self.results)
+                self.status, self.error = DONE, None
+                break
+            except Exception as e:
+                self.error = f"{label}: {e}"
+                retryable, retry_after = classify(e, idempotent=False)
+                if attempt == retries or not retryable:
+                    self.status = FAILED
+                    break
+                time.sleep(max(backoff * 2 ** attempt, retry_after or 0))
+        self.seconds += time.perf_counter() - started
+        return self
+
+    @property
+    def ok(self):
+        return self.status == DONE
+
+    @property
+    def url(self):
+        if self.status != DONE or not self.link:
+            return None
+        try:
+            return self.link(self.results)
+        except Exception:
+            return None
+
+    def as_dict(self):
+        return {"name": self.name, "status": self.status, "attempts": self.attempts,
+                "seconds": round(self.seconds, 3), "error": self.error, "url": self.url}
+
+
+def publish(destinations, retries=1, max_workers=None):
+    """Runs every destination concurrently; returns (destinations, wall-clock seconds)."""
+    if not destinations:
+        return destinations, 0.0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers or len(destinations), thread_name_prefix="publish") as pool:
+        list(pool.map(lambda d: d.run(retries), destinations))
+    return destinations, time.perf_counter() - started
+
+
+def format_publish_summary(destinations, wall_seconds):
+    """'Published to 2/2 destinations in 2.3s (one after another: 3.9s)'."""
+    done = sum(d.status == DONE for d in destinations)
+    serial = sum(d.seconds for d in destinations)
+    line = f"Published to {done}/{len(destinations)} destinations in {wall_seconds:.1f}s"
+    return line + (f" (one after another: {serial:.1f}s)" if len(destinations) > 1 else "")
@@ -0,0 +1,329 @@
+"""Rate limiting, retries and concurrency caps for the outside services.
+
+Every Gemini, Speech-to-Text, Drive and Basecamp call used to be bare, so a
+429 or a transient 503 surfaced as a one-off error and several sessions
+hammering the same quota made it worse. Calls now go through a
+``ServiceLimiter`` per service, shared by every session in the process:
+
+- a token bucket keeps the request rate under the service's quota
+  (Basecamp allows about 50 requests per 10 seconds);
+- a semaphore caps how many calls are in flight at once;
+- retryable failures (429, 5xx, connection resets) are retried with
+  full-jitter exponential backoff, honouring ``Retry-After`` when sent.
+
+Writes that aren't idempotent (POSTs, Drive ``files().create``, starting a
+Speech-to-Text operation) go through ``call_write``. A 5xx or read timeout
+there may arrive after the service already acted, and resending would
+create a duplicate message, attachment or file, or a second billed
+recognition. So writes are retried only on rate limits and on connect-phase
+failures, where nothing was sent. Callers that retry a whole sequence of
+calls themselves (publishing) wrap it in ``single_attempt_writes()`` so a
+write gets one attempt per pass instead of the limiter's retries on top.
+
+Errors are classified by duck typing (``resp.status`` on googleapiclient's
+HttpError, ``code`` on google.api_core errors, ``status_code`` on requests
+responses) so this module imports none of the client libraries.
+"""
+import contextlib
+import random
+import threading
+import time
+
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+# Exception class names that mean "try again" even without an HTTP status
+_RETRYABLE_NAMES = frozenset({
+    "ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "ChunkedEncodingError",
+    "TimeoutError", "ConnectionResetError", "RemoteDisconnected", "TransportError",
+    "ServiceUnavailable", "TooManyRequests", "ResourceExhausted", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway",
+})
+# ...and the subset that means the request never reached the service
+_CONNECT_NAMES = frozenset({"ConnectTimeout", "ConnectTimeoutError", "NewConnectionError", "ConnectionRefusedError"})
+# Drive reports per-user quota as 403 with one of these reasons
+_RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# HTTP methods that are safe to resend after an ambiguous failure
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# rate requests per ``per`` seconds, ``concurrency`` calls in flight
+DEFAULT_LIMITS = {
+    "basecamp": {"rate": 50, "per": 10.0, "concurrency": 4},
+    "gemini": {"rate": 120, "per": 60.0, "concurrency": 8},
+    "speech": {"rate": 60, "per": 60.0, "concurrency": 8},
+    "drive": {"rate": 10, "per": 1.0, "concurrency": 8},
+}
+
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def single_attempt_writes():
+    """On this thread, ``call_write`` makes one attempt: the caller retries (and so must not multiply the limiter's retries)."""
+    previous = getattr(_local, "single_attempt_writes", False)
+    _local.single_attempt_writes = True
+    try:
+        yield
+    finally:
+        _local.single_attempt_writes = previous
+
+
+class RateLimitedError(RuntimeError):
+    """A service kept refusing or failing a call after every retry."""
+
+
+def _retry_after(headers):
+    try:
+        return float((headers or {}).get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _status_and_headers(outcome):
+    """HTTP status (or None) and response headers of an exception or response, whichever client produced it."""
+    resp = getattr(outcome, "resp", None)  # googleapiclient.errors.HttpError
+    if resp is not None and getattr(resp, "status", None):
+        return int(resp.status), resp
+    response = getattr(outcome, "response", None)  # requests.HTTPError
+    if response is not None and getattr(response, "status_code", None):
+        return response.status_code, response.headers
+    if isinstance(getattr(outcome, "status_code", None), int):  # requests.Response
+        return outcome.status_code, getattr(outcome, "headers", None)
+    code = getattr(outcome, "code", None)  # google.api_core.exceptions.*
+    return (code if isinstance(code, int) else None), None
+
+
+def is_rate_limit(outcome):
+    """True for "slow down" answers (429, quota 403s, ResourceExhausted) rather than plain failures."""
+    status, _ = _status_and_headers(outcome)
+    if status == 429 or type(outcome).__name__ in ("TooManyRequests", "ResourceExhausted"):
+        return True
+    return status == 403 and any(r in str(outcome) for r in _RATE_LIMIT_REASONS)
+
+
+def is_connect_error(error):
+    """True if ``error`` (or what it wraps) failed before the request was sent: refused or timed-out connects."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if type(error).__name__ in _CONNECT_NAMES or "NewConnectionError" in str(error) or "Connection refused" in str(error):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def is_idempotent(method):
+    return str(method or "GET").upper() in IDEMPOTENT_METHODS
+
+
+def classify(outcome, idempotent=True):
+    """(retryable, retry_after_seconds) for a raised exception or a returned HTTP response.
+
+    With ``idempotent=False`` only rate limits and connect-phase errors are
+    retryable: after a 5xx or a read timeout the write may already be done.
+    """
+    if isinstance(outcome, RateLimitedError) and outcome.__cause__ is not None:
+        return classify(outcome.__cause__, idempotent)
+    status, headers = _status_and_headers(outcome)
+    if status is not None:
+        if not idempotent:
+            return is_rate_limit(outcome), _retry_after(headers)
+        return status in RETRYABLE_STATUS or is_rate_limit(outcome), _retry_after(headers)
+    if isinstance(outcome, BaseException):
+        if not idempotent:
+            return is_rate_limit(outcome) or is_connect_error(outcome), None
+        return type(outcome).__name__ in _RETRYABLE_NAMES, None
+    return False, None
+
+
+class TokenBucket:
+    """``rate`` tokens per ``per`` seconds, bursting up to ``rate``. Thread-safe."""
+
+    def __init__(self, rate, per=1.0):
+        self.capacity = float(rate)
+        self.fill_rate = rate / per
+        self._tokens = float(rate)
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one token, sleeping until one is available. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.fill_rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.fill_rate
+            time.sleep(delay)
+            waited += delay
+
+
+class ServiceLimiter:
+    """Rate limit + concurrency cap + retry policy for one service."""
+
+    def __init__(self, name, rate, per=1.0, concurrency=4, max_retries=4, base_delay=1.0, max_delay=30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, per)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.metrics = {
+            "calls": 0, "retries": 0, "rate_limited": 0, "failures": 0,
+            "throttled": 0, "throttle_seconds": 0.0, "queue_seconds": 0.0, "backoff_seconds": 0.0,
+            "peak_in_flight": 0,
+        }
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self.metrics[key] = self.metrics[key] + value
+
+    @contextlib.contextmanager
+    def _slot(self):
+        queued = time.perf_counter()
+        with self._slots:
+            waited = self.bucket.acquire()
+            with self._lock:
+                self.metrics["calls"] += 1
+                self.metrics["queue_seconds"] += time.perf_counter() - queued - waited
+                if waited:
+                    self.metrics["throttled"] += 1
+                    self.metrics["throttle_seconds"] += waited
+                self._in_flight += 1
+                self.metrics["peak_in_flight"] = max(self.metrics["peak_in_flight"], self._in_flight)
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Full jitter: uniform in [0, base * 2**attempt], capped; never shorter than Retry-After."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, min(retry_after, self.max_delay * 4)) if retry_after else delay
+
+    def call(self, fn, *args, **kwargs):
+        """Runs ``fn(*args, **kwargs)`` under the limits, retrying retryable failures.
+
+        A retryable HTTP response (e.g. a requests 429) is retried too; the
+        last one is returned as-is so callers keep their status handling.
+        """
+        return self._call(fn, args, kwargs, idempotent=True)
+
+    def call_write(self, fn, *args, **kwargs):
+        """``call`` for a non-idempotent write: retried only on rate limits and failed connects, never on 5xx/read timeouts."""
+        return self._call(fn, args, kwargs, idempotent=False)
+
+    def _call(self, fn, args, kwargs, idempotent):
+        max_retries = 0 if not idempotent and getattr(_local, "single_attempt_writes", False) else self.max_retries
+        for attempt in range(max_retries + 1):
+            with self._slot():
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    outcome = e
+                    retryable, retry_after = classify(e, idempotent)
+                    if not retryable:
+                        raise
+                    if attempt == max_retries:
+                        self._count(failures=1)
+                        raise RateLimitedError(
+                            f"{self.name} is busy or rate limiting requests; gave up after "
+                            f"{attempt + 1} attempts ({e})") from e
+                else:
+                    outcome = result
+                    retryable, retry_after = classify(result, idempotent)
+                    if not retryable or attempt == max_retries:
+                        if retryable:
+                            self._count(failures=1)
+                        return result
+            delay = self.backoff_delay(attempt, retry_after)
+            self._count(retries=1, backoff_seconds=delay, rate_limited=int(is_rate_limit(outcome)))
+            time.sleep(delay)
+
+    def stream(self, fn, *args, **kwargs):
+        """For streaming calls: retries until the first item arrives, then yields the rest unguarded."""
+        def first():
+            iterator = iter(fn(*args, **kwargs))
+            return next(iterator, _END), iterator
+
+        head, iterator = self.call(first)
+        if head is _END:
+            return
+        yield head
+        yield from iterator
+
+    def stats(self):
+        with self._lock:
+            return {k: round(v, 3) if isinstance(v, float) else v for k, v in self.metrics.items()}
+
+
+_END = object()
+
+
+class ServiceLimits:
+    """Process-wide registry of limiters, one per service name."""
+
+    def __init__(self, limits=None, max_retries=4):
+        config = {**DEFAULT_LIMITS, **(limits or {})}
+        self.limiters = {name: ServiceLimiter(name, max_retries=max_retries, **opts) for name, opts in config.items()}
+
+    def __getitem__(self, name):
+        return self.limiters[name]
+
+    def call(self, name, fn, *args, **kwargs):
+        return self.limiters[name].call(fn, *args, **kwargs)
+
+    def call_write(self, name, fn, *args, **kwargs):
+        return self.limiters[name].call_write(fn, *args, **kwargs)
+
+    def stats(self):
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+
+def format_limit_stats(stats):
+    """'gemini 42 calls, 2 retries, throttled 3.1s · drive ...' for services that have been used."""
+    parts = []
+    for name, s in stats.items():
+        if not s["calls"]:
+            continue
+        line = f"{name} {s['calls']} calls"
+        if s["retries"]:
+            line += f", {s['retries']} retries"
+        if s["throttle_seconds"]:
+            line += f", throttled {s['throttle_seconds']:.1f}s"
+        if s["failures"]:
+            line += f", {s['failures']} gave up"
+        parts.append(line)
+    return " · ".join(parts)
+
+
+class RateLimitedModel:
+    """Wraps a ``GenerativeModel`` so ``generate_content`` goes through a limiter (put it inside ``CachedModel``)."""
+
+    def __init__(self, model, limiter):
+        self.model = model
+        self.limiter = limiter
+        self.model_name = getattr(model, "model_name", "gemini")
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        if stream:
+            return self.limiter.stream(self.model.generate_content, contents, stream=True, **kwargs)
+        return self.limiter.call(self.model.generate_content, contents, **kwargs)
+
+
+def limit_session(session, limiter):
+    """Routes every request of a ``requests.Session`` (or OAuth2Session) through ``limiter``; POST/PATCH as writes."""
+    request = session.request
+
+    def limited(method, url, **kwargs):
+        call = limiter.call if is_idempotent(method) else limiter.call_write
+        return call(request, method, url, **kwargs)
+    session.request = limited
+    return session
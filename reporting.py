@@ -0,0 +1,100 @@
+"""Progress reporting for the analysis pipeline.
+
+The same pipeline code runs either in the Streamlit script thread (report
+straight to widgets) or on a background worker (report into the job table),
+so pipeline functions take a reporter instead of calling ``st.*`` directly.
+"""
+import contextlib
+import time
+
+
+class StreamlitReporter:
+    """Renders pipeline progress with spinners, a progress bar and captions."""
+
+    # Streamed sections are redrawn at most this often (each redraw re-renders every section's markdown)
+    SECTIONS_INTERVAL = 0.5
+
+    def __init__(self):
+        import streamlit as st
+        self._st = st
+        self._bar = None
+        self._sections = None
+        self._sections_written = 0.0
+        self._section_names = set()
+
+    @contextlib.contextmanager
+    def stage(self, text):
+        with self._st.spinner(text):
+            yield
+
+    def progress(self, pct, text):
+        if self._bar is None:
+            self._bar = self._st.progress(0, text=text)
+        self._bar.progress(int(pct or 0), text=text)
+
+    def clear_progress(self):
+        if self._bar is not None:
+            self._bar.empty()
+            self._bar = None
+
+    def sections(self, sections, force=False):
+        """Live preview of the summary sections streamed so far; ``force`` (the final sections) always redraws."""
+        filled = {name for name, text in sections.items() if text}
+        now = time.monotonic()
+        if not force and filled == self._section_names and now - self._sections_written < self.SECTIONS_INTERVAL:
+            return
+        self._section_names = filled
+        self._sections_written = now
+        if self._sections is None:
+            self._sections = self._st.empty()
+        with self._sections.container():
+            for name, text in sections.items():
+                if text:
+                    self._st.markdown(f"**{name.replace('_', ' ').title()}**\n\n{text}")
+
+    def note(self, text):
+        self._st.caption(text)
+
+    def error(self, text):
+        self._st.error(text)
+
+
+class JobReporter:
+    """Writes pipeline progress into a background job's row (see jobs.JobContext)."""
+
+    # Streamed sections are written at most this often (each write is a SQLite commit)
+    SECTIONS_INTERVAL = 0.5
+
+    def __init__(self, job):
+        self.job = job
+        self.notes = []
+        self._sections_written = 0.0
+        self._section_names = set()
+
+    @contextlib.contextmanager
+    def stage(self, text):
+        self.job.update(stage=text, message="")
+        yield
+
+    def progress(self, pct, text):
+        self.job.update(progress=pct, message=text)
+
+    def clear_progress(self):
+        pass
+
+    def sections(self, sections, force=False):
+        filled = {name for name, text in sections.items() if text}
+        now = time.monotonic()
+        if not force and filled == self._section_names and now - self._sections_written < self.SECTIONS_INTERVAL:
+            return
+        self._section_names = filled
+        self._sections_written = now
+        self.job.update(partial=sections)
+
+    def note(self, text):
+        self.notes.append(text)
+        self.job.update(message=text)
+
+    def error(self, text):
+        self.notes.append(text)
+        self.job.update(message=text)
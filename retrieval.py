@@ -0,0 +1,149 @@
+"""Per-meeting passage retrieval for the Chat tab.
+
+Chat used to resend the whole transcript with every question, so each turn
+paid the full input-token cost (and prefill latency) of a long meeting. The
+transcript is now split into speaker-turn passages once, indexed with BM25,
+and each question only carries the top-k passages plus the meeting notes.
+
+``ChatTurnMetrics`` records time-to-first-token and token counts per turn so
+retrieval and full-transcript turns can be compared from the metrics log.
+"""
+import collections
+import heapq
+import json
+import math
+import os
+import re
+import time
+
+from summarization import chunk_turns, estimate_tokens, split_turns
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset(
+    "a about an and are as at be been but by can could did do does for from had has have he her him his how i if "
+    "in into is it its just me my no not of on or our she so than that the their them then there these they this "
+    "to up us was we were what when where which who why will with would you your yeah okay ok um uh like".split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a list of passages, with an inverted index so queries only touch matching passages."""
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.passages = list(passages)
+        self.k1, self.b = k1, b
+        self._postings = collections.defaultdict(list)
+        self._lengths = []
+        for doc, passage in enumerate(self.passages):
+            counts = collections.Counter(tokenize(passage))
+            self._lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings[term].append((doc, tf))
+        n = len(self.passages)
+        self._avg_len = (sum(self._lengths) / n) if n else 1.0
+        self._idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self._postings.items()}
+
+    @classmethod
+    def from_transcript(cls, full_transcript, passage_tokens=300):
+        """Passages are runs of whole speaker turns, about ``passage_tokens`` long."""
+        return cls(chunk_turns(split_turns(full_transcript), passage_tokens))
+
+    def __len__(self):
+        return len(self.passages)
+
+    def search(self, query, k=6):
+        """Returns [(passage_index, score), ...] best first; empty when nothing matches."""
+        scores = collections.defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc, tf in self._postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc] / self._avg_len)
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def context_for(self, query, k=6):
+        """Top-k passages for ``query`` joined in meeting order (so the model reads them chronologically)."""
+        hits = sorted(doc for doc, _ in self.search(query, k))
+        return "\n\n[...]\n\n".join(self.passages[doc] for doc in hits)
+
+
+class ChatTurnMetrics:
+    """Time-to-first-token and token usage for one chat turn.
+
+    Token counts come from Gemini's ``usage_metadata`` when the response
+    carries it, otherwise from the ``estimate_tokens`` heuristic.
+    """
+
+    def __init__(self, mode, prompt):
+        self.mode = mode
+        self.prompt_tokens = estimate_tokens(prompt)
+        self.output_tokens = 0
+        self.usage_reported = False
+        self.cached = False
+        self._started = time.perf_counter()
+        self.ttft = None
+        self.total = None
+
+    def _observe_usage(self, response):
+        self.cached = self.cached or getattr(response, "from_cache", False)
+        usage = getattr(response, "usage_metadata", None)
+        if usage and getattr(usage, "prompt_token_count", 0):
+            self.prompt_tokens = usage.prompt_token_count
+            self.output_tokens = getattr(usage, "candidates_token_count", 0) or self.output_tokens
+            self.usage_reported = True
+
+    def stream(self, chunks):
+        """Wraps a streaming ``generate_content`` iterator, yielding text and timing the first piece."""
+        text_parts = []
+        for chunk in chunks:
+            self._observe_usage(chunk)
+            if not chunk.parts:
+                continue
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - self._started
+            text_parts.append(chunk.text)
+            yield chunk.text
+        self.total = time.perf_counter() - self._started
+        if not self.usage_reported:
+            self.output_tokens = estimate_tokens("".join(text_parts))
+
+    def observe(self, response):
+        """For non-streaming calls: the first token arrives with the whole response."""
+        self.total = self.ttft = time.perf_counter() - self._started
+        self._observe_usage(response)
+        if not self.usage_reported:
+            self.output_tokens = estimate_tokens(response.text)
+        return response.text
+
+    def as_dict(self):
+        return {
+            "mode": self.mode,
+            "ttft_seconds": round(self.ttft or 0.0, 3),
+            "total_seconds": round(self.total or 0.0, 3),
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "cached": self.cached,
+        }
+
+    def caption(self):
+        mode = f"{self.mode} (cached)" if self.cached else self.mode
+        return (f"{mode} · first token {self.ttft or 0:.1f}s · "
+                f"{self.prompt_tokens:,} prompt / {self.output_tokens:,} output tokens")
+
+
+def record_chat_metrics(log_path, metrics):
+    """Appends one JSON line per chat turn; summarise with benchmarks/bench_chat_retrieval.py --log."""
+    if not log_path:
+        return
+    try:
+        os.makedirs(os.path.dirname(log_path) or ".", exist_ok=True)
+        with open(log_path, "a", encoding="utf-8") as fh:
+            fh.write(json.dumps({"ts": time.time(), **metrics.as_dict()}) + "\n")
+    except OSError:
+        pass
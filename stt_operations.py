@@ -0,0 +1,127 @@
+"""Tracking for in-flight Speech-to-Text operations.
+
+``long_running_recognize`` keeps running (and billing) on Google's side even
+if the Streamlit session that started it reruns or the browser refreshes.
+The tracker records each operation's name on disk so the UI can reattach to
+it later instead of starting the same transcription again.
+
+A segmented run (see transcription) starts one operation per segment. Those
+are registered with their ``segment`` index and the recording's transcript
+``cache_key``. They stay registered until the whole run has been stitched,
+finished ones included: Google keeps a finished operation's result, so
+analysing the same recording again reattaches to every segment already paid
+for and submits only the rest.
+"""
+import json
+import os
+import threading
+import time
+
+# Speech-to-Text typically finishes well under real time; used only to pace
+# polling before the API reports any progress.
+EXPECTED_REALTIME_FACTOR = 0.5
+MIN_POLL_SEC = 2.0
+MAX_POLL_SEC = 30.0
+STALE_AFTER_SEC = 24 * 3600
+
+
+def next_poll_delay(elapsed, audio_duration, progress_percent):
+    """Seconds to wait before the next ``operation.done()`` check.
+
+    Aims for roughly ten polls over the expected remaining time: short clips
+    are checked every couple of seconds, multi-hour recordings back off to
+    ``MAX_POLL_SEC``. Once the API reports progress the estimate comes from
+    the observed rate rather than the audio length.
+    """
+    if progress_percent and progress_percent > 0:
+        remaining = elapsed * (100 - progress_percent) / progress_percent
+    else:
+        remaining = max(audio_duration * EXPECTED_REALTIME_FACTOR - elapsed, 0)
+    return min(max(remaining / 10.0, MIN_POLL_SEC), MAX_POLL_SEC)
+
+
+def wait_for_operation(operation, audio_duration, on_progress=None, timeout=3600, sleep=time.sleep):
+    """Polls ``operation`` with adaptive backoff until done; returns its result."""
+    started = time.monotonic()
+    while not operation.done():
+        elapsed = time.monotonic() - started
+        if elapsed > timeout:
+            raise TimeoutError(f"Transcription did not finish within {timeout}s.")
+        metadata = operation.metadata
+        progress = metadata.progress_percent if metadata else 0
+        if on_progress:
+            on_progress(progress)
+        sleep(next_poll_delay(elapsed, audio_duration, progress))
+    return operation.result(timeout=timeout)
+
+
+def reattach_operation(speech_client, operation_name):
+    """Rebuilds a pollable Operation future from its name (e.g. after a browser refresh)."""
+    from google.api_core import operation as ga_operation
+    from google.cloud import speech
+
+    operations_client = speech_client.transport.operations_client
+    proto = operations_client.get_operation(operation_name)
+    return ga_operation.from_gapic(
+        proto, operations_client, speech.LongRunningRecognizeResponse,
+        metadata_type=speech.LongRunningRecognizeMetadata,
+    )
+
+
+class OperationTracker:
+    """JSON file of in-flight operations: ``{name: {owner, file_name, started, ...}}``."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, ops):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(ops, fh)
+        os.replace(tmp, self.path)
+
+    def register(self, name, **info):
+        with self._lock:
+            ops = self._load()
+            ops[name] = {**info, "started": time.time()}
+            self._save(ops)
+
+    def finish(self, name):
+        with self._lock:
+            ops = self._load()
+            if ops.pop(name, None) is not None:
+                self._save(ops)
+
+    def get(self, name, owner):
+        """The operation's info if ``owner`` registered it, else None: resuming writes its transcript into the caller's session."""
+        info = self._load().get(name)
+        return info if info and owner and info.get("owner") == owner else None
+
+    def segment_operations(self, owner, cache_key):
+        """``owner``'s tracked segment operations for one recording, ``{segment index: (name, info)}``."""
+        if not cache_key:
+            return {}
+        return {info["segment"]: (name, info) for name, info in self.pending(owner)
+                if info.get("segment") is not None and info.get("cache_key") == cache_key}
+
+    def pending(self, owner):
+        """``owner``'s in-flight operations (newest first), dropping entries too old to still matter."""
+        with self._lock:
+            ops = self._load()
+            now = time.time()
+            stale = [n for n, info in ops.items() if now - info.get("started", 0) > STALE_AFTER_SEC]
+            for n in stale:
+                ops.pop(n)
+            if stale:
+                self._save(ops)
+        items = [(n, info) for n, info in ops.items() if owner and info.get("owner") == owner]
+        return sorted(items, key=lambda item: item[1].get("started", 0), reverse=True)
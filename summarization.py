@@ -0,0 +1,238 @@
+"""Map-reduce summarisation for transcripts too long for one prompt.
+
+A multi-hour workshop in a single ``generate_content`` call is slow and
+tends to come back truncated. Instead the transcript is cut at speaker-turn
+boundaries into chunks that fit ``max_chunk_tokens``, each chunk is turned
+into partial notes concurrently (map), and the partial notes are fed
+through the app's normal summary prompt in place of the transcript
+(reduce). The final response therefore has exactly the section headers the
+app's parser already expects. Short transcripts skip the map step and cost
+a single call, as before.
+
+The final call can also be streamed: ``SectionStreamParser`` splits the
+text into the prompt's ``## SECTION ##`` blocks as it arrives, so the
+Review tab fills in section by section instead of waiting for the whole
+response.
+"""
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Rough English average for Gemini/SentencePiece tokenisers; only used for budgeting
+CHARS_PER_TOKEN = 4
+
+_TURN_START = re.compile(r"(?=^Speaker \d+:)", re.MULTILINE)
+
+MAP_PROMPT = """You are taking notes on part {index} of {total} of a long meeting transcript.
+Participants context:
+{participants}
+
+Write compact notes for THIS PART ONLY, keeping names, numbers and dates exact:
+- Key discussion points, keeping the "Speaker N" labels exactly as they appear.
+- Decisions made.
+- Action items with owner and deadline if mentioned.
+- Any specific requests made by the Client.
+
+Transcript part {index}/{total}:
+{chunk}
+"""
+
+COLLAPSE_PROMPT = """Merge these consecutive partial meeting notes into one set of compact notes.
+Keep every decision, action item (with owner/deadline) and client request; drop repetition.
+
+{notes}
+"""
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_turns(full_transcript):
+    """Splits "Speaker N: ..." text into one string per speaker turn (blank lines stripped)."""
+    return [t.strip() for t in _TURN_START.split(full_transcript) if t.strip()]
+
+
+def _split_long_turn(turn, max_tokens):
+    """A single monologue over budget is cut at word boundaries, repeating its speaker label."""
+    label, sep, body = turn.partition(": ")
+    prefix = f"{label}{sep}" if sep and label.startswith("Speaker ") else ""
+    if not prefix:
+        body = turn
+    budget_chars = max(max_tokens * CHARS_PER_TOKEN - len(prefix), 1)
+    pieces, current, size = [], [], 0
+    for word in body.split(" "):
+        if current and size + len(word) + 1 > budget_chars:
+            pieces.append(prefix + " ".join(current))
+            current, size = [], 0
+        current.append(word)
+        size += len(word) + 1
+    if current:
+        pieces.append(prefix + " ".join(current))
+    return pieces
+
+
+def chunk_turns(turns, max_tokens):
+    """Greedily packs whole turns into chunks of at most ``max_tokens`` (estimated)."""
+    chunks, current, size = [], [], 0
+    for turn in turns:
+        cost = estimate_tokens(turn)
+        if cost > max_tokens:
+            parts = _split_long_turn(turn, max_tokens)
+        else:
+            parts = [turn]
+        for part in parts:
+            cost = estimate_tokens(part)
+            if current and size + cost > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(part)
+            size += cost
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+class SectionStreamParser:
+    """Incrementally splits streamed text on ``## NAME ##`` headers.
+
+    ``sections`` maps result keys to header names, e.g.
+    ``{"overview": "OVERVIEW", "next_steps": "NEXT STEPS"}``. Headers match
+    like the apps' final regexes (``##\\s*NEXT STEPS\\s*##``, any case).
+    Only text after the last completed header is rescanned on each
+    ``feed``, and a header still being typed at the end of the stream is
+    held back rather than shown as section content.
+    """
+
+    # Longest header (with generous whitespace) that can straddle two chunks
+    HOLDBACK = 64
+    _PARTIAL_HEADER = re.compile(r"^[ \t]*#{1,2}[^\n]*\Z", re.MULTILINE)
+
+    def __init__(self, sections):
+        self._header = re.compile(
+            "|".join(f"(?P<{key}>##\\s*{re.escape(name)}\\s*##)" for key, name in sections.items()),
+            re.IGNORECASE,
+        )
+        self.sections = {key: "" for key in sections}
+        self.current = None
+        self._text = ""
+        self._body_start = 0
+        self._scan_from = 0
+
+    def feed(self, piece):
+        """Adds streamed text; returns the sections filled so far (the open one may still grow)."""
+        self._text += piece
+        while True:
+            match = self._header.search(self._text, self._scan_from)
+            if not match:
+                break
+            if self.current:
+                self.sections[self.current] = self._text[self._body_start:match.start()].strip()
+            self.current = match.lastgroup
+            self._body_start = self._scan_from = match.end()
+        self._scan_from = max(self._scan_from, len(self._text) - self.HOLDBACK)
+        if self.current:
+            body = self._text[self._body_start:]
+            tail = self._PARTIAL_HEADER.search(body, max(len(body) - self.HOLDBACK, 0))
+            self.sections[self.current] = (body[:tail.start()] if tail else body).strip()
+        return dict(self.sections)
+
+    def close(self):
+        """Sections once the stream has ended (nothing is held back any more)."""
+        if self.current:
+            self.sections[self.current] = self._text[self._body_start:].strip()
+        return dict(self.sections)
+
+
+def parse_sections(text, sections):
+    """Splits a complete response with the same header rules as ``SectionStreamParser``."""
+    parser = SectionStreamParser(sections)
+    parser.feed(text)
+    return parser.close()
+
+
+class MapReduceSummarizer:
+    """Runs ``generate(prompt) -> str`` over token-budgeted chunks of a transcript.
+
+    ``final_prompt(content)`` builds the app's own summary prompt around
+    either the whole transcript or the merged partial notes, so the output
+    format is whatever that prompt asks for.
+
+    With ``stream(prompt) -> iterator of str``, the final call is streamed
+    and each piece is passed to ``summarize``'s ``on_text`` callback.
+    """
+
+    def __init__(self, generate, max_chunk_tokens=60000, max_workers=4, stream=None):
+        self.generate = generate
+        self.max_chunk_tokens = max_chunk_tokens
+        self.max_workers = max_workers
+        self.stream = stream
+
+    def _timed(self, prompt):
+        started = time.perf_counter()
+        text = self.generate(prompt)
+        return text, round(time.perf_counter() - started, 3)
+
+    def _final(self, prompt, on_text, stats):
+        """The summary call itself, streamed when possible. Records reduce (and first-text) latency."""
+        if not (self.stream and on_text):
+            text, stats["reduce_seconds"] = self._timed(prompt)
+            return text
+        started = time.perf_counter()
+        pieces = []
+        for piece in self.stream(prompt):
+            if not pieces:
+                stats["first_text_seconds"] = round(time.perf_counter() - started, 3)
+            pieces.append(piece)
+            on_text(piece)
+        stats["reduce_seconds"] = round(time.perf_counter() - started, 3)
+        return "".join(pieces)
+
+    def _map(self, prompts):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(self._timed, prompts))
+
+    def summarize(self, full_transcript, participants_context, final_prompt, on_text=None):
+        """Returns (response_text, stats). ``stats["chunks"]`` has per-chunk tokens and latency."""
+        started = time.perf_counter()
+        chunks = chunk_turns(split_turns(full_transcript), self.max_chunk_tokens)
+        stats = {"mode": "single", "chunks": [], "collapse_rounds": 0}
+
+        if len(chunks) <= 1:
+            text = self._final(final_prompt(full_transcript), on_text, stats)
+            stats["wall_seconds"] = round(time.perf_counter() - started, 3)
+            return text, stats
+
+        stats["mode"] = "map_reduce"
+        prompts = [MAP_PROMPT.format(index=i + 1, total=len(chunks), participants=participants_context, chunk=c)
+                   for i, c in enumerate(chunks)]
+        map_started = time.perf_counter()
+        results = self._map(prompts)
+        stats["map_wall_seconds"] = round(time.perf_counter() - map_started, 3)
+        stats["chunks"] = [{"tokens": estimate_tokens(c), "seconds": s} for c, (_, s) in zip(chunks, results)]
+        notes = [f"### Part {i + 1} of {len(chunks)}\n{text.strip()}" for i, (text, _) in enumerate(results)]
+
+        # If the partial notes themselves are over budget, merge neighbours until they fit
+        while estimate_tokens("\n\n".join(notes)) > self.max_chunk_tokens and len(notes) > 1:
+            groups = chunk_turns(notes, self.max_chunk_tokens)
+            if len(groups) >= len(notes):
+                groups = ["\n\n".join(notes[i:i + 2]) for i in range(0, len(notes), 2)]
+            merged = self._map([COLLAPSE_PROMPT.format(notes=g) for g in groups])
+            notes = [text.strip() for text, _ in merged]
+            stats["collapse_rounds"] += 1
+
+        content = "Notes compiled from consecutive parts of the meeting, in order:\n\n" + "\n\n".join(notes)
+        text = self._final(final_prompt(content), on_text, stats)
+        stats["wall_seconds"] = round(time.perf_counter() - started, 3)
+        return text, stats
+
+
+def format_summary_stats(stats):
+    """One-line summary of a ``summarize`` run, for captions and job messages."""
+    first = f" (first section after {stats['first_text_seconds']:.1f}s)" if "first_text_seconds" in stats else ""
+    if stats.get("mode") != "map_reduce":
+        return f"Single-pass summary in {stats.get('wall_seconds', 0):.1f}s{first}"
+    secs = sorted(c["seconds"] for c in stats["chunks"])
+    return (f"Summarised {len(secs)} chunks in {stats['map_wall_seconds']:.1f}s "
+            f"(per chunk {secs[0]:.1f}-{secs[-1]:.1f}s, median {secs[len(secs) // 2]:.1f}s); "
+            f"merge {stats['reduce_seconds']:.1f}s{first}; total {stats['wall_seconds']:.1f}s")
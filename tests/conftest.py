@@ -0,0 +1,63 @@
+"""Shared setup, and local stand-ins for the cloud services the tests exercise logic against."""
+import os
+import sys
+import time
+
+# The app's modules live at the repository root, next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from summarization import split_turns  # noqa: E402  (needs the path above)
+
+
+class ReplayRecognizer:
+    """Local stand-in for Speech-to-Text, for exercising the split/stitch logic.
+
+    Replays a known word list: each call returns the words inside the
+    requested window, shifted to segment-relative time, with speaker tags
+    renumbered in order of first appearance (as a real per-segment
+    diarization would).
+    """
+
+    def __init__(self, words):
+        self.words = sorted(words, key=lambda w: w.start)
+
+    def __call__(self, index, start, length):
+        local, out = {}, []
+        for w in self.words:
+            if start <= w.start < start + length:
+                tag = local.setdefault(w.speaker, len(local) + 1)
+                out.append(w._replace(start=w.start - start, end=w.end - start, speaker=tag))
+        return out
+
+
+class FakeModel:
+    """Local stand-in for Gemini, for exercising chunking and merging without an API key.
+
+    Map/collapse prompts get back a bullet per speaker turn they saw; any
+    other prompt (the app's final summary prompt) gets a response in the
+    ``## OVERVIEW ## / ## DISCUSSION ## / ## NEXT STEPS ##`` format with
+    the content's bullets under DISCUSSION. ``latency`` simulates a slow call;
+    ``stream`` yields the same response a few characters at a time.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        if prompt.startswith("You are taking notes on part"):
+            body = prompt.split("Transcript part", 1)[1]
+            return "\n".join(f"- {turn[:60]}" for turn in split_turns(body.split("\n", 1)[1]))
+        if prompt.startswith("Merge these consecutive"):
+            return "\n".join(line for line in prompt.splitlines() if line.startswith("- "))
+        bullets = [line for line in prompt.splitlines() if line.strip().startswith("- ")]
+        return ("## OVERVIEW ##\nFake overview.\n\n## DISCUSSION ##\n" + "\n".join(bullets)
+                + "\n\n## NEXT STEPS ##\n* **Action:** Review (Assigned to: Team)")
+
+    def stream(self, prompt, piece_chars=7):
+        text = self(prompt)
+        for i in range(0, len(text), piece_chars):
+            yield text[i:i + piece_chars]
@@ -0,0 +1,86 @@
+"""ManifestStore against an in-memory stand-in for a Meeting_Data DriveFolder."""
+import itertools
+import json
+
+from meeting_manifest import MANIFEST_NAME, ManifestStore
+from meeting_storage import is_meeting_file
+
+
+class MemoryFolder:
+    """The ``DriveFolder`` calls the manifest makes, over a dict; every write bumps the file's version."""
+
+    folder_id = "meeting-data"
+
+    def __init__(self):
+        self.files = {}
+        self._ids = itertools.count(1)
+
+    def save(self, name, data, created="2026-03-02T09:00:00.000Z"):
+        file_id = f"f{next(self._ids)}"
+        self.files[file_id] = {"name": name, "data": data, "version": 1, "createdTime": created, "modifiedTime": created}
+        return file_id
+
+    def find(self, name):
+        for file_id, f in self.files.items():
+            if f["name"] == name:
+                return {"id": file_id, "version": f["version"]}
+        return None
+
+    def version(self, file_id):
+        return self.files[file_id]["version"]
+
+    def read_json(self, file_id):
+        return json.loads(json.dumps(self.files[file_id]["data"]))
+
+    def create(self, name, payload):
+        file_id = self.save(name, json.loads(payload))
+        return {"id": file_id, "version": 1}
+
+    def update(self, file_id, payload):
+        f = self.files[file_id]
+        f["data"], f["version"] = json.loads(payload), f["version"] + 1
+        return {"id": file_id, "version": f["version"]}
+
+    def list_json(self, modified_after=None):
+        return [{"id": i, "name": f["name"], "createdTime": f["createdTime"], "size": "10"}
+                for i, f in self.files.items() if is_meeting_file(f["name"])]
+
+
+def record(title):
+    return {"detected_title": title, "participants": "Ana", "ai_results": {"overview": f"{title} overview"}}
+
+
+def entry(file_id, title):
+    return {"id": file_id, "name": f"Data_{title}.json", "title": title, "meeting_date": "2026-03-02",
+            "created": "2026-03-02T09:00:00.000Z", "participants": "", "size": None, "chat_turns": 0, "previews": {}}
+
+
+def test_lost_manifest_is_rebuilt_from_the_folder():
+    folder = MemoryFolder()
+    first = folder.save("Data_kickoff.json", record("Kickoff"))
+    second = folder.save("Data_review.json.gz", record("Review"))
+
+    entries = ManifestStore().entries(folder)
+    assert {e["id"]: e["title"] for e in entries} == {first: "Kickoff", second: "Review"}
+    manifest = folder.find(MANIFEST_NAME)
+    assert set(folder.read_json(manifest["id"])["entries"]) == {first, second}
+
+    # Lost (or corrupt): the next reader starts over from the folder
+    folder.files[manifest["id"]]["data"] = {"garbage": True}
+    folder.files[manifest["id"]]["version"] += 1
+    assert {e["id"] for e in ManifestStore().entries(folder)} == {first, second}
+
+
+def test_write_reapplied_over_a_concurrent_writer():
+    folder = MemoryFolder()
+    ours, theirs = ManifestStore(), ManifestStore()
+    ours.add(folder, entry("a", "Alpha"))
+    theirs.add(folder, entry("b", "Beta"))
+
+    # ``ours`` still holds version 1: it must pick up Beta rather than overwrite it
+    ours.add(folder, entry("c", "Gamma"))
+    manifest = folder.read_json(folder.find(MANIFEST_NAME)["id"])
+    assert set(manifest["entries"]) == {"a", "b", "c"}
+
+    theirs.remove(folder, "a")
+    assert {e["id"] for e in ManifestStore().entries(folder, reconcile=False)} == {"b", "c"}
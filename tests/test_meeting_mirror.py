@@ -0,0 +1,158 @@
+"""MeetingMirror.sync against LocalSource (a directory standing in for Meeting_Data)."""
+import datetime
+import os
+
+import pytest
+
+from meeting_mirror import SYNC_SLACK, LocalSource, MeetingMirror
+from meeting_storage import chat_delta_name, encode, split_analysis
+
+T0 = datetime.datetime(2026, 3, 2, 9, 0, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def record(title, chat=()):
+    return {"detected_title": title, "participants": "Ana\nBo", "chat_history": list(chat),
+            "ai_results": {"overview": f"{title} overview", "discussion": "Homepage layout"}}
+
+
+def write(directory, name, payload, at):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as fh:
+        fh.write(encode(payload))
+    os.utime(path, (at, at))
+    return name
+
+
+@pytest.fixture
+def folder(tmp_path):
+    directory = tmp_path / "Meeting_Data"
+    directory.mkdir()
+    return str(directory)
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    return MeetingMirror(str(tmp_path / "mirror.sqlite3"))
+
+
+def ids(mirror):
+    return {e["id"] for e in mirror.entries()}
+
+
+def test_incremental_sync_uses_cursor_with_slack(folder, mirror):
+    source = LocalSource(folder)
+    first = write(folder, "Data_kickoff.json", record("Kickoff"), T0)
+    assert mirror.sync(source, full=True)["copied"] == 1
+
+    # Modified before the cursor but within the slack (listing lag): still picked up
+    lagged = write(folder, "Data_lagged.json", record("Lagged"), T0 - SYNC_SLACK.total_seconds() / 2)
+    # Older than cursor - slack: an incremental sync doesn't list it
+    stale = write(folder, "Data_stale.json", record("Stale"), T0 - 2 * SYNC_SLACK.total_seconds())
+    result = mirror.sync(source, full=False)
+    assert result["copied"] == 1  # the unchanged record is listed but not downloaded again
+    assert result["listed"] == 2
+    assert ids(mirror) == {first, lagged}
+
+    assert mirror.sync(source, full=True)["copied"] == 1
+    assert ids(mirror) == {first, lagged, stale}
+
+
+def test_changed_record_is_copied_again(folder, mirror):
+    source = LocalSource(folder)
+    name = write(folder, "Data_review.json", record("Review"), T0)
+    mirror.sync(source, full=True)
+
+    write(folder, name, record("Review (edited)"), T0 + 60)
+    assert mirror.sync(source, full=False)["copied"] == 1
+    assert [e["title"] for e in mirror.entries()] == ["Review (edited)"]
+    assert mirror.entries("edited")[0]["id"] == name
+
+
+def test_sync_picks_up_chat_deltas(folder, mirror):
+    source = LocalSource(folder)
+    name = write(folder, "Data_sprint.json", record("Sprint", chat=[{"role": "user", "content": "hi"}]), T0)
+    mirror.sync(source, full=True)
+    assert mirror.entries()[0]["chat_turns"] == 1
+
+    turns = [{"role": "user", "content": "Deadline?"}, {"role": "assistant", "content": "Friday"}]
+    write(folder, chat_delta_name(name, 1), {"seq": 1, "turns": turns}, T0 + 60)
+    result = mirror.sync(source, full=False)
+    assert result["copied"] == 0  # a delta doesn't touch the record itself
+    assert result["chats"] == 1
+    assert mirror.chat(name) == turns
+    assert mirror.entries()[0]["chat_turns"] == 3
+
+    more = [{"role": "user", "content": "Owner?"}]
+    write(folder, chat_delta_name(name, 2), {"seq": 2, "turns": more}, T0 + 120)
+    mirror.sync(source, full=False)
+    assert mirror.chat(name) == turns + more
+    assert mirror.entries()[0]["chat_turns"] == 4
+
+
+def test_full_sync_removes_deleted_records(folder, mirror):
+    source = LocalSource(folder)
+    kept = write(folder, "Data_kept.json", record("Kept"), T0)
+    gone = write(folder, "Data_gone.json", record("Gone"), T0 + 1)
+    write(folder, chat_delta_name(gone, 1), {"seq": 1, "turns": [{"role": "user", "content": "x"}]}, T0 + 2)
+    mirror.sync(source, full=True)
+    assert ids(mirror) == {kept, gone}
+
+    os.remove(os.path.join(folder, gone))
+    # A modifiedTime listing can't see deletions
+    assert mirror.sync(source, full=False)["removed"] == 0
+    assert ids(mirror) == {kept, gone}
+
+    assert mirror.sync(source, full=True)["removed"] == 1
+    assert ids(mirror) == {kept}
+    assert mirror.get(gone) is None
+    assert mirror.chat(gone) == []
+
+
+def test_sync_copies_meta_parts_and_fills_transcripts_later(folder, mirror):
+    data = record("Split")
+    data["ai_results"]["full_transcript"] = "Ana: the homepage"
+    meta, heavy = split_analysis(data)
+    meta["parts"] = {"transcript": {"id": "Data_split.transcript.json.gz", "name": "Data_split.transcript.json.gz"}}
+    write(folder, "Data_split.transcript.json.gz", heavy, T0)
+    name = write(folder, "Data_split.json.gz", meta, T0)
+    source = LocalSource(folder)
+    read = []
+    transcript = source.transcript
+    source.transcript = lambda m: read.append(m) or transcript(m)
+
+    assert mirror.sync(source, full=True)["copied"] == 1
+    assert not read  # History rendered from the meta part alone
+    assert [e["title"] for e in mirror.entries()] == ["Split"]
+    assert "full_transcript" not in mirror.get(name)["ai_results"]
+
+    assert mirror.fill_transcripts(source) == 1
+    assert mirror.get(name)["ai_results"]["full_transcript"] == "Ana: the homepage"
+    assert mirror.fill_transcripts(source) == 0
+    assert len(read) == 1
+
+
+def test_get_fetches_a_missing_transcript_from_the_source(folder, mirror):
+    data = record("Lazy")
+    data["ai_results"]["full_transcript"] = "Bo: Friday"
+    meta, heavy = split_analysis(data)
+    meta["parts"] = {"transcript": {"id": "Data_lazy.transcript.json.gz", "name": "Data_lazy.transcript.json.gz"}}
+    write(folder, "Data_lazy.transcript.json.gz", heavy, T0)
+    name = write(folder, "Data_lazy.json.gz", meta, T0)
+    source = LocalSource(folder)
+    mirror.sync(source, full=True)
+
+    assert mirror.get(name, source=source)["ai_results"]["full_transcript"] == "Bo: Friday"
+    assert mirror.fill_transcripts(source) == 0  # kept by get
+
+
+def test_seeded_entries_list_until_sync_copies_the_records(folder, mirror):
+    name = write(folder, "Data_seeded.json", record("Seeded"), T0)
+    seeded = {"id": name, "name": name, "title": "Seeded", "meeting_date": "2026-03-02", "created": "2026-03-02T09:00:00Z",
+              "participants": "Ana\nBo", "size": None, "chat_turns": 0, "previews": {"overview": "Seeded overview"}}
+    assert mirror.seed([seeded]) == 1
+    assert mirror.seed([seeded]) == 0
+    assert mirror.entries("seeded")[0]["id"] == name
+    assert mirror.get(name) is None
+
+    assert mirror.sync(LocalSource(folder), full=False)["copied"] == 1
+    assert mirror.get(name)["detected_title"] == "Seeded"
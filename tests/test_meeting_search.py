@@ -0,0 +1,57 @@
+"""MeetingIndex: passages embedded off the save path, and how search reports the semantic ranking."""
+import threading
+
+import pytest
+
+from meeting_search import MeetingIndex
+
+
+def meeting(title, overview):
+    return {"detected_title": title, "date": "2026-03-02", "ai_results": {"overview": overview}}
+
+
+class GatedEmbedder:
+    """Vectors by keyword; document embeddings wait until ``release`` is set."""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def __call__(self, texts, task_type="retrieval_document"):
+        if task_type == "retrieval_document":
+            self.release.wait(5)
+        return [[1.0, 0.0] if "homepage" in t.lower() or "landing" in t.lower() else [0.0, 1.0] for t in texts]
+
+
+@pytest.fixture
+def embedder():
+    return GatedEmbedder()
+
+
+def test_add_meeting_does_not_wait_for_embeddings(tmp_path, embedder):
+    index = MeetingIndex(str(tmp_path / "index.sqlite3"), embedder)
+    index.add_meeting("m1", "Data_m1.json", meeting("Kickoff", "Client wants a new homepage"))
+    assert index.stats()["embedded"] == 0
+    assert index.search("homepage")[0]["file_id"] == "m1"  # full text finds it at once
+
+    embedder.release.set()
+    index.wait_for_embeddings()
+    assert index.stats()["embedded"] == index.stats()["passages"]
+
+
+def test_search_reports_semantic_status(tmp_path, embedder):
+    pytest.importorskip("numpy")
+    embedder.release.set()
+    assert MeetingIndex(str(tmp_path / "plain.sqlite3")).search("homepage").semantic == "off"
+
+    index = MeetingIndex(str(tmp_path / "index.sqlite3"), embedder, query_budget=5)
+    index.add_meeting("m1", "Data_m1.json", meeting("Kickoff", "Client wants a new landing page"))
+    index.wait_for_embeddings()
+    hits = index.search("homepage")
+    assert hits.semantic == "used"
+    assert hits[0]["file_id"] == "m1"  # no shared word: found by the vectors alone
+
+    slow = threading.Event()
+    late = MeetingIndex(str(tmp_path / "index.sqlite3"), lambda texts, task_type="": slow.wait(5) and [[1.0, 0.0]],
+                        query_budget=0.01)
+    assert late.search("kickoff").semantic == "late"
+    slow.set()
@@ -0,0 +1,114 @@
+"""Map-reduce summarisation through FakeModel, and SectionStreamParser on arbitrarily split streams."""
+import random
+
+import pytest
+
+from conftest import FakeModel
+from summarization import (MapReduceSummarizer, SectionStreamParser, chunk_turns, estimate_tokens, parse_sections,
+                           split_turns)
+
+SECTIONS = {"overview": "OVERVIEW", "discussion": "DISCUSSION", "next_steps": "NEXT STEPS"}
+
+
+def final_prompt(content):
+    return f"Summarise this meeting.\n## OVERVIEW ##\n## DISCUSSION ##\n## NEXT STEPS ##\n\n{content}"
+
+
+def transcript(turns=60):
+    return "".join(f"\n\nSpeaker {i % 3 + 1}: Topic {i} " + "detail " * 30 for i in range(turns))
+
+
+def test_short_transcript_is_a_single_call():
+    model = FakeModel()
+    text, stats = MapReduceSummarizer(model, max_chunk_tokens=60000).summarize(transcript(5), "Ana", final_prompt)
+    assert stats["mode"] == "single"
+    assert len(model.prompts) == 1
+    assert parse_sections(text, SECTIONS)["overview"] == "Fake overview."
+
+
+def test_map_reduce_covers_every_chunk():
+    model = FakeModel()
+    full = transcript()
+    text, stats = MapReduceSummarizer(model, max_chunk_tokens=1200, max_workers=3).summarize(full, "Ana", final_prompt)
+
+    chunks = chunk_turns(split_turns(full), 1200)
+    assert stats["mode"] == "map_reduce"
+    assert len(stats["chunks"]) == len(chunks) > 1
+    assert all(c["tokens"] <= 1200 for c in stats["chunks"])
+    map_prompts = [p for p in model.prompts if p.startswith("You are taking notes on part")]
+    assert len(map_prompts) == len(chunks)
+    # The final prompt got the notes instead of the transcript, and every turn survived the map step
+    assert "Notes compiled from consecutive parts" in model.prompts[-1]
+    discussion = parse_sections(text, SECTIONS)["discussion"]
+    assert all(f"Topic {i} " in discussion for i in range(60))
+
+
+def test_oversized_notes_are_collapsed():
+    model = FakeModel()
+    text, stats = MapReduceSummarizer(model, max_chunk_tokens=200).summarize(transcript(), "Ana", final_prompt)
+    assert stats["collapse_rounds"] >= 1
+    assert any(p.startswith("Merge these consecutive") for p in model.prompts)
+    assert parse_sections(text, SECTIONS)["next_steps"].startswith("* **Action:**")
+
+
+def test_streamed_final_call():
+    model = FakeModel()
+    pieces = []
+    summarizer = MapReduceSummarizer(model, max_chunk_tokens=1200, stream=model.stream)
+    text, stats = summarizer.summarize(transcript(), "Ana", final_prompt, on_text=pieces.append)
+    assert len(pieces) > 1 and "".join(pieces) == text
+    assert "first_text_seconds" in stats
+
+
+def test_long_monologue_is_split_with_its_label():
+    turn = "Speaker 2: " + "word " * 2000
+    parts = chunk_turns([turn], 300)
+    assert len(parts) > 1
+    assert all(p.startswith("Speaker 2: ") and estimate_tokens(p) <= 300 for p in parts)
+
+
+# --- SectionStreamParser ---
+
+# The NEXT STEPS header is padded to nearly HOLDBACK characters, so chunk boundaries land inside it
+WIDE_HEADER = "##" + " " * 20 + "next steps" + " " * 20 + "##"
+RESPONSE = ("## OVERVIEW ##\nKickoff for the redesign.\n\n"
+            "##DISCUSSION##\n- Homepage layout\n- # of pages: 12\n" + "- filler line\n" * 10 + "\n"
+            + WIDE_HEADER + "\n* **Action:** Send wireframes (Assigned to: Bo)\n")
+
+
+def check_stream(chunks):
+    parser = SectionStreamParser(SECTIONS)
+    final = parse_sections(RESPONSE, SECTIONS)
+    for piece in chunks:
+        partial = parser.feed(piece)
+        for key, value in partial.items():
+            # Never shows text that later disappears (e.g. a header still being typed)
+            assert final[key].startswith(value), (key, value)
+    assert parser.close() == final
+
+
+def test_parse_sections_matches_app_headers():
+    assert len(WIDE_HEADER) < SectionStreamParser.HOLDBACK
+    sections = parse_sections(RESPONSE, SECTIONS)
+    assert sections["overview"] == "Kickoff for the redesign."
+    assert sections["discussion"].startswith("- Homepage layout\n- # of pages: 12")
+    assert sections["next_steps"] == "* **Action:** Send wireframes (Assigned to: Bo)"
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_random_splits(seed):
+    rng = random.Random(seed)
+    chunks, i = [], 0
+    while i < len(RESPONSE):
+        size = rng.randint(1, 90)
+        chunks.append(RESPONSE[i:i + size])
+        i += size
+    check_stream(chunks)
+
+
+def test_every_split_inside_the_wide_header():
+    start = RESPONSE.index(WIDE_HEADER)
+    for cut in range(start, start + len(WIDE_HEADER) + 1):
+        check_stream([RESPONSE[:cut], RESPONSE[cut:]])
+        # ...and with the header arriving a character at a time after a long body chunk
+        check_stream([RESPONSE[:cut]] + list(RESPONSE[cut:start + len(WIDE_HEADER)]) + [RESPONSE[start + len(WIDE_HEADER):]])
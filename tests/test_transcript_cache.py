@@ -0,0 +1,32 @@
+"""TranscriptCache (and the DiskCache base it shares with GeminiCache)."""
+import json
+import os
+
+from transcript_cache import TranscriptCache
+
+
+def test_lru_eviction_by_bytes(tmp_path):
+    cache = TranscriptCache(str(tmp_path), max_bytes=300)
+    for i, key in enumerate("abc"):
+        cache.put(key, {"text": key * 80})
+        os.utime(tmp_path / f"{key}.json", (1000 + i, 1000 + i))
+    cache.get("a")  # touched: now the most recent
+    cache.put("d", {"text": "d" * 80})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"text": "a" * 80}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lookups_count_in_memory_until_flushed(tmp_path):
+    cache = TranscriptCache(str(tmp_path))
+    cache.put("k", {"text": "hello"})
+    stats_file = tmp_path / TranscriptCache.STATS_FILE
+    flushed = json.loads(stats_file.read_text())
+    cache.get("k")
+    cache.get("missing")
+    assert json.loads(stats_file.read_text()) == flushed  # no write on the lookup path
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    cache.put("k2", {"text": "again"})
+    assert json.loads(stats_file.read_text())["hits"] == 1
+    assert TranscriptCache(str(tmp_path)).stats()["misses"] == 1
@@ -0,0 +1,80 @@
+"""Segmented STT: overlapping segments through ReplayRecognizer, stitched back by transcribe_segments; the
+structured Transcript's saved form."""
+import json
+
+from meeting_storage import decode, encode, merge_transcript, split_analysis
+from conftest import ReplayRecognizer
+from transcription import Transcript, Word, plan_segments, stitch_segments, transcribe_segments
+
+
+def conversation(seconds=130, turn_words=4):
+    """One word a second; speakers 7 and 3 alternate every few words, 5 joins for the last stretch."""
+    words = []
+    for i in range(seconds):
+        if i >= seconds - 20:
+            speaker = 5 if (i // turn_words) % 2 else 7
+        else:
+            speaker = 7 if (i // turn_words) % 2 == 0 else 3
+        words.append(Word(f"w{i}", float(i), i + 0.6, speaker, 0.9))
+    return words
+
+
+def test_plan_segments_overlap():
+    segments = plan_segments(130, segment_sec=40, overlap_sec=10)
+    assert segments[0] == (0.0, 40.0)
+    for (start, length), (next_start, _) in zip(segments, segments[1:]):
+        assert start + length - next_start == 10
+    assert segments[-1][0] + segments[-1][1] == 130
+
+
+def test_overlaps_are_deduplicated_and_speakers_kept():
+    original = conversation()
+    segments = plan_segments(130, segment_sec=40, overlap_sec=10)
+    replay = ReplayRecognizer(original)
+    # Every segment numbers its own speakers from 1, so tags disagree across segments
+    assert replay(1, *segments[1])[0].speaker == 1 != replay(0, *segments[0])[4].speaker
+
+    words, timings = transcribe_segments(segments, replay, max_workers=3)
+
+    assert len(segments) > 2 and set(timings["segments"]) == set(range(len(segments)))
+    # Each overlap contributed its words once, in order, at their absolute times
+    assert [w.word for w in words] == [w.word for w in original]
+    assert [w.start for w in words] == [w.start for w in original]
+    # Speakers line up across every segment: one stitched tag per original speaker and vice versa
+    pairs = {(o.speaker, w.speaker) for o, w in zip(original, words)}
+    assert len(pairs) == len({o.speaker for o in original}) == len({tag for _, tag in pairs})
+
+
+def test_unmatched_speaker_becomes_new_tag():
+    first = [Word("hello", 0.0, 0.5, 1, 0.9), Word("there", 8.0, 8.5, 1, 0.9), Word("again", 9.0, 9.5, 1, 0.9)]
+    # Segment 2 starts at 8s: its speaker 1 is the same voice (matching words), speaker 2 is new
+    second = [Word("there", 8.05, 8.5, 1, 0.9), Word("again", 9.0, 9.5, 1, 0.9), Word("hi", 12.0, 12.4, 2, 0.9)]
+    words = stitch_segments([(0.0, 10.0, first), (8.0, 10.0, second)])
+    assert [(w.word, w.speaker) for w in words] == [("hello", 1), ("there", 1), ("again", 1), ("hi", 2)]
+
+
+def test_structured_transcript_round_trip():
+    words = conversation(30)
+    transcript = Transcript.from_words(words)
+    restored = Transcript.from_dict(json.loads(json.dumps(transcript.to_dict())))
+    assert restored.render() == transcript.render()
+    assert [(t.speaker, t.first, t.last) for t in restored.turns] == [(t.speaker, t.first, t.last) for t in transcript.turns]
+    for i, w in enumerate(words):
+        got = restored.word(i)
+        assert (got.word, got.speaker) == (w.word, w.speaker)
+        assert abs(got.start - w.start) < 1e-3 and abs(got.end - w.end) < 1e-3
+        assert abs(got.confidence - w.confidence) < 1 / 255
+    assert not Transcript.from_dict({})
+
+
+def test_saved_transcript_part_keeps_only_the_structured_form():
+    transcript = Transcript.from_words(conversation(30))
+    data = {"ai_results": {"overview": "o", "full_transcript": transcript.render(), "transcript": transcript.to_dict()}}
+    _, heavy = split_analysis(data)
+    assert "full_transcript" not in heavy
+    merged = merge_transcript({"ai_results": {"overview": "o"}}, decode(encode(heavy)))
+    assert merged["ai_results"]["full_transcript"] == transcript.render()
+
+    # Text that isn't the structured form's rendering (a fallback transcript) is saved as is
+    data["ai_results"]["full_transcript"] = "plain fallback"
+    assert split_analysis(data)[1]["full_transcript"] == "plain fallback"
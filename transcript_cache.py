@@ -0,0 +1,44 @@
+"""Persistent, content-addressed cache of finished transcripts.
+
+Keyed by a hash of the uploaded audio bytes plus the recognition settings,
+so re-analysing the same recording (new participant names, a re-upload, a
+colleague opening the same call) skips ffmpeg, GCS and Speech-to-Text.
+"""
+import hashlib
+import json
+
+from disk_cache import DiskCache
+
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TranscriptCache(DiskCache):
+    """One JSON file per transcript; least-recently-used entries are evicted past ``max_bytes``."""
+
+    def __init__(self, directory, max_bytes=500 * 1024 * 1024):
+        super().__init__(directory, max_bytes=max_bytes)
+
+    @staticmethod
+    def key_for(audio_path, recognition_params):
+        """sha256 of the audio content combined with the (sorted) recognition settings."""
+        params = json.dumps(recognition_params, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(f"{hash_file(audio_path)}|{params}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            value = self._load(key)
+            self._count("misses" if value is None else "hits")
+            self._lookup_done()
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
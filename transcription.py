@@ -0,0 +1,289 @@
+"""Segmented, concurrent Speech-to-Text with diarization stitching.
+
+One ``long_running_recognize`` over a multi-hour workshop runs serially on
+Google's side. Splitting the audio into overlapping segments and submitting
+them together cuts wall-clock time roughly by the number of segments; the
+price is that each segment numbers its speakers independently and the
+overlaps transcribe the same words twice. ``stitch_segments`` fixes both.
+"""
+import array
+import base64
+import collections
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+Word = collections.namedtuple("Word", "word start end speaker confidence")
+
+# Two words in an overlap are "the same word" if their text matches and they
+# start within this many seconds of each other.
+MATCH_TOLERANCE_SEC = 0.6
+
+_NORMALIZE = re.compile(r"[^\w']+")
+
+
+def _norm(word):
+    return _NORMALIZE.sub("", word.lower())
+
+
+# -----------------------------------------------------
+# SEGMENT PLANNING
+# -----------------------------------------------------
+def plan_segments(duration, segment_sec=600, overlap_sec=15):
+    """Splits ``duration`` seconds into [(start, length), ...] windows that overlap by ``overlap_sec``."""
+    if duration <= segment_sec:
+        return [(0.0, float(duration))]
+    segments, start = [], 0.0
+    step = segment_sec - overlap_sec
+    while start < duration:
+        length = min(segment_sec, duration - start)
+        segments.append((round(start, 3), round(length, 3)))
+        if start + length >= duration:
+            break
+        start += step
+    return segments
+
+
+def words_from_response(response):
+    """Flattens a LongRunningRecognizeResponse into Words (times relative to that audio).
+
+    With diarization enabled the final result repeats every word with its
+    speaker tag, so tagged words are preferred when present.
+    """
+    tagged, untagged = [], []
+    for result in response.results:
+        if not result.alternatives:
+            continue
+        for w in result.alternatives[0].words:
+            word = Word(w.word, w.start_time.total_seconds(), w.end_time.total_seconds(),
+                        w.speaker_tag, getattr(w, "confidence", 0.0))
+            (tagged if w.speaker_tag else untagged).append(word)
+    if not tagged:
+        return untagged
+    seen, unique = set(), []
+    for w in sorted(tagged, key=lambda w: w.start):
+        key = (w.start, w.end, w.word)
+        if key not in seen:
+            seen.add(key)
+            unique.append(w)
+    return unique
+
+
+# -----------------------------------------------------
+# STITCHING
+# -----------------------------------------------------
+def _match_speakers(prev_words, next_words, window_start, window_end):
+    """Counts how often each speaker tag in ``next_words`` lines up with one in ``prev_words``."""
+    prev = [w for w in prev_words if window_start <= w.start <= window_end]
+    nxt = [w for w in next_words if window_start <= w.start <= window_end]
+    votes = collections.Counter()
+    j = 0
+    for w in nxt:
+        # Both lists are time-ordered, so walk prev forward instead of rescanning it
+        while j < len(prev) and prev[j].start < w.start - MATCH_TOLERANCE_SEC:
+            j += 1
+        k = j
+        while k < len(prev) and prev[k].start <= w.start + MATCH_TOLERANCE_SEC:
+            if _norm(prev[k].word) == _norm(w.word):
+                votes[(w.speaker, prev[k].speaker)] += 1
+                break
+            k += 1
+    return votes
+
+
+def stitch_segments(segments):
+    """Merges per-segment word lists into one stream with globally consistent speakers.
+
+    ``segments`` is [(start, length, words), ...] in time order, where word
+    times are already absolute. Overlaps are cut at their midpoint; speaker
+    tags of each segment are mapped onto the previous segment's global tags by
+    majority vote over matching words in the overlap. Tags with no match
+    become new speakers.
+    """
+    merged = []
+    next_global = 1
+    prev_words, prev_end = None, None
+
+    for seg_start, seg_len, words in segments:
+        words = sorted(words, key=lambda w: w.start)
+        if prev_words is None:
+            mapping = {}
+            for w in words:
+                if w.speaker not in mapping:
+                    mapping[w.speaker] = w.speaker if w.speaker else 0
+            next_global = max([t for t in mapping.values()] + [0]) + 1
+            cut = None
+        else:
+            votes = _match_speakers(prev_words, words, seg_start, prev_end)
+            mapping, used = {}, set()
+            for (local, global_tag), _ in votes.most_common():
+                if local in mapping or global_tag in used:
+                    continue
+                mapping[local] = global_tag
+                used.add(global_tag)
+            for w in words:
+                if w.speaker not in mapping:
+                    mapping[w.speaker] = next_global if w.speaker else 0
+                    if w.speaker:
+                        next_global += 1
+            cut = (seg_start + prev_end) / 2.0
+            merged = [w for w in merged if w.start < cut]
+
+        relabelled = [w._replace(speaker=mapping[w.speaker]) for w in words]
+        merged.extend(w for w in relabelled if cut is None or w.start >= cut)
+        prev_words, prev_end = relabelled, seg_start + seg_len
+
+    return merged
+
+
+# -----------------------------------------------------
+# TRANSCRIPT MODEL
+# -----------------------------------------------------
+class Turn:
+    """One speaker's uninterrupted stretch: ``Transcript`` word indices [first, last) and its time span."""
+
+    __slots__ = ("speaker", "start", "end", "first", "last")
+
+    def __init__(self, speaker, start, end, first, last):
+        self.speaker, self.start, self.end, self.first, self.last = speaker, start, end, first, last
+
+    def __repr__(self):
+        return f"Turn(speaker={self.speaker}, {self.start:.2f}-{self.end:.2f}s, words {self.first}:{self.last})"
+
+
+class Transcript:
+    """Word-level transcript in parallel arrays, grouped into speaker turns.
+
+    Keeps what Speech-to-Text returns (timings, speaker tags, confidences)
+    instead of flattening it into a string: a few bytes per word in
+    ``array`` columns plus one small ``Turn`` per speaker change.
+    """
+
+    __slots__ = ("words", "starts", "ends", "speakers", "confidences", "turns")
+
+    SERIAL_VERSION = 1
+
+    def __init__(self, words=(), starts=(), ends=(), speakers=(), confidences=()):
+        self.words = list(words)
+        self.starts = array.array("d", starts)
+        self.ends = array.array("d", ends)
+        self.speakers = array.array("H", speakers)
+        self.confidences = array.array("f", confidences)
+        self.turns = self._build_turns()
+
+    @classmethod
+    def from_words(cls, words, to_original=None):
+        """From ``Word`` tuples; ``to_original`` optionally maps each time (e.g. ``OffsetMap.to_original``)."""
+        words = list(words)
+        starts = [w.start for w in words]
+        ends = [w.end for w in words]
+        if to_original:
+            starts = [to_original(t) for t in starts]
+            ends = [to_original(t) for t in ends]
+        return cls([w.word for w in words], starts, ends,
+                   [w.speaker or 0 for w in words], [w.confidence or 0.0 for w in words])
+
+    def _build_turns(self):
+        turns = []
+        for i, speaker in enumerate(self.speakers):
+            if turns and turns[-1].speaker == speaker:
+                turns[-1].last = i + 1
+                turns[-1].end = self.ends[i]
+            else:
+                turns.append(Turn(speaker, self.starts[i], self.ends[i], i, i + 1))
+        return turns
+
+    def __len__(self):
+        return len(self.words)
+
+    def __bool__(self):
+        return bool(self.words)
+
+    def word(self, i):
+        return Word(self.words[i], self.starts[i], self.ends[i], self.speakers[i], self.confidences[i])
+
+    def turn_text(self, turn):
+        return " ".join(self.words[turn.first:turn.last])
+
+    def render(self):
+        """The "Speaker N:" text the prompts and Review tab use, in one linear pass."""
+        parts = []
+        for turn in self.turns:
+            parts.append(f"\n\nSpeaker {turn.speaker}: ")
+            parts.append(self.turn_text(turn))
+            parts.append(" ")
+        return "".join(parts)
+
+    # --- Compact serialisation (JSON-safe; a few bytes per word) ---
+    def to_dict(self):
+        """Times as integer milliseconds and confidences as 0-255, packed little-endian and base64'd."""
+        def pack(typecode, values):
+            packed = array.array(typecode, values)
+            if sys.byteorder != "little":
+                packed.byteswap()
+            return base64.b64encode(packed.tobytes()).decode("ascii")
+
+        return {
+            "v": self.SERIAL_VERSION,
+            "words": " ".join(self.words),
+            "start_ms": pack("I", (round(t * 1000) for t in self.starts)),
+            "end_ms": pack("I", (round(t * 1000) for t in self.ends)),
+            "speakers": pack("H", self.speakers),
+            "confidence": pack("B", (min(max(round(c * 255), 0), 255) for c in self.confidences)),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        def unpack(typecode, text):
+            values = array.array(typecode)
+            values.frombytes(base64.b64decode(text))
+            if sys.byteorder != "little":
+                values.byteswap()
+            return values
+
+        if not data or not data.get("words"):
+            return cls()
+        return cls(
+            data["words"].split(" "),
+            (ms / 1000.0 for ms in unpack("I", data["start_ms"])),
+            (ms / 1000.0 for ms in unpack("I", data["end_ms"])),
+            unpack("H", data["speakers"]),
+            (c / 255.0 for c in unpack("B", data["confidence"])),
+        )
+
+
+# -----------------------------------------------------
+# CONCURRENT DRIVER
+# -----------------------------------------------------
+def transcribe_segments(segments, recognize, max_workers=4, on_progress=None):
+    """Runs ``recognize(index, start, length)`` for every segment concurrently and stitches the result.
+
+    ``recognize`` must return Words with times relative to the segment start.
+    ``on_progress(done, total)`` is called from the calling thread only, so it
+    is safe to update UI widgets from it. Returns (words, timings).
+    """
+    started = time.perf_counter()
+    results, timings = {}, {}
+
+    def run(index, start, length):
+        t0 = time.perf_counter()
+        words = recognize(index, start, length)
+        timings[index] = round(time.perf_counter() - t0, 3)
+        return [w._replace(start=w.start + start, end=w.end + start) for w in words]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {pool.submit(run, i, start, length): i for i, (start, length) in enumerate(segments)}
+        while pending:
+            done, _ = wait(pending, timeout=2, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+            if on_progress:
+                on_progress(len(results), len(segments))
+
+    stitched = stitch_segments([(start, length, results[i]) for i, (start, length) in enumerate(segments)])
+    return stitched, {
+        "segments": timings,
+        "serial_seconds": round(sum(timings.values()), 3),
+        "wall_seconds": round(time.perf_counter() - started, 3),
+    }
@@ -0,0 +1,136 @@
+"""Spooling uploaded recordings to disk and cleaning up after each job.
+
+Tab 1 used to do ``tmp.write(uploaded_file.getvalue())``. Whether that
+copies the whole recording is a CPython implementation detail: a
+``BytesIO`` hands back its internal bytes when it can, but copies while a
+memoryview of the buffer is alive, and ``getbuffer()`` on a buffer still
+shared with its source bytes copies too. ``spool_upload`` depends on
+neither: it ``readinto``s one reused chunk-sized buffer, so the extra
+memory is ``chunk_size`` whatever state the upload is in.
+
+Every file a job creates (the spooled upload, thumbnails, ...) is registered
+with an ``ArtifactTracker`` and removed when the job ends, whether it
+succeeded or not. ``sweep_stale`` catches anything orphaned by a restart.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+SPOOL_CHUNK_SIZE = 1024 * 1024
+STALE_AFTER_SEC = 24 * 3600
+
+
+def _suffix(file_name):
+    ext = os.path.splitext(file_name or "")[1]
+    return ext if ext else ".bin"
+
+
+def spool_upload(uploaded_file, directory=None, chunk_size=SPOOL_CHUNK_SIZE):
+    """Copies a file-like upload to a temp file through one reused buffer; returns the path."""
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=_suffix(getattr(uploaded_file, "name", "")), dir=directory)
+    try:
+        uploaded_file.seek(0)
+        with os.fdopen(fd, "wb") as out:
+            if hasattr(uploaded_file, "readinto"):
+                buf = bytearray(chunk_size)
+                view = memoryview(buf)
+                while True:
+                    n = uploaded_file.readinto(buf)
+                    if not n:
+                        break
+                    out.write(view[:n])
+            else:
+                shutil.copyfileobj(uploaded_file, out, chunk_size)
+    except BaseException:
+        _remove(path)
+        raise
+    finally:
+        uploaded_file.seek(0)
+    return path
+
+
+def _remove(path):
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+class ArtifactTracker:
+    """Files created on behalf of one job, removed together (newest first) on ``cleanup``.
+
+    Usable as a context manager so cleanup runs on success, failure and
+    cancellation alike. Extra teardown (e.g. deleting a GCS blob) can be
+    registered with ``on_cleanup``.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._paths = []
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self.removed = 0
+
+    def add(self, path):
+        with self._lock:
+            self._paths.append(path)
+        return path
+
+    def temp_path(self, suffix=""):
+        """A fresh, tracked, empty temp file path (unique per call, so concurrent jobs never collide)."""
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.directory)
+        os.close(fd)
+        return self.add(path)
+
+    def on_cleanup(self, fn):
+        with self._lock:
+            self._callbacks.append(fn)
+
+    def cleanup(self):
+        with self._lock:
+            paths, self._paths = self._paths, []
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in reversed(callbacks):
+            try:
+                fn()
+            except Exception:
+                pass
+        for path in reversed(paths):
+            try:
+                if _remove(path):
+                    self.removed += 1
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+        return False
+
+
+def sweep_stale(directory, max_age=STALE_AFTER_SEC):
+    """Deletes spool files left behind by a crashed or restarted process; returns how many."""
+    if not directory or not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff and _remove(path):
+                removed += 1
+        except OSError:
+            pass
+    return removed